@@ -0,0 +1,384 @@
+# Created On: 2026-10-18
+# Copyright 2010 Hardcoded Software (http://www.hardcoded.net)
+#
+# This software is licensed under the "BSD" License as described in the "LICENSE" file,
+# which should be included with this package. The terms are also available at
+# http://www.hardcoded.net/licenses/bsd_license
+
+# Generators for synthetic audio files. Audio data is made of null bytes (only the metadata and the
+# frame/page/block structure matter to hsaudiotag), which is enough to benchmark every parser
+# without shipping copyrighted (and big) music files.
+
+import os.path as op
+import random
+import struct
+
+#--- ID3
+
+def syncsafe(value):
+    return bytes([(value >> 21) & 0x7f, (value >> 14) & 0x7f, (value >> 7) & 0x7f, value & 0x7f])
+
+def id3v2_text(version, text):
+    if version == 2:
+        return b'\x00' + text.encode('latin-1', 'replace')
+    elif version == 3:
+        return b'\x01' + text.encode('utf-16')
+    else:
+        return b'\x03' + text.encode('utf-8')
+
+def id3v2_frame(version, frame_id, data):
+    if version == 2:
+        return frame_id.encode('ascii') + struct.pack('!I', len(data))[1:] + data
+    size = syncsafe(len(data)) if version == 4 else struct.pack('!I', len(data))
+    return frame_id.encode('ascii') + size + b'\x00\x00' + data
+
+V22_FRAME_IDS = {'TIT2': 'TT2', 'TPE1': 'TP1', 'TALB': 'TAL', 'TCON': 'TCO', 'TYER': 'TYE',
+    'TRCK': 'TRK', 'TLEN': 'TLE', 'COMM': 'COM', 'APIC': 'PIC'}
+
+def id3v2_tag(version, tags, picture_size=0, padding=1024):
+    """Returns an ID3v2.`version` tag containing the text frames in `tags`, a {frame_id: text}
+    dict with ID3v2.3 frame ids. If `picture_size` is set, a picture frame of that size comes first.
+    """
+    def frame_id(frame_id):
+        return V22_FRAME_IDS[frame_id] if version == 2 else frame_id
+    
+    frames = []
+    if picture_size:
+        if version == 2:
+            data = b'\x00JPG\x03\x00'
+        else:
+            data = b'\x00image/jpeg\x00\x03\x00'
+        frames.append(id3v2_frame(version, frame_id('APIC'), data + b'\xaa' * picture_size))
+    for key, text in sorted(tags.items()):
+        if key == 'COMM':
+            data = id3v2_text(version, '\x00' + text)
+            data = data[:1] + b'eng' + data[1:]
+        else:
+            data = id3v2_text(version, text)
+        frames.append(id3v2_frame(version, frame_id(key), data))
+    data = b''.join(frames) + b'\x00' * padding
+    return b'ID3' + bytes([version, 0, 0]) + syncsafe(len(data)) + data
+
+def id3v1_tag(tags):
+    def field(s, size):
+        return s.encode('latin-1', 'replace')[:size].ljust(size, b'\x00')
+    
+    return b'TAG' + field(tags.get('TIT2', ''), 30) + field(tags.get('TPE1', ''), 30) + \
+        field(tags.get('TALB', ''), 30) + field(tags.get('TYER', ''), 4) + \
+        field(tags.get('COMM', ''), 28) + b'\x00' + bytes([int(tags.get('TRCK', 0)), 12])
+
+#--- MPEG
+
+MPEG1_L3_BITRATES = [None, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+MPEG1_SAMPLE_RATES = [44100, 48000, 32000]
+MPEG1_L3_SAMPLE_COUNT = 1152
+VBR_HEADER_OFFSET = 36 # MPEG1, stereo
+
+def mpeg_frame_size(bitrate, sample_rate=44100, padding=False):
+    return (MPEG1_L3_SAMPLE_COUNT // 8) * bitrate * 1000 // sample_rate + int(padding)
+
+def mpeg_frame(bitrate, sample_rate=44100, padding=False, payload=b''):
+    """Returns a MPEG-1 layer 3 stereo frame at `bitrate` kbps. Its data is `payload` followed by
+    null bytes.
+    """
+    header = 0xfffb0000 | (MPEG1_L3_BITRATES.index(bitrate) << 12)
+    header |= MPEG1_SAMPLE_RATES.index(sample_rate) << 10
+    if padding:
+        header |= 1 << 9
+    size = mpeg_frame_size(bitrate, sample_rate, padding)
+    data = struct.pack('!I', header) + payload
+    assert len(data) <= size
+    return data.ljust(size, b'\x00')
+
+def mpeg_frames(bitrates, sample_rate=44100):
+    # Uses padding the way encoders do, to keep the stream at the nominal bitrate.
+    frames = []
+    rest = 0
+    for bitrate in bitrates:
+        rest += (MPEG1_L3_SAMPLE_COUNT // 8) * bitrate * 1000 % sample_rate
+        padding = rest >= sample_rate
+        if padding:
+            rest -= sample_rate
+        frames.append(mpeg_frame(bitrate, sample_rate, padding))
+    return frames
+
+def lame_extension(delay=576, padding=1152):
+    data = bytearray(36)
+    data[:9] = b'LAME3.100'
+    data[21:24] = ((delay << 12) | padding).to_bytes(3, 'big')
+    return bytes(data)
+
+def xing_frame(frames, header_id=b'Xing'):
+    # The Xing frame itself isn't counted in its frame count, but its bytes are. `header_id` is
+    # b'Info' for CBR files.
+    audio_size = sum(map(len, frames))
+    offsets = []
+    offset = 0
+    for frame in frames:
+        offsets.append(offset)
+        offset += len(frame)
+    toc = bytes(min(255, offsets[i * len(frames) // 100] * 256 // audio_size) for i in range(100))
+    payload = b'\x00' * (VBR_HEADER_OFFSET - 4) + header_id + struct.pack('!3I', 0xf, len(frames),
+        audio_size + mpeg_frame_size(128)) + toc + struct.pack('!I', 50) + lame_extension()
+    return mpeg_frame(128, payload=payload)
+
+def vbri_frame(frames, frames_per_entry=100):
+    entries = [sum(map(len, frames[i:i+frames_per_entry]))
+        for i in range(0, len(frames), frames_per_entry)]
+    audio_size = sum(entries) + mpeg_frame_size(128)
+    table = b''.join(struct.pack('!I', size) for size in entries)
+    payload = b'\x00' * (VBR_HEADER_OFFSET - 4) + b'VBRI' + struct.pack('!3H2I4H', 1, 576, 75,
+        audio_size, len(frames), len(entries), 1, 4, frames_per_entry) + table
+    return mpeg_frame(128, payload=payload)
+
+def mp3(rng, tags, vbr_header=None, vbr=False, id3_version=3, picture_size=0, seconds=60):
+    """Returns the data of a mp3 file.
+    
+    `vbr_header` is None, 'xing', 'info' or 'vbri'. Unless `vbr` is true or `vbr_header` is
+    'xing' or 'vbri', frames are all at 128 kbps.
+    """
+    frame_count = seconds * 44100 // MPEG1_L3_SAMPLE_COUNT
+    if vbr or vbr_header in ('xing', 'vbri'):
+        bitrates = [rng.choice(MPEG1_L3_BITRATES[5:]) for _ in range(frame_count)]
+    else:
+        bitrates = [128] * frame_count
+    frames = mpeg_frames(bitrates)
+    if vbr_header == 'xing':
+        frames.insert(0, xing_frame(frames))
+    elif vbr_header == 'info':
+        frames.insert(0, xing_frame(frames, b'Info'))
+    elif vbr_header == 'vbri':
+        frames.insert(0, vbri_frame(frames))
+    tags = dict(tags, TLEN=str(seconds * 1000))
+    return id3v2_tag(id3_version, tags, picture_size) + b''.join(frames) + id3v1_tag(tags)
+
+#--- MP4
+
+def atom(atom_type, *children):
+    data = b''.join(children)
+    return struct.pack('!I', len(data) + 8) + atom_type.encode('latin-1') + data
+
+def ilst_item(atom_type, value):
+    if isinstance(value, int):
+        data = atom('data', struct.pack('!2I', 0, 0), struct.pack('!4H', 0, value, 0, 0))
+    elif isinstance(value, bytes):
+        data = atom('data', struct.pack('!2I', 13, 0), value)
+    else:
+        data = atom('data', struct.pack('!2I', 1, 0), value.encode('utf-8'))
+    return atom(atom_type, data)
+
+def mp4(rng, tags, item_count=0, picture_size=0, seconds=60):
+    """Returns the data of an AAC mp4 file. `item_count` freeform items are added to its ilst atom
+    (which is where big ilst atoms in the wild come from).
+    """
+    sample_rate = 44100
+    mdhd = atom('mdhd', b'\x00' * 12, struct.pack('!2I', sample_rate, seconds * sample_rate),
+        b'\x00' * 4)
+    esds = atom('esds', b'\x00' * 26, struct.pack('!I', 128000), b'\x00' * 6)
+    mp4a = struct.pack('!I4s6xH8xHHHHI', 36 + len(esds), b'mp4a', 1, 2, 16, 0, 0, sample_rate << 16)
+    stsd = atom('stsd', struct.pack('!2I', 0, 1), mp4a, esds)
+    trak = atom('trak', atom('mdia', mdhd, atom('minf', atom('stbl', stsd))))
+    items = [
+        ilst_item('\xa9nam', tags['TIT2']),
+        ilst_item('\xa9ART', tags['TPE1']),
+        ilst_item('\xa9alb', tags['TALB']),
+        ilst_item('\xa9gen', tags['TCON']),
+        ilst_item('\xa9day', tags['TYER']),
+        ilst_item('\xa9cmt', tags['COMM']),
+        ilst_item('trkn', int(tags['TRCK'])),
+    ]
+    for i in range(item_count):
+        items.append(atom('----', atom('mean', b'\x00' * 4, b'com.apple.iTunes'),
+            atom('name', b'\x00' * 4, ('ITEM%d' % i).encode('ascii')),
+            atom('data', struct.pack('!2I', 1, 0), b'x' * rng.randrange(16, 512))))
+    if picture_size:
+        items.append(ilst_item('covr', b'\xaa' * picture_size))
+    hdlr = atom('hdlr', b'\x00' * 8, b'mdirappl', b'\x00' * 10)
+    udta = atom('udta', atom('meta', b'\x00' * 4, hdlr, atom('ilst', *items)))
+    moov = atom('moov', atom('mvhd', b'\x00' * 100), trak, udta)
+    mdat = atom('mdat', b'\x00' * (seconds * 16000))
+    return atom('ftyp', b'M4A \x00\x00\x00\x00M4A mp42isom') + moov + mdat
+
+#--- Ogg and FLAC
+
+def _make_crc_table():
+    table = []
+    for i in range(256):
+        r = i << 24
+        for _ in range(8):
+            r = ((r << 1) ^ 0x04c11db7) if r & 0x80000000 else (r << 1)
+        table.append(r & 0xffffffff)
+    return table
+
+CRC_TABLE = _make_crc_table()
+
+def ogg_crc(data):
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xffffffff) ^ CRC_TABLE[(crc >> 24) ^ byte]
+    return crc
+
+def ogg_page(data, page_number, granule, header_type=0, serial=0x1234):
+    # `data` is a single packet, which must fit in the page.
+    lacing = [255] * (len(data) // 255) + [len(data) % 255]
+    header = struct.pack('<4s2BqIIIB', b'OggS', 0, header_type, granule, serial, page_number, 0,
+        len(lacing)) + bytes(lacing)
+    crc = ogg_crc(header + data)
+    return header[:22] + struct.pack('<I', crc) + header[26:] + data
+
+def vorbis_comment(tags, vendor=b'hsaudiotag benchmarks'):
+    names = {'TIT2': 'TITLE', 'TPE1': 'ARTIST', 'TALB': 'ALBUM', 'TCON': 'GENRE', 'TYER': 'DATE',
+        'TRCK': 'TRACKNUMBER', 'COMM': 'COMMENT'}
+    comments = [('%s=%s' % (names[key], value)).encode('utf-8') for key, value in
+        sorted(tags.items()) if key in names]
+    result = struct.pack('<I', len(vendor)) + vendor + struct.pack('<I', len(comments))
+    return result + b''.join(struct.pack('<I', len(c)) + c for c in comments)
+
+def ogg_vorbis(rng, tags, seconds=60, page_size=4096):
+    """Returns the data of an Ogg Vorbis file, with its audio split in `page_size` bytes pages."""
+    sample_rate = 44100
+    ident = struct.pack('<7sIB4I2B', b'\x01vorbis', 0, 2, sample_rate, 0, 128000, 0, 0xb8, 1)
+    comment = b'\x03vorbis' + vorbis_comment(tags) + b'\x01'
+    pages = [ogg_page(ident, 0, 0, header_type=2), ogg_page(comment, 1, 0)]
+    audio_size = seconds * 16000
+    page_count = audio_size // page_size
+    for i in range(page_count):
+        granule = (i + 1) * seconds * sample_rate // page_count
+        header_type = 4 if i == page_count - 1 else 0
+        pages.append(ogg_page(b'\x00' * page_size, i + 2, granule, header_type))
+    return b''.join(pages)
+
+def flac_block(block_type, data, last=False):
+    return struct.pack('!I', (int(last) << 31) | (block_type << 24) | len(data)) + data
+
+def flac(rng, tags, padding=8192, seconds=60):
+    sample_rate = 44100
+    sample_count = seconds * sample_rate
+    sample_info = (sample_rate << 12) | (1 << 9) | (15 << 4) | (sample_count >> 32)
+    streaminfo = struct.pack('!2H', 4096, 4096) + b'\x00' * 6 # block and frame sizes
+    streaminfo += struct.pack('!2I', sample_info, sample_count & 0xffffffff) + b'\x00' * 16
+    blocks = [flac_block(0, streaminfo), flac_block(4, vorbis_comment(tags))]
+    blocks.append(flac_block(1, b'\x00' * padding, last=True))
+    return b'fLaC' + b''.join(blocks) + b'\x00' * (seconds * 88000)
+
+#--- WMA
+
+WMA_HEADER_ID = b'\x30\x26\xb2\x75\x8e\x66\xcf\x11\xa6\xd9\x00\xaa\x00\x62\xce\x6c'
+WMA_DATA_ID = b'\x36\x26\xb2\x75\x8e\x66\xcf\x11\xa6\xd9\x00\xaa\x00\x62\xce\x6c'
+WMA_FILE_PROPERTIES_ID = b'\xa1\xdc\xab\x8c\x47\xa9\xcf\x11\x8e\xe4\x00\xc0\x0c\x20\x53\x65'
+WMA_STREAM_PROPERTIES_ID = b'\x91\x07\xdc\xb7\xb7\xa9\xcf\x11\x8e\xe6\x00\xc0\x0c\x20\x53\x65'
+WMA_CONTENT_DESCRIPTION_ID = b'\x33\x26\xb2\x75\x8e\x66\xcf\x11\xa6\xd9\x00\xaa\x00\x62\xce\x6c'
+WMA_EXTENDED_CONTENT_DESCRIPTION_ID = b'\x40\xa4\xd0\xd2\x07\xe3\xd2\x11\x97\xf0\x00\xa0\xc9\x5e\xa8\x50'
+WMA_STREAM_BITRATE_PROPERTIES_ID = b'\xce\x75\xf8\x7b\x8d\x46\xd1\x11\x8d\x82\x00\x60\x97\xc9\xa2\xb2'
+
+def asf_object(object_id, data):
+    return object_id + struct.pack('<Q', len(data) + 24) + data
+
+def asf_string(s):
+    return (s + '\x00').encode('utf-16-le')
+
+def wma(rng, tags, seconds=60):
+    duration = seconds * 10000000
+    file_prop = b'\x00' * 16 + struct.pack('<4Q', 0, 0, 0, duration) + struct.pack('<2Q', duration,
+        0) + struct.pack('<4I', 2, 3200, 3200, 128000)
+    stream_prop = b'\x00' * 40 + struct.pack('<2IH4x', 18, 0, 1)
+    stream_prop += struct.pack('<2HIIHHH', 0x161, 2, 44100, 16000, 3200, 16, 0)
+    bitrate_prop = struct.pack('<2HI', 1, 1, 128000)
+    content = [asf_string(tags['TIT2']), asf_string(tags['TPE1']), b'', b'', b'']
+    content_desc = struct.pack('<5H', *map(len, content)) + b''.join(content)
+    ext_fields = [
+        ('WM/AlbumTitle', tags['TALB']),
+        ('WM/Genre', tags['TCON']),
+        ('WM/Year', tags['TYER']),
+        ('WM/Description', tags['COMM']),
+    ]
+    ext_content = b''
+    for name, value in ext_fields:
+        name, value = asf_string(name), asf_string(value)
+        ext_content += struct.pack('<H', len(name)) + name + struct.pack('<2H', 0, len(value)) + value
+    name = asf_string('WM/Track')
+    ext_content += struct.pack('<H', len(name)) + name + struct.pack('<2HI', 3, 4,
+        int(tags['TRCK']) - 1)
+    ext_content = struct.pack('<H', len(ext_fields) + 1) + ext_content
+    objects = [
+        asf_object(WMA_FILE_PROPERTIES_ID, file_prop),
+        asf_object(WMA_STREAM_PROPERTIES_ID, stream_prop),
+        asf_object(WMA_STREAM_BITRATE_PROPERTIES_ID, bitrate_prop),
+        asf_object(WMA_CONTENT_DESCRIPTION_ID, content_desc),
+        asf_object(WMA_EXTENDED_CONTENT_DESCRIPTION_ID, ext_content),
+    ]
+    header = struct.pack('<I2B', len(objects), 1, 2) + b''.join(objects)
+    data = asf_object(WMA_DATA_ID, b'\x00' * 16 + struct.pack('<QH', 0, 0x0101) +
+        b'\x00' * (seconds * 16000))
+    return asf_object(WMA_HEADER_ID, header) + data
+
+#--- AIFF
+
+def extended_float(value):
+    # Returns the 80-bit IEEE 754 representation of positive integer `value`.
+    exponent = value.bit_length() - 1
+    mantissa = value << (63 - exponent)
+    return struct.pack('>HLL', 16383 + exponent, mantissa >> 32, mantissa & 0xffffffff)
+
+def aiff_chunk(chunk_type, data):
+    if len(data) % 2:
+        data += b'\x00'
+    return chunk_type + struct.pack('>I', len(data)) + data
+
+def aiff(rng, tags, seconds=10):
+    sample_rate = 44100
+    frame_count = seconds * sample_rate
+    comm = struct.pack('>hLh', 2, frame_count, 16) + extended_float(sample_rate)
+    ssnd = struct.pack('>2I', 0, 0) + b'\x00' * (frame_count * 4)
+    chunks = aiff_chunk(b'COMM', comm) + aiff_chunk(b'SSND', ssnd)
+    chunks += aiff_chunk(b'ID3 ', id3v2_tag(4, tags, padding=0))
+    return aiff_chunk(b'FORM', b'AIFF' + chunks)
+
+#--- Corpora
+
+# {name: (extension, function(rng, tags))}
+CORPORA = {
+    'mp3-cbr': ('mp3', lambda rng, tags: mp3(rng, tags)),
+    'mp3-vbr': ('mp3', lambda rng, tags: mp3(rng, tags, vbr=True)),
+    'mp3-xing': ('mp3', lambda rng, tags: mp3(rng, tags, vbr_header='xing')),
+    'mp3-info': ('mp3', lambda rng, tags: mp3(rng, tags, vbr_header='info')),
+    'mp3-vbri': ('mp3', lambda rng, tags: mp3(rng, tags, vbr_header='vbri')),
+    'mp3-id3v22': ('mp3', lambda rng, tags: mp3(rng, tags, id3_version=2)),
+    'mp3-id3v23-big': ('mp3', lambda rng, tags: mp3(rng, tags, picture_size=200000)),
+    'mp3-id3v24': ('mp3', lambda rng, tags: mp3(rng, tags, id3_version=4)),
+    'mp3-id3v24-big': ('mp3', lambda rng, tags: mp3(rng, tags, id3_version=4,
+        picture_size=200000)),
+    'mp4': ('m4a', lambda rng, tags: mp4(rng, tags)),
+    'mp4-big-ilst': ('m4a', lambda rng, tags: mp4(rng, tags, item_count=200,
+        picture_size=200000)),
+    'ogg': ('ogg', lambda rng, tags: ogg_vorbis(rng, tags)),
+    'flac': ('flac', lambda rng, tags: flac(rng, tags)),
+    'wma': ('wma', lambda rng, tags: wma(rng, tags)),
+    'aiff': ('aif', lambda rng, tags: aiff(rng, tags)),
+}
+
+def random_tags(rng):
+    def word():
+        return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randrange(3, 12)))
+    
+    return {
+        'TIT2': ' '.join(word() for _ in range(rng.randrange(1, 6))),
+        'TPE1': word().capitalize(),
+        'TALB': word().capitalize(),
+        'TCON': rng.choice(['Rock', 'Jazz', 'Hip-Hop', 'Classical']),
+        'TYER': str(rng.randrange(1950, 2026)),
+        'TRCK': str(rng.randrange(1, 20)),
+        'COMM': word(),
+    }
+
+def generate(name, directory, count, seed=0):
+    """Writes `count` files of corpus `name` in `directory` and returns their paths."""
+    ext, func = CORPORA[name]
+    rng = random.Random('%s-%d' % (name, seed))
+    paths = []
+    for i in range(count):
+        path = op.join(directory, '%s-%04d.%s' % (name, i, ext))
+        with open(path, 'wb') as fp:
+            fp.write(func(rng, random_tags(rng)))
+        paths.append(path)
+    return paths
@@ -0,0 +1,133 @@
+# Created On: 2026-10-18
+# Copyright 2010 Hardcoded Software (http://www.hardcoded.net)
+#
+# This software is licensed under the "BSD" License as described in the "LICENSE" file,
+# which should be included with this package. The terms are also available at
+# http://www.hardcoded.net/licenses/bsd_license
+
+"""Measures the throughput of hsaudiotag parsers on synthetic corpora (see corpus.py).
+
+Run it from the root of the source tree with ``python -m benchmarks.run``. Results are written
+to stdout (or to --output) as JSON, with an entry per corpus and parser containing files per
+second, microseconds per file, and bytes and read calls per file. Read counters come from
+/proc/self/io and are null where it's not available. Files are generated in a temporary
+directory and are thus in the page cache: this measures parsing, not disk access.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from hsaudiotag import auto, mpeg, mp4, ogg, flac, wma, aiff
+from hsaudiotag.util import AUDIO_ATTRS, TAG_ATTRS
+
+from . import corpus
+
+FORMAT2CLASS = {
+    'mp3': mpeg.Mpeg,
+    'm4a': mp4.File,
+    'ogg': ogg.Vorbis,
+    'flac': flac.FLAC,
+    'wma': wma.WMADecoder,
+    'aif': aiff.File,
+}
+
+ATTRS = sorted(AUDIO_ATTRS | TAG_ATTRS)
+
+def read_io_counters():
+    # Returns (bytes read, read calls) for this process, or None if we can't tell.
+    try:
+        with open('/proc/self/io') as fp:
+            counters = dict(line.split(': ') for line in fp.read().splitlines())
+        return int(counters['rchar']), int(counters['syscr'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+def read_all(cls, paths):
+    # Parsers read some attributes lazily, so we access all of them.
+    for path in paths:
+        f = cls(path)
+        tag = getattr(f, 'tag', None) or f
+        for attrname in ATTRS:
+            getattr(tag if attrname in TAG_ATTRS else f, attrname, None)
+
+def measure(cls, paths, repeat):
+    before = read_io_counters()
+    read_all(cls, paths)
+    after = read_io_counters()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        read_all(cls, paths)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    result = {
+        'files': len(paths),
+        'files_per_sec': len(paths) / best,
+        'us_per_file': best * 1000000 / len(paths),
+        'bytes_read_per_file': None,
+        'reads_per_file': None,
+    }
+    if before is not None and after is not None:
+        result['bytes_read_per_file'] = (after[0] - before[0]) / len(paths)
+        result['reads_per_file'] = (after[1] - before[1]) / len(paths)
+    return result
+
+def run(names, count, repeat, directory):
+    results = []
+    for name in names:
+        paths = corpus.generate(name, directory, count)
+        ext = corpus.CORPORA[name][0]
+        for cls in [FORMAT2CLASS[ext], auto.File]:
+            result = {
+                'corpus': name,
+                'parser': '%s.%s' % (cls.__module__.split('.')[-1], cls.__name__),
+                'file_size': os.path.getsize(paths[0]),
+            }
+            result.update(measure(cls, paths, repeat))
+            results.append(result)
+            print('%-16s %-18s %10.1f us/file' % (name, result['parser'], result['us_per_file']),
+                file=sys.stderr)
+        for path in paths:
+            os.remove(path)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('corpora', nargs='*', metavar='corpus',
+        help="corpora to run (all by default): %s" % ', '.join(sorted(corpus.CORPORA)))
+    parser.add_argument('--count', type=int, default=50, help="number of files per corpus")
+    parser.add_argument('--repeat', type=int, default=3, help="the best of that many runs is kept")
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+    names = args.corpora or sorted(corpus.CORPORA)
+    unknown = set(names) - set(corpus.CORPORA)
+    if unknown:
+        parser.error("unknown corpora: %s" % ', '.join(sorted(unknown)))
+    directory = tempfile.mkdtemp(prefix='hsaudiotag-bench-')
+    try:
+        results = run(names, args.count, args.repeat, directory)
+    finally:
+        shutil.rmtree(directory)
+    report = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'count': args.count,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            fp.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# Created On: 2026-10-18
+# Copyright 2010 Hardcoded Software (http://www.hardcoded.net)
+#
+# This software is licensed under the "BSD" License as described in the "LICENSE" file,
+# which should be included with this package. The terms are also available at
+# http://www.hardcoded.net/licenses/bsd_license
+
+"""Compares the Python and numpy frame sync finders of hsaudiotag.mpeg.
+
+Run it from the root of the source tree with ``python -m benchmarks.sync``. Windows of junk data
+of various sizes, where a given ratio of the bytes are \\xff (sync candidates), are searched by the
+Python finder, the numpy finder and find_frame_sync(), which picks one of them. Microseconds per
+search are printed. Junk without candidates is searched by bytes.find() in the Python finder, so
+the numpy finder only pays off when there are many candidates. This is what
+``mpeg.NUMPY_SYNC_MIN_SIZE`` and ``mpeg.NUMPY_SYNC_MIN_DENSITY`` are based on.
+"""
+
+import argparse
+import random
+import sys
+import timeit
+
+from hsaudiotag import mpeg
+
+# Bytes found in frame headers. With \xff, they make a lot of invalid and valid headers.
+HEADER_BYTES = b'\xfb\xfa\xf3\x90\x00\xe3\x44'
+
+def junk(size, density, rng):
+    return bytes(0xff if rng.random() < density else rng.choice(HEADER_BYTES) for _ in range(size))
+
+def measure(func, data, number):
+    return timeit.timeit(lambda: func(data), number=number) * 1000000 / number
+
+def run(sizes, densities, number):
+    rng = random.Random(0)
+    results = []
+    for size in sizes:
+        for density in densities:
+            data = junk(size, density, rng)
+            python = measure(mpeg._find_frame_sync_python, data, number)
+            numpy = measure(mpeg._find_frame_sync_numpy, data, number)
+            auto = measure(mpeg.find_frame_sync, data, number)
+            index = mpeg.find_frame_sync(data)
+            results.append((size, density, index, python, numpy, auto))
+            print('%8d bytes, %5.3f \\xff, sync at %6d: python %8.1f us, numpy %8.1f us, '
+                'find_frame_sync %8.1f us' % (size, density, index, python, numpy, auto))
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1024, 4096, 16384, 65536],
+        help="window sizes, in bytes")
+    parser.add_argument('--number', type=int, default=20, help="searches per measure")
+    args = parser.parse_args(argv)
+    if mpeg.numpy is None:
+        sys.exit("numpy isn't installed")
+    densities = [0, 0.005, 0.01, 0.02, 0.03, 0.05, 0.1, 0.2, 0.5]
+    run(args.sizes, densities, args.number)
+
+if __name__ == '__main__':
+    main()
@@ -1 +1 @@
-
+from .scanner import scan, scan_batch
@@ -10,10 +10,9 @@
 
 import logging
 import struct
-from io import BytesIO
 
 from .id3v2 import Id3v2
-from .util import FileOrPath
+from .util import Cursor, FileOrPath, wants, TAG_ATTRS
 
 HEADER_SIZE = 8
 
@@ -55,7 +54,9 @@ class Chunk:
     
 
 class File(Chunk):
-    def __init__(self, infile):
+    def __init__(self, infile, fields=None):
+        # The ID3 chunk is skipped if no tag is wanted.
+        self.fields = fields
         self.valid = False
         self.tag = None
         self.duration = self.bitrate = self.sample_rate = self.audio_offset = self.audio_size = 0
@@ -75,9 +76,9 @@ class File(Chunk):
                 chunk = Chunk(self._fp)
             except NotAChunk:
                 break
-            if chunk.type == b'ID3 ':
+            if chunk.type == b'ID3 ' and wants(self.fields, TAG_ATTRS):
                 chunk.read()
-                self.tag = Id3v2(BytesIO(chunk.data))
+                self.tag = Id3v2(Cursor(chunk.data))
             elif chunk.type == b'COMM':
                 chunk.read()
                 try:
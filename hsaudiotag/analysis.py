@@ -0,0 +1,175 @@
+# Created On: 2026-10-18
+# Copyright 2010 Hardcoded Software (http://www.hardcoded.net)
+#
+# This software is licensed under the "BSD" License as described in the "LICENSE" file,
+# which should be included with this package. The terms are also available at
+# http://www.hardcoded.net/licenses/bsd_license
+
+from array import array
+from collections import Counter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . import mpeg
+from .util import FileOrPath
+
+CBR = 'cbr'
+VBR = 'vbr'
+ABR = 'abr'
+
+# A file is CBR when at least this ratio of its frames have the same bitrate. Some encoders write a
+# few frames at another bitrate.
+CBR_MIN_RATIO = 0.99
+
+# Without a LAME header telling otherwise, a file with frames at different bitrates is ABR when its
+# bitrate, averaged over each second, stays within this ratio (standard deviation / mean) of its
+# average bitrate.
+ABR_MAX_DEVIATION = 0.05
+
+# Encoding methods of the LAME header that have frames at different bitrates
+LAME_METHODS = {2: ABR, 9: ABR, 3: VBR, 4: VBR, 5: VBR, 6: VBR}
+
+# Bitrate for each header key (see mpeg.HEADER_TABLE)
+BITRATES = tuple(decoded[2] for decoded in mpeg.HEADER_TABLE)
+
+if numpy is not None:
+    FRAME_DTYPE = numpy.dtype([('offset', numpy.uint64), ('size', numpy.uint16),
+        ('bitrate', numpy.uint16), ('channel_mode', numpy.uint8)])
+    _NUMPY_SIZES = numpy.array(mpeg.FRAME_SIZES, dtype=numpy.uint16)
+    _NUMPY_BITRATES = numpy.array(BITRATES, dtype=numpy.uint16)
+
+class FrameTable:
+    """Frames of a mpeg file stored in one `array` per field. It's what `MpegAnalysis.frames` is
+    when numpy isn't installed. Like a numpy structured array, `table['bitrate']` returns a column.
+    """
+    def __init__(self, offsets, headers):
+        self._columns = {
+            'offset': offsets,
+            'size': array('H'),
+            'bitrate': array('H'),
+            'channel_mode': array('B'),
+        }
+        # Files have only a few distinct headers
+        decoded = {}
+        for header in headers:
+            try:
+                size, bitrate, channel_mode = decoded[header]
+            except KeyError:
+                size, bitrate = mpeg.decode_header(header)[1:3]
+                channel_mode = (header >> 6) & 0x3
+                decoded[header] = (size, bitrate, channel_mode)
+            self._columns['size'].append(size)
+            self._columns['bitrate'].append(bitrate)
+            self._columns['channel_mode'].append(channel_mode)
+    
+    def __getitem__(self, name):
+        return self._columns[name]
+    
+    def __len__(self):
+        return len(self._columns['offset'])
+    
+
+def _numpy_frames(offsets, headers):
+    headers = numpy.frombuffer(headers, dtype=numpy.uint32)
+    result = numpy.empty(len(headers), dtype=FRAME_DTYPE)
+    result['offset'] = numpy.frombuffer(offsets, dtype=numpy.uint64)
+    keys = mpeg._header_key(headers)
+    result['size'] = _NUMPY_SIZES[keys]
+    result['bitrate'] = _NUMPY_BITRATES[keys]
+    result['channel_mode'] = (headers >> 6) & 0x3
+    return result
+
+class MpegAnalysis:
+    """Frame by frame analysis of the mpeg file `infile`.
+    
+    All frame headers are read when it's created (in large blocks, like `FrameBrowser.stats()`) and
+    stored in `frames`, a numpy structured array with `offset`, `size`, `bitrate` and
+    `channel_mode` fields if numpy is installed, or a `FrameTable` otherwise. Statistics are
+    computed from it, with numpy when possible.
+    
+    `sample_rate` and `sample_count` (per frame) are the ones of the first frame. `lame` is the
+    `mpeg.LameHeader` of the file, if it has one.
+    """
+    def __init__(self, infile):
+        offsets = array('Q')
+        headers = array('I')
+        with FileOrPath(infile) as fp:
+            fp.seek(0, 0)
+            b = mpeg.FrameBrowser(fp)
+            self.sample_rate = b.frame.sample_rate
+            self.sample_count = b.frame.sample_count
+            self.lame = None
+            if b.frame.valid:
+                position = b.position
+                fp.seek(position, 0)
+                vbr = mpeg.get_vbr_info(fp, b, mpeg.DURATION_FAST)
+                if isinstance(vbr, mpeg.XingHeader):
+                    self.lame = vbr.lame
+                mpeg.walk_frames(fp, position, offsets=offsets, headers=headers)
+        if numpy is not None:
+            self.frames = _numpy_frames(offsets, headers)
+        else:
+            self.frames = FrameTable(offsets, headers)
+    
+    def __len__(self):
+        return len(self.frames)
+    
+    #--- Public
+    def histogram(self):
+        """Returns a {bitrate: frame_count} dict."""
+        bitrates = self.frames['bitrate']
+        if numpy is not None:
+            values, counts = numpy.unique(bitrates, return_counts=True)
+            return dict(zip(values.tolist(), counts.tolist()))
+        return dict(sorted(Counter(bitrates).items()))
+    
+    def profile(self):
+        """Returns the average bitrate (in kbps) of each second of the file in a list. The last
+        second can be partial.
+        """
+        if not len(self.frames):
+            return []
+        sizes = self.frames['size']
+        # bits / (frame_count * sample_count / sample_rate) / 1000
+        factor = 8 * self.sample_rate / (self.sample_count * 1000)
+        if numpy is not None:
+            seconds = numpy.arange(len(sizes)) * self.sample_count // self.sample_rate
+            sizes_per_second = numpy.bincount(seconds, weights=sizes)
+            frames_per_second = numpy.bincount(seconds)
+            return (sizes_per_second * factor / frames_per_second).tolist()
+        second_count = (len(sizes) - 1) * self.sample_count // self.sample_rate + 1
+        sizes_per_second = [0] * second_count
+        frames_per_second = [0] * second_count
+        for index, size in enumerate(sizes):
+            second = index * self.sample_count // self.sample_rate
+            sizes_per_second[second] += size
+            frames_per_second[second] += 1
+        return [size * factor / count for size, count in zip(sizes_per_second, frames_per_second)]
+    
+    def classify(self):
+        """Returns CBR, VBR or ABR depending on how the bitrate varies, or '' if there's no frame.
+        
+        Files whose frames (but the first one, which can contain a Xing header) nearly all have the
+        same bitrate are CBR, whatever their LAME header says. Otherwise, we trust the LAME header
+        if there's one. Without it, we look at the bitrate of each second of the file: if it stays
+        close to the average bitrate (see ABR_MAX_DEVIATION), the file is ABR. It's an heuristic: a
+        VBR file of uniform content can look like ABR.
+        """
+        if len(self.frames) <= 1:
+            return CBR if len(self.frames) else ''
+        counts = self.histogram()
+        counts[self.frames['bitrate'][0]] -= 1
+        if max(counts.values()) >= (len(self.frames) - 1) * CBR_MIN_RATIO:
+            return CBR
+        if self.lame is not None and self.lame.vbr_method in LAME_METHODS:
+            return LAME_METHODS[self.lame.vbr_method]
+        profile = self.profile()
+        if len(profile) > 1:
+            profile = profile[:-1] # the last second is partial
+        mean = sum(profile) / len(profile)
+        deviation = (sum((value - mean) ** 2 for value in profile) / len(profile)) ** 0.5
+        return ABR if deviation <= mean * ABR_MAX_DEVIATION else VBR
+
@@ -8,7 +8,8 @@
 
 import os.path as op
 
-from . import mpeg, mp4, wma, ogg, flac, aiff
+from . import mpeg, mp4, wma, ogg, flac, aiff, id3v1, id3v2
+from .util import open_if_filename, StreamFile, AUDIO_ATTRS, TAG_ATTRS
 
 ALL_CLASSES = [mp4.File, mpeg.Mpeg, wma.WMADecoder, ogg.Vorbis, flac.FLAC, aiff.File]
 
@@ -24,53 +25,190 @@ EXT2CLASS = {
     'aifc': aiff.File,
 }
 
-AUDIO_ATTRS = {'size', 'duration', 'bitrate', 'sample_rate', 'audio_offset', 'audio_size'}
-TAG_ATTRS = {'artist', 'album', 'title', 'genre', 'year', 'track', 'comment'}
+CLASS2FORMAT = {
+    mpeg.Mpeg: 'mpeg',
+    mp4.File: 'mp4',
+    wma.WMADecoder: 'wma',
+    ogg.Vorbis: 'ogg',
+    flac.FLAC: 'flac',
+    aiff.File: 'aiff',
+}
+
+SNIFF_HEAD_SIZE = 16
+SNIFF_TAIL_SIZE = 128
+
+def sniff(head, tail):
+    """Returns the class whose signature matches `head` and `tail`, the first and last bytes of a
+    file, or None if there's no match.
+    """
+    if head[:4] == flac.FLAC.ID:
+        return flac.FLAC
+    if head[:4] == ogg.VorbisPage.OGG_PAGE_ID:
+        return ogg.Vorbis
+    if head[:4] == b'FORM':
+        return aiff.File
+    if head[4:8] == b'ftyp':
+        return mp4.File
+    if head[:wma.WMA_ID_SIZE] == wma.WMA_HEADER_ID:
+        return wma.WMADecoder
+    if head[:3] == id3v2.ID_ID3:
+        return mpeg.Mpeg
+    if len(head) >= 2 and head[0] == 0xff and (head[1] & 0xe0) == 0xe0:
+        return mpeg.Mpeg
+    if tail[-id3v1.TAG_SIZE:][:3] == b'TAG' or tail[-id3v2.SIZE_FOOTER:][:3] == id3v2.ID_3DI:
+        return mpeg.Mpeg
+
+def sniff_file(fp):
+    """Reads the head and tail of `fp` and returns what `sniff` says about them.
+    
+    The tail is only read when the head doesn't match. Sniffing a `StreamFile` doesn't change its
+    `partial` attribute: only the data the parser wants counts.
+    """
+    fp.seek(0, 0)
+    head = fp.read(SNIFF_HEAD_SIZE)
+    result = sniff(head, b'')
+    if result is not None:
+        return result
+    partial = getattr(fp, 'partial', None)
+    fp.seek(0, 2)
+    size = fp.tell() or 0
+    fp.seek(max(size - SNIFF_TAIL_SIZE, 0), 0)
+    tail = fp.read(SNIFF_TAIL_SIZE)
+    if partial is not None:
+        fp.partial = partial
+    return sniff(head, tail)
+
+def default_value(attrname):
+    """Returns the value `attrname` has on an invalid file."""
+    return '' if (attrname in TAG_ATTRS) and (attrname != 'track') else 0
 
 class File:
     """Automatically determine a file type and decode it accordingly, providing a unified interface
     to all file types.
+    
+    Tags are read right away, but when `infile` is a path, audio attributes (duration, bitrate,
+    etc.) are only read when one of them is first accessed, which can be expensive for mpeg files.
+    The file is then kept open (with its prefetched windows) until that access.
+    
+    If `cache` (a `cache.Cache`) is given and `infile` is a path, attributes are fetched from it
+    and the file is only read when it's not in the cache (`original` is then None).
+    
+    `fields` is the set of attributes to read (None for all of them). Parsers skip the work needed
+    only for the other attributes, which keep their default value. When reading a file with
+    `fields`, the result isn't stored in `cache`.
+    
+    If `stream` is true, `infile` is a forward-only file object (a pipe, a socket, etc.) which is
+    read through a `util.StreamFile`. `stream_size` is its length, if known. When it is, the end of
+    the stream is never read, and attributes that depend on it (such as the id3v1 tag or the
+    duration of ogg files) keep their default value. `partial` then tells whether the parser
+    wanted data that wasn't read.
     """
-    def __init__(self, infile):
+    def __init__(self, infile, cache=None, fields=None, stream=False, stream_size=None):
+        self._fields = fields
+        self._fp = None
         self._set_invalid_attrs()
-        f = self._guess_class(infile)
-        if f is not None:
-            self._set_attrs(f)
-        if hasattr(f, 'close'):
-            f.close()
+        self.partial = False
+        if stream:
+            infile = StreamFile(infile, stream_size)
+        if cache is not None and isinstance(infile, str):
+            self._read_through_cache(infile, cache)
+        else:
+            self._read(infile)
+        if stream:
+            self.partial = infile.partial
+    
+    def __getattr__(self, attrname):
+        # Only called when `attrname` isn't in __dict__, that is, for audio attributes that haven't
+        # been read yet.
+        if attrname in AUDIO_ATTRS and self.__dict__.get('original') is not None:
+            self._set_audio_attrs(self.original)
+            return self.__dict__[attrname]
+        raise AttributeError(attrname)
+    
+    def _read(self, infile):
+        # All parsers share `fp`, which we own. When audio attributes are read lazily, it's closed
+        # once they're read, so that the audio read is served by the same windows.
+        fp, shouldclose = open_if_filename(infile, prefetch=True)
+        lazy = False
+        try:
+            f = self._guess_class(fp, infile, self._fields)
+            if f is not None:
+                # When we have a path, we own the file, so audio attributes can be read lazily.
+                # File objects might be closed by then, so we read everything now.
+                lazy = shouldclose and bool(self._wanted(AUDIO_ATTRS))
+                self._set_attrs(f, lazy=lazy)
+        finally:
+            if lazy:
+                self._fp = fp
+            elif shouldclose:
+                fp.close()
     
     @staticmethod
-    def _guess_class(infile):
+    def _guess_class(fp, infile, fields=None):
+        # Instead of trying all classes sequentially, first try the class matching the file's
+        # signature, then the one matching its extension. All classes share the same opened file.
+        candidates = [sniff_file(fp)]
         if isinstance(infile, str):
-            # Try a fast path to the right class instead of trying all classes sequencially.
-            ext = op.splitext(infile)[1][1:]
-            if ext in EXT2CLASS:
-                f = EXT2CLASS[ext](infile)
-                if f.valid:
-                    return f
-        for class_ in ALL_CLASSES:
-            f = class_(infile)
+            ext = op.splitext(infile)[1][1:].lower()
+            candidates.append(EXT2CLASS.get(ext))
+        candidates += ALL_CLASSES
+        tried = set()
+        for class_ in candidates:
+            if class_ is None or class_ in tried:
+                continue
+            tried.add(class_)
+            fp.seek(0, 0)
+            f = class_(fp, fields=fields)
             if f.valid:
                 return f
-        else:
-            return None
+        return None
+    
+    def _read_through_cache(self, path, cache):
+        key = cache.key(path)
+        values = cache.get(key)
+        if values is not None:
+            for attrname, value in values.items():
+                setattr(self, attrname, value)
+            return
+        self._read(path)
+        if self._fields is None:
+            values = {attrname: getattr(self, attrname) for attrname in cache.attrs}
+            # Only mpeg files have durations that aren't always exact.
+            duration_mode = getattr(self.original, 'duration_mode', mpeg.DURATION_EXACT)
+            cache.put(key, path, values, duration_mode)
     
-    def _set_attrs(self, f):
+    def _set_attrs(self, f, lazy=False):
         self.valid = True
         self.original = f
-        for attrname in AUDIO_ATTRS:
-            setattr(self, attrname, getattr(f, attrname))
+        self.format = CLASS2FORMAT.get(type(f), '')
+        if lazy:
+            for attrname in self._wanted(AUDIO_ATTRS):
+                delattr(self, attrname)
+        else:
+            self._set_audio_attrs(f)
         tag = f.tag if hasattr(f, 'tag') else f
         if tag is not None:
-            for attrname in TAG_ATTRS:
+            for attrname in self._wanted(TAG_ATTRS):
                 setattr(self, attrname, getattr(tag, attrname))
     
+    def _set_audio_attrs(self, f):
+        try:
+            for attrname in self._wanted(AUDIO_ATTRS):
+                setattr(self, attrname, getattr(f, attrname))
+        finally:
+            if hasattr(f, 'close'):
+                f.close()
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
+    
+    def _wanted(self, attrnames):
+        return attrnames if self._fields is None else (attrnames & self._fields)
+    
     def _set_invalid_attrs(self):
         self.valid = False
         self.original = None
-        for attrname in AUDIO_ATTRS:
-            setattr(self, attrname, 0)
-        for attrname in TAG_ATTRS:
-            default = '' if attrname != 'track' else 0
-            setattr(self, attrname, default)
+        self.format = ''
+        for attrname in AUDIO_ATTRS | TAG_ATTRS:
+            setattr(self, attrname, default_value(attrname))
     
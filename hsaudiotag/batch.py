@@ -0,0 +1,104 @@
+# Created On: 2026-10-18
+# Copyright 2010 Hardcoded Software (http://www.hardcoded.net)
+#
+# This software is licensed under the "BSD" License as described in the "LICENSE" file,
+# which should be included with this package. The terms are also available at
+# http://www.hardcoded.net/licenses/bsd_license
+
+import csv
+import json
+import sys
+from array import array
+from collections import namedtuple
+
+from .util import AUDIO_ATTRS
+
+NUMERIC_ATTRS = tuple(sorted(AUDIO_ATTRS)) + ('track', )
+STRING_ATTRS = ('artist', 'album', 'title', 'genre', 'year', 'comment')
+COLUMNS = ('path', 'valid', 'format', 'error') + NUMERIC_ATTRS + STRING_ATTRS
+
+Row = namedtuple('Row', COLUMNS)
+
+class Batch:
+    """Columnar container of scan results.
+    
+    Each attribute of `scanner.Result` is stored in its own column instead of in a per-file object.
+    Numeric attributes are in `array` columns and tags are in lists of interned strings, so a
+    library where most files share their artist, album and genre takes little memory.
+    
+    Iterating over a batch yields `Row` namedtuples, which are created on the fly. Slicing a batch
+    returns a new batch. Use `column()` to access the values of a single attribute.
+    """
+    def __init__(self):
+        self._columns = {
+            'path': [],
+            'valid': array('b'),
+            'format': [],
+            'error': [],
+        }
+        for attrname in NUMERIC_ATTRS:
+            self._columns[attrname] = array('q')
+        for attrname in STRING_ATTRS:
+            self._columns[attrname] = []
+    
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            result = Batch()
+            result._columns = {name: column[key] for name, column in self._columns.items()}
+            return result
+        row = Row(*(self._columns[name][key] for name in COLUMNS))
+        return row._replace(valid=bool(row.valid))
+    
+    def __iter__(self):
+        return map(Row._make, self._iter_values())
+    
+    def __len__(self):
+        return len(self._columns['path'])
+    
+    def __repr__(self):
+        return '<Batch of %d results>' % len(self)
+    
+    #--- Private
+    def _iter_values(self):
+        columns = [self._columns[name] for name in COLUMNS]
+        columns[COLUMNS.index('valid')] = map(bool, columns[COLUMNS.index('valid')])
+        return zip(*columns)
+    
+    #--- Public
+    def append(self, result):
+        """Adds `result`, a `scanner.Result` (or anything with the same attributes, such as a
+        `Row`), to the batch.
+        """
+        columns = self._columns
+        columns['path'].append(result.path)
+        columns['valid'].append(bool(result.valid))
+        columns['format'].append(sys.intern(result.format))
+        columns['error'].append(result.error)
+        for attrname in NUMERIC_ATTRS:
+            columns[attrname].append(getattr(result, attrname))
+        for attrname in STRING_ATTRS:
+            columns[attrname].append(sys.intern(getattr(result, attrname)))
+    
+    def extend(self, results):
+        if isinstance(results, Batch):
+            for name, column in self._columns.items():
+                column.extend(results._columns[name])
+        else:
+            for result in results:
+                self.append(result)
+    
+    def column(self, name):
+        """Returns the column for attribute `name`. It's not a copy, don't modify it."""
+        return self._columns[name]
+    
+    def to_csv(self, fp):
+        """Writes the batch to `fp`, a text file, in CSV with a header row."""
+        writer = csv.writer(fp)
+        writer.writerow(COLUMNS)
+        writer.writerows(self._iter_values())
+    
+    def to_jsonl(self, fp):
+        """Writes the batch to `fp`, a text file, with a JSON object per line."""
+        for values in self._iter_values():
+            fp.write(json.dumps(dict(zip(COLUMNS, values))))
+            fp.write('\n')
@@ -0,0 +1,135 @@
+# Created On: 2026-10-18
+# Copyright 2010 Hardcoded Software (http://www.hardcoded.net)
+#
+# This software is licensed under the "BSD" License as described in the "LICENSE" file,
+# which should be included with this package. The terms are also available at
+# http://www.hardcoded.net/licenses/bsd_license
+
+import os
+import sqlite3
+
+from . import mpeg
+from .util import AUDIO_ATTRS, TAG_ATTRS
+
+# Bump this when the stored columns change. Caches with another version are emptied on open.
+SCHEMA_VERSION = 2
+
+# mpeg duration modes, from the least exact to the most exact
+DURATION_MODES = (mpeg.DURATION_FAST, mpeg.DURATION_SAMPLED, mpeg.DURATION_EXACT)
+
+KEY_COLUMNS = ('device', 'inode', 'size_on_disk', 'mtime_ns')
+
+def file_key(path):
+    """Returns the (device, inode, size, mtime_ns) tuple identifying the current state of `path`.
+    """
+    st = os.stat(path)
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+class Cache:
+    """Persistent cache of `auto.File` attributes, stored in a SQLite database at `dbpath`.
+    
+    Entries are keyed by the device, inode, size and modification time of the file, so a file that
+    is modified, or replaced by another one, is parsed again. The database is in WAL mode, so
+    many processes can use the same cache at once, but each process must create its own `Cache`.
+    Use it through `auto.File(path, cache=cache)`.
+    
+    Entries also store the mode their mpeg duration was computed in. Entries computed in a less
+    exact mode than the one we want are ignored, so that the file is read again.
+    """
+    def __init__(self, dbpath, timeout=30):
+        self.attrs = ('valid', 'format') + tuple(sorted(AUDIO_ATTRS | TAG_ATTRS))
+        self._conn = sqlite3.connect(dbpath, timeout=timeout, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._create_schema()
+    
+    #--- Private
+    def _create_schema(self):
+        with self._transaction():
+            [version] = self._conn.execute('PRAGMA user_version').fetchone()
+            if version != SCHEMA_VERSION:
+                self._conn.execute('DROP TABLE IF EXISTS files')
+            columns = ', '.join(self.attrs)
+            self._conn.execute('CREATE TABLE IF NOT EXISTS files (path TEXT, device INTEGER, '
+                'inode INTEGER, size_on_disk INTEGER, mtime_ns INTEGER, duration_mode TEXT, %s, '
+                'PRIMARY KEY (device, inode))' % columns)
+            self._conn.execute('CREATE INDEX IF NOT EXISTS files_path ON files (path)')
+            self._conn.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+    
+    def _transaction(self):
+        return _Transaction(self._conn)
+    
+    #--- Public
+    def close(self):
+        self._conn.close()
+    
+    def key(self, path):
+        return file_key(path)
+    
+    def get(self, key, duration_mode=None):
+        """Returns a {attrname: value} dict for the file identified by `key` (see `key()`), or
+        None if it's not in the cache or if its duration is less exact than `duration_mode`
+        (mpeg.DURATION_MODE if None).
+        """
+        if duration_mode is None:
+            duration_mode = mpeg.DURATION_MODE
+        where = ' AND '.join('%s=?' % name for name in KEY_COLUMNS)
+        columns = ('duration_mode', ) + self.attrs
+        row = self._conn.execute('SELECT %s FROM files WHERE %s' % (', '.join(columns), where),
+            key).fetchone()
+        if row is None:
+            return None
+        if DURATION_MODES.index(row[0]) < DURATION_MODES.index(duration_mode):
+            return None
+        result = dict(zip(self.attrs, row[1:]))
+        result['valid'] = bool(result['valid'])
+        return result
+    
+    def put(self, key, path, values, duration_mode=mpeg.DURATION_EXACT):
+        """Stores `values`, a {attrname: value} dict, for `path` whose state is `key`.
+        `duration_mode` is the mode the duration was computed in.
+    
+        `key` has to be computed *before* the file is read. If the file changes while it's being
+        read, the entry will thus be stale right away rather than wrong.
+        """
+        columns = ('path', ) + KEY_COLUMNS + ('duration_mode', ) + self.attrs
+        params = (path, ) + tuple(key) + (duration_mode, ) + \
+            tuple(values[attrname] for attrname in self.attrs)
+        placeholders = ', '.join('?' * len(columns))
+        self._conn.execute('INSERT OR REPLACE INTO files (%s) VALUES (%s)' % (', '.join(columns),
+            placeholders), params)
+    
+    def prune(self):
+        """Removes entries for files that were deleted, or replaced by another file, since they
+        were cached. Returns the number of removed entries.
+        """
+        to_remove = []
+        for path, device, inode in self._conn.execute('SELECT path, device, inode FROM files'):
+            try:
+                key = file_key(path)
+            except OSError:
+                key = None
+            if key is None or key[:2] != (device, inode):
+                to_remove.append((device, inode))
+        with self._transaction():
+            self._conn.executemany('DELETE FROM files WHERE device=? AND inode=?', to_remove)
+        return len(to_remove)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+    
+    def __enter__(self):
+        # IMMEDIATE takes the write lock right away, avoiding deadlocks between processes that
+        # would both try to upgrade a read lock.
+        self.conn.execute('BEGIN IMMEDIATE')
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.conn.execute('COMMIT' if exc_type is None else 'ROLLBACK')
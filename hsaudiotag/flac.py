@@ -8,7 +8,7 @@
 
 from struct import unpack
 
-from .util import FileOrPath
+from .util import FileOrPath, wants, TAG_ATTRS
 from . import ogg
 
 STREAMINFO = 0
@@ -67,11 +67,15 @@ BLOCK_CLASSES = {
 
 class FLAC(object):
     ID = b'fLaC'
-    def __init__(self, infile):
+    def __init__(self, infile, fields=None):
+        # The vorbis comment isn't read if no tag is wanted, and blocks aren't walked to the audio
+        # data if its offset isn't.
+        self.fields = fields
         with FileOrPath(infile) as fp:
             fp.seek(0, 2)
             self.size = fp.tell()
             fp.seek(0, 0)
+            self._empty()
             try:
                 self._read(fp)
             except Exception: #The unpack error doesn't seem to have a class. I have to catch all here
@@ -105,19 +109,21 @@ class FLAC(object):
         else:
             self.duration = 0
         self.bitrate = 0
-        info = self.get_first_block(VORBIS_COMMENT)
-        comment = info.comment
-        self.artist = comment.artist
-        self.album = comment.album
-        self.title = comment.title
-        self.track = comment.track
-        self.year = comment.year
-        self.genre = comment.genre
-        self.comment = comment.comment
+        if wants(self.fields, TAG_ATTRS):
+            info = self.get_first_block(VORBIS_COMMENT)
+            comment = info.comment
+            self.artist = comment.artist
+            self.album = comment.album
+            self.title = comment.title
+            self.track = comment.track
+            self.year = comment.year
+            self.genre = comment.genre
+            self.comment = comment.comment
         
-        last = self.get_last_block()
-        self.audio_offset = last.offset + last.HEADER_SIZE + last.size
-        self.audio_size = self.size - self.audio_offset
+        if wants(self.fields, {'audio_offset', 'audio_size'}):
+            last = self.get_last_block()
+            self.audio_offset = last.offset + last.HEADER_SIZE + last.size
+            self.audio_size = self.size - self.audio_offset
         self.valid = True
     
     def get_first_block(self, type):
@@ -14,6 +14,8 @@ from .genres import genre_by_index
 TAG_VERSION_1_0 = 1
 TAG_VERSION_1_1 = 2
 
+TAG_SIZE = 128
+
 #id3v1 specs
 #0-2:"TAG"
 #3-32:Title
@@ -39,6 +41,7 @@ def _arrange_id3_field(raw_field):
 
 class Id3v1(object):
     def __init__(self, infile):
+        # If `infile` is None, the tag is empty.
         self.version = 0
         self.size = 0
         self.title = ''
@@ -48,15 +51,16 @@ class Id3v1(object):
         self.genre = ''
         self.comment = ''
         self.track = 0
-        with FileOrPath(infile) as fp:
-            self._read_file(fp)
+        if infile is not None:
+            with FileOrPath(infile) as fp:
+                self._read_file(fp)
     
     def _read_file(self, fp):
         fp.seek(0, 2)
         position = fp.tell()
-        if position and position >= 128:
-            fp.seek(-128, 2)
-            self._read_tag(fp.read(128))
+        if position and position >= TAG_SIZE:
+            fp.seek(-TAG_SIZE, 2)
+            self._read_tag(fp.read(TAG_SIZE))
     
     def _read_tag(self, data):
         if data[0:3] != b'TAG':
@@ -77,7 +81,7 @@ class Id3v1(object):
         self.year = _arrange_id3_field(data[93:97])
         genre = data[127]
         self.genre = genre_by_index(genre)
-        self.size = 128
+        self.size = TAG_SIZE
     
     @property
     def exists(self):
@@ -6,11 +6,15 @@
 # which should be included with this package. The terms are also available at 
 # http://www.hardcoded.net/licenses/bsd_license
 
-import io
+import os
+import os.path as op
+import shutil
 import struct
 import re
+import tempfile
+import zlib
 
-from .util import cond, tryint, FileOrPath
+from .util import cond, tryint, is_reopenable, Cursor, FileOrPath
 from .genres import genre_by_index
 
 ID_ID3 = b'ID3'
@@ -21,11 +25,45 @@ FLAG_EXT_HEADER = 1 << 6
 FLAG_EXPERIMENTAL = 1 << 5
 FLAG_FOOTER = 1 << 4
 
+# Frame format flags (the second flag byte of frame headers)
+FRAME23_COMPRESSION = 1 << 7
+FRAME23_ENCRYPTION = 1 << 6
+FRAME23_GROUPING = 1 << 5
+FRAME24_GROUPING = 1 << 6
+FRAME24_COMPRESSION = 1 << 3
+FRAME24_ENCRYPTION = 1 << 2
+FRAME24_UNSYNCH = 1 << 1
+FRAME24_DATA_LENGTH = 1 << 0
+# Flags defined in v2.4 frame headers, in the status and the format byte
+FRAME24_STATUS_FLAGS = 0x70
+FRAME24_FORMAT_FLAGS = 0x4f
+
+# Number of frame headers we follow to check the size of a v2.4 frame (see Id3v2._check_frame_size)
+SIZE_CHECK_DEPTH = 3
+
 POS_BEGIN = 0
 POS_END   = 1
 
+# Frames bigger than this, or that we don't decode (see FRAMEDATA_LIST), aren't read with the tag.
+# Cover art and embedded files can weigh megabytes. Their bytes are read from the file the first
+# time their `rawdata` is accessed.
+LAZY_FRAME_SIZE = 0x10000
+
+# Padding added after the frames when `write_tag()` has to grow a tag or create one. It lets the
+# next edits be written in place.
+WRITE_PADDING = 0x1000
+
+# Version of the tags created by `write_tag()`
+WRITE_VERSION = 4
+
+# `write_tag()` only writes in place when the changed bytes are within a single block of this size
+# (a page, on usual filesystems). A crash doesn't leave such a write half done. Bigger changes go
+# through a temporary file.
+WRITE_BLOCK_SIZE = 0x1000
+
 re_numeric_genre = re.compile(r'^\(?(\d{1,3})')
 re_frame_type = re.compile(r'[A-Z0-9]{3,4}')
+re_frame_header = re.compile(rb'[A-Z0-9]{4}')
 
 def _read_id3_size(rawsize, syncsafe=True):
     if len(rawsize) != 4:
@@ -36,9 +74,20 @@ def _read_id3_size(rawsize, syncsafe=True):
     else:
         return struct.unpack('!i', rawsize)[0]
 
+def _encode_id3_size(size, syncsafe=True):
+    if syncsafe:
+        return bytes([(size >> 21) & 0x7f, (size >> 14) & 0x7f, (size >> 7) & 0x7f, size & 0x7f])
+    else:
+        return struct.pack('!I', size)
+
+def _remove_unsync(data):
+    # The unsynchronisation scheme inserts a \0 after every \xff.
+    return bytes(data).replace(b'\xff\x00', b'\xff')
+
 STRING_ENCODINGS = {0: 'iso-8859-1', 1: 'utf-16', 2: 'utf-16be', 3: 'utf-8'}
 
 def _read_id3_string(s, stringtype, nullreplace='\n'):
+    s = bytes(s)
     encoding = STRING_ENCODINGS[stringtype]
     if stringtype == 1:
         # This is a safekeeping code. Under normal circumstances, it shouldn't
@@ -143,15 +192,80 @@ def _find_frame_data_class(frameid):
             return framedataclass
 
 class Id3Frame(object):
+    """A frame of `size` bytes at `offset` in the file, right after its header.
+    
+    Its bytes are read right away by `read()`, or skipped by `skip()` and only read from `source` (a
+    path or a file object) when they're first needed. File objects given as a source must still be
+    open at that moment, unless they're reopenable (see `util.PrefetchFile`).
+    
+    `rawdata` is the data of the frame, without the `extra_size` bytes of flag fields preceding it,
+    re-synchronized if `unsync` is set and decompressed if `compressed` is set. This decoding is
+    done on first access. We can't decrypt `encrypted` frames, their `rawdata` is left as-is.
+    """
     def __init__(self, fp, frame_id, size):
         self.frame_id = frame_id
         self.size = size
-        self.rawdata = io.BytesIO(fp.read(size))
+        self.offset = fp.tell()
+        self.unsync = False
+        self.compressed = False
+        self.encrypted = False
+        self.extra_size = 0
+        self._length = size
+        self._source = None
+        self._payload = None
+        self._rawdata = None
         self._data = None
     
+    def _read_payload(self):
+        if self._payload is None:
+            with FileOrPath(self._source) as fp:
+                # A closed reopenable file is opened again by the read, we close it back.
+                reopened = is_reopenable(fp) and fp.closed
+                fp.seek(self.offset, 0)
+                data = fp.read(self._length)
+                if reopened:
+                    fp.close()
+            self._payload = Cursor(data)
+        return self._payload
+    
+    def read(self, fp, length):
+        # `length` is smaller than `size` when the frame goes past the end of the tag. The payload
+        # is copied: a view of a MappedFile would keep the file mapped after it's closed.
+        self._length = length
+        self._payload = Cursor(fp.read(length))
+    
+    def skip(self, fp, length, source):
+        self._length = length
+        self._source = source
+        fp.seek(length, 1)
+    
+    @property
+    def loaded(self):
+        return self._payload is not None
+    
+    @property
+    def rawdata(self):
+        if self._rawdata is None:
+            payload = self._read_payload()
+            if not (self.extra_size or self.unsync or self.compressed):
+                self._rawdata = payload
+            else:
+                payload.seek(self.extra_size)
+                data = payload.read()
+                if self.unsync:
+                    data = _remove_unsync(data)
+                if self.compressed and not self.encrypted:
+                    try:
+                        data = zlib.decompress(data)
+                    except zlib.error:
+                        data = b''
+                self._rawdata = Cursor(data)
+        self._rawdata.seek(0)
+        return self._rawdata
+    
     @property
     def valid(self):
-        if self.size == 0:
+        if self.size <= 0:
             return False
         if not re_frame_type.match(self.frame_id):
             return False
@@ -162,6 +276,8 @@ class Id3Frame(object):
         if self._data is None:
             framedataclass = _find_frame_data_class(self.frame_id)
             if framedataclass:
+                if self.encrypted or not self.rawdata.size:
+                    return None # we can't decode it
                 self._data = framedataclass(self.rawdata)
             else:
                 raise NotImplementedError('Support for frame \'%s\' is not implemented yet' % self.frame_id)
@@ -175,19 +291,54 @@ class Id3v22Frame(Id3Frame):
         Id3Frame.__init__(self, fp, frame_id, size)
 
 class Id3v23Frame(Id3Frame):
-    def __init__(self, fp, syncsafe):
+    def __init__(self, fp, syncsafe=False):
         frameid = str(fp.read(4), 'ascii', 'replace')
-        size = _read_id3_size(fp.read(4), syncsafe=syncsafe)
-        flags = fp.read(2)
+        self.rawsize = fp.read(4)
+        size = _read_id3_size(self.rawsize, syncsafe=syncsafe)
+        self.rawflags = fp.read(2)
         Id3Frame.__init__(self, fp, frameid, size)
+        if len(self.rawflags) == 2:
+            self._read_flags(self.rawflags[1])
+    
+    def _read_flags(self, flags):
+        # The decompressed size, the encryption method and the group id precede the data.
+        self.compressed = bool(flags & FRAME23_COMPRESSION)
+        self.encrypted = bool(flags & FRAME23_ENCRYPTION)
+        self.extra_size = cond(self.compressed, 4, 0) + cond(self.encrypted, 1, 0) + \
+            cond(flags & FRAME23_GROUPING, 1, 0)
+    
+
+class Id3v24Frame(Id3v23Frame):
+    def __init__(self, fp, syncsafe=True):
+        Id3v23Frame.__init__(self, fp, syncsafe)
+    
+    def _read_flags(self, flags):
+        # The group id, the encryption method and the data length precede the data.
+        self.compressed = bool(flags & FRAME24_COMPRESSION)
+        self.encrypted = bool(flags & FRAME24_ENCRYPTION)
+        self.unsync = bool(flags & FRAME24_UNSYNCH)
+        self.extra_size = cond(flags & FRAME24_GROUPING, 1, 0) + cond(self.encrypted, 1, 0) + \
+            cond(flags & FRAME24_DATA_LENGTH, 4, 0)
+    
 
 class Id3v2(object):
-    def __init__(self, infile):
+    """The id3v2 tag of `infile`, at its beginning or at its end.
+    
+    When `read_frames` is False, only the header is read (which gives the tag size). Otherwise,
+    `frames` is a {frame_id: Id3Frame} dict, and `frame_list` has all frames (including the ones
+    with the same id) in the order of the tag. Only the frames we decode are read right away, unless
+    they're bigger than LAZY_FRAME_SIZE. Other frames are read from `infile` on demand.
+    
+    Before v2.4, unsynchronisation applies to the whole tag, frame headers included, and frame
+    sizes are those of the re-synchronized tag. Unsynchronized v2.2 and v2.3 tags are thus entirely
+    read and re-synchronized at once, and their frames' `offset` is in that re-synchronized data.
+    """
+    def __init__(self, infile, read_frames=True):
         self.position = POS_BEGIN
         self._extheader = None
         self.frames = None
-        self._last_read_frame = None
-        self._had_large_frame = False
+        self.frame_list = []
+        self._syncsafe = True
         with FileOrPath(infile) as fp:
             fp.seek(0, 0)
             h = Header(fp)
@@ -202,11 +353,18 @@ class Id3v2(object):
                 except IOError:
                     pass
             self._header = h
-            if self.exists:
-                data = io.BytesIO(fp.read(self.data_size))
+            if not read_frames:
+                self.frames = {}
+            elif self.exists:
+                source = infile if isinstance(infile, str) else fp
+                if (FLAG_UNSYNCH & self.flags) and (self.version < 4):
+                    fp = source = Cursor(_remove_unsync(fp.read(self.data_size)))
+                    end = fp.size
+                else:
+                    end = fp.tell() + self.data_size
                 if FLAG_EXT_HEADER & self.flags:
-                    self._extheader = ExtHeader(data, self._header.vmajor)
-                self._read_frames(data)
+                    self._extheader = ExtHeader(fp, self._header.vmajor)
+                self._read_frames(fp, end, source)
     
     #---Private
     def _decode_track(self, track):
@@ -223,26 +381,74 @@ class Id3v2(object):
     def _get_frame(self, fp):
         if self.version == 2:
             return Id3v22Frame(fp)
+        elif self.version == 3:
+            return Id3v23Frame(fp)
+        else:
+            return Id3v24Frame(fp, self._syncsafe)
+    
+    def _chain_score(self, fp, position, end, syncsafe):
+        # Follows the frame headers starting at `position` (up to SIZE_CHECK_DEPTH of them) with
+        # sizes read as `syncsafe`. A header is consistent when its id, size and flags are valid and
+        # its frame fits in the tag. Returns 2 points per consistent header, plus 1 if we end up on
+        # padding or at the end of the tag.
+        score = 0
+        for i in range(SIZE_CHECK_DEPTH):
+            if position > end:
+                break
+            if position == end:
+                return score + 1
+            fp.seek(position, 0)
+            header = fp.read(min(10, end - position))
+            if header[:1] == b'\0':
+                return score + 1
+            if (len(header) < 10) or not re_frame_header.match(header):
+                break
+            rawsize, status, format = header[4:8], header[8], header[9]
+            if syncsafe and any(b & 0x80 for b in rawsize):
+                break
+            if (status & ~FRAME24_STATUS_FLAGS) or (format & ~FRAME24_FORMAT_FLAGS):
+                break
+            position += 10 + _read_id3_size(rawsize, syncsafe=syncsafe)
+            if position > end:
+                break
+            score += 2
+        return score
+    
+    def _check_frame_size(self, fp, frame, end):
+        # iTunes writes v2.4 tags with plain (non syncsafe) frame sizes. Sizes under 0x80 read the
+        # same either way. For others, we follow the frames both sizes lead to and keep the size
+        # whose chain of frames is the most consistent (see _chain_score), the syncsafe one on a
+        # tie. Once a plain size
+        # is found, all sizes of the tag are read as plain.
+        plain_size = _read_id3_size(frame.rawsize, syncsafe=False)
+        if plain_size == frame.size:
+            return
+        if any(b & 0x80 for b in frame.rawsize):
+            syncsafe_score = -1
         else:
-            return Id3v23Frame(fp, self.version > 3)
+            syncsafe_score = self._chain_score(fp, frame.offset + frame.size, end, True)
+        plain_score = self._chain_score(fp, frame.offset + plain_size, end, False)
+        if plain_score > syncsafe_score:
+            frame.size = plain_size
+            self._syncsafe = False
+        fp.seek(frame.offset, 0)
     
-    def _read_frames(self, fp):
-        offset = fp.tell()
+    def _read_frames(self, fp, end, source):
         self.frames = {}
         frame = self._get_frame(fp)
-        while frame.valid:
-            if (self._last_read_frame is not None) and (self._last_read_frame.size > 0x7f):
-                self._had_large_frame = True
-            self._last_read_frame = frame
+        while frame.valid and frame.offset <= end:
+            if self.version == 4 and self._syncsafe:
+                self._check_frame_size(fp, frame, end)
+            if (FLAG_UNSYNCH & self.flags) and (self.version == 4):
+                frame.unsync = True
             self.frames[frame.frame_id] = frame
+            self.frame_list.append(frame)
+            length = min(frame.size, end - frame.offset)
+            if frame.size > LAZY_FRAME_SIZE or _find_frame_data_class(frame.frame_id) is None:
+                frame.skip(fp, length, source)
+            else:
+                frame.read(fp, length)
             frame = self._get_frame(fp)
-        if (self._last_read_frame is not None) and (self._last_read_frame.size > 0x7f) and \
-            (not self._had_large_frame) and (self.version == 4):
-            #probably needs a itunes hack, in any case, this is the first large frame, 
-            #re-reading can't hurt.
-            self._header.vmajor = 3
-            fp.seek(offset)
-            self._read_frames(fp)
     
     def _get_frame_data(self, frame_id):
         if frame_id in self.frames:
@@ -310,3 +516,139 @@ class Id3v2(object):
         frame_id = cond(self.version >= 3, 'TYER', 'TYE')
         return self._get_frame_text_line(frame_id)
     
+
+def _encode_frame_data(frame_id, value, version):
+    if not isinstance(value, str):
+        return bytes(value)
+    if version == 4:
+        stringtype, encoding, terminator = 3, 'utf-8', b'\0'
+    else:
+        stringtype, encoding, terminator = 1, 'utf-16', b'\0\0'
+    result = bytes([stringtype])
+    if frame_id == 'COMM':
+        # With an empty description
+        result += b'eng' + ''.encode(encoding) + terminator
+    return result + value.encode(encoding)
+
+def _frame_payload(frame_or_data):
+    if not isinstance(frame_or_data, Id3Frame):
+        return frame_or_data
+    payload = frame_or_data._read_payload()
+    payload.seek(0)
+    return payload.read()
+
+def _replace_file(path, tag_data, audio_offset):
+    # Writes `tag_data` followed by the data of `path` from `audio_offset` to a temporary file
+    # which then replaces `path`.
+    dirname, filename = op.split(op.abspath(path))
+    fd, temppath = tempfile.mkstemp(prefix='.%s.' % filename, dir=dirname)
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(tag_data)
+            with open(path, 'rb') as source:
+                source.seek(audio_offset, 0)
+                shutil.copyfileobj(source, fp)
+            fp.flush()
+            os.fsync(fp.fileno())
+        shutil.copymode(path, temppath)
+        os.replace(temppath, path)
+    except BaseException:
+        os.remove(temppath)
+        raise
+
+def write_tag(path, values, padding=None):
+    """Changes the frames of the id3v2 tag of the file at `path`.
+    
+    `values` is a {frame_id: value} dict. A value is the data of the frame as bytes, a string for
+    text and comment frames, or None to remove the frame. It replaces all frames having that id.
+    Other frames are kept as they are.
+    
+    When the new tag fits in the space of the old one, padding included, and the bytes that change
+    are all in the same WRITE_BLOCK_SIZE block, they're written in place, in a single write. Kept
+    frames come first in the new tag, so the ones that don't move (cover art, usually) don't count
+    as changed. Otherwise, the file is copied with the new tag to a temporary file, which then
+    atomically replaces `path`. If the tag has to grow, it gets `padding` bytes of padding
+    (WRITE_PADDING if None). Either way, a crash while writing leaves the old tag or the new one.
+    
+    Files without a tag get a WRITE_VERSION tag. Only v2.3 and v2.4 tags at the beginning of a
+    file can be written, ValueError is raised for others.
+    """
+    if padding is None:
+        padding = WRITE_PADDING
+    tag = Id3v2(path)
+    if tag.exists:
+        if tag.version not in (3, 4) or tag.position != POS_BEGIN:
+            raise ValueError('Only v2.3 and v2.4 tags at the beginning of a file can be written')
+        version = tag.version
+    else:
+        version = WRITE_VERSION
+    syncsafe = version == 4
+    # Frames that didn't change are those that are written at the same offset as before, with the
+    # same header. When the whole tag was unsynchronized, all frames change.
+    unsynchronized = (FLAG_UNSYNCH & tag.flags) and version < 4
+    chunks = [] # (header, frame or data, unchanged)
+    position = SIZE_HEADER
+    if tag.frame_list:
+        last = tag.frame_list[-1]
+        old_end = last.offset + last._length
+    else:
+        old_end = SIZE_HEADER
+    for frame in tag.frame_list:
+        if frame.frame_id in values:
+            continue
+        flags = frame.rawflags
+        if frame.unsync and not (flags[1] & FRAME24_UNSYNCH):
+            # The unsync flag of the tag applied to this frame
+            flags = bytes([flags[0], flags[1] | FRAME24_UNSYNCH])
+        header = frame.frame_id.encode('ascii') + _encode_id3_size(frame._length, syncsafe) + flags
+        position += len(header)
+        unchanged = not unsynchronized and frame.offset == position and \
+            header == frame.frame_id.encode('ascii') + frame.rawsize + frame.rawflags
+        chunks.append((header, frame, unchanged))
+        position += frame._length
+    for frame_id, value in values.items():
+        if value is None:
+            continue
+        data = _encode_frame_data(frame_id, value, version)
+        header = frame_id.encode('ascii') + _encode_id3_size(len(data), syncsafe) + b'\0\0'
+        chunks.append((header, data, False))
+        position += len(header) + len(data)
+    if tag.exists and position <= tag.size:
+        tagsize = tag.size
+    else:
+        tagsize = position + padding
+    tag_header = b'ID3' + bytes([version, 0, 0]) + _encode_id3_size(tagsize - SIZE_HEADER)
+    old_tag_header = b'ID3' + bytes([version, tag._header.vminor, tag.flags]) + \
+        _encode_id3_size(tag.data_size)
+    in_place = tagsize == tag.size and tag_header == old_tag_header
+    if in_place:
+        start = SIZE_HEADER
+        unchanged_count = 0
+        while unchanged_count < len(chunks) and chunks[unchanged_count][2]:
+            header, frame, unchanged = chunks[unchanged_count]
+            start += len(header) + frame._length
+            unchanged_count += 1
+        # After the old frames, the tag is already padding.
+        end = max(position, old_end)
+        in_place = (end - 1) // WRITE_BLOCK_SIZE <= start // WRITE_BLOCK_SIZE
+    if in_place:
+        parts = []
+        chunks = chunks[unchanged_count:]
+    else:
+        start = 0
+        end = tagsize
+        parts = [tag_header]
+    for header, frame_or_data, unchanged in chunks:
+        parts.append(header)
+        parts.append(_frame_payload(frame_or_data))
+    # All payloads are read before we start writing: they might be where we write.
+    data = b''.join(parts)
+    data += b'\0' * (end - start - len(data))
+    if in_place:
+        with open(path, 'r+b') as fp:
+            fp.seek(start, 0)
+            fp.write(data)
+            fp.flush()
+            os.fsync(fp.fileno())
+    else:
+        _replace_file(path, data, tag.size if tag.exists else 0)
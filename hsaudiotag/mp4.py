@@ -243,7 +243,9 @@ ATOM_SPECS = {
 # Mp4 File **********************************************************
 
 class File(AtomBox):
-    def __init__(self, infile):
+    def __init__(self, infile, fields=None):
+        # Atoms are only read when an attribute needs them, so there's nothing to skip with
+        # `fields`.
         self._fp, self._shouldclose = open_if_filename(infile, 'rb')
         self._fp.seek(0, 2)
         AtomBox.__init__(self, None, 0, (self._fp.tell(), 'root'))
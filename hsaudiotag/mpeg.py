@@ -8,10 +8,21 @@
 
 from . import id3v1
 from . import id3v2
+import mmap
+import os
 import struct
-from struct import unpack
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from struct import unpack, unpack_from
 
-from .util import tryint, FileOrPath
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .util import (tryint, open_if_filename, is_reopenable, wants, FileOrPath, StreamFile,
+    AUDIO_ATTRS, TAG_ATTRS)
 
 HEADER_SIZE = 4
 
@@ -63,6 +74,43 @@ MPEG_CM_UNKNOWN = 4;
 
 MAX_SEEK_BYTES = 4096
 
+# FrameBrowser.stats() reads the audio data in blocks of this size and walks through the frame
+# headers in memory.
+STATS_BLOCK_SIZE = 0x40000
+
+# How Mpeg computes the duration of files without a Xing or VBRI header. DURATION_EXACT reads every
+# frame header when the bitrate varies or when the TLEN tag doesn't match the CBR estimate.
+# DURATION_SAMPLED reads the frames at STATS_SAMPLE_COUNT places in the file and extrapolates (files
+# too small for sampling to be worth it are read entirely). DURATION_FAST only looks at the first
+# frame.
+DURATION_EXACT = 'exact'
+DURATION_SAMPLED = 'sampled'
+DURATION_FAST = 'fast'
+
+# The mode used by Mpeg when none is given.
+DURATION_MODE = DURATION_EXACT
+
+STATS_SAMPLE_COUNT = 64
+
+# FrameBrowser.stats() splits files of at least PARALLEL_STATS_MIN_SIZE bytes in STATS_WORKERS
+# ranges walked by as many processes. With 1 worker, frames are always walked sequentially.
+STATS_WORKERS = 1
+PARALLEL_STATS_MIN_SIZE = 0x4000000
+
+# When looking for a frame at a range boundary, the windows we search overlap by this much so that
+# a frame followed by another one is never split between two windows.
+RESYNC_OVERLAP = 2048
+
+# Mpeg.offset_for_time() uses an index of the offset of every FRAME_INDEX_STEP frame for files
+# without a VBR header seek table.
+FRAME_INDEX_STEP = 8
+
+# Serialized FrameIndex: magic, version, step, frame count, total size, samples per frame, audio
+# size, followed by the offsets as little endian 32-bit integers.
+FRAME_INDEX_MAGIC = b'MPFI'
+FRAME_INDEX_VERSION = 2
+FRAME_INDEX_HEADER = struct.Struct('<4sIIIQIQ')
+
 def get_vbr_offset(version, channel_mode):
     #Depending on mpeg version and mode, the VBR header will be at a different offset
     #after the mpeg header.
@@ -91,6 +139,39 @@ def get_vbr_coefficient(version, layer):
         else:
             return 72     
 
+def _header_key(data):
+    # The bits of a header that determine its validity and size: version, layer, bitrate index,
+    # sample rate index and padding.
+    return (((data >> 17) & 0xf) << 7) | ((data >> 9) & 0x7f)
+
+def _decode_header_key(key):
+    mpeg_id = key >> 9
+    layer = (key >> 7) & 0x3
+    br_id = (key >> 3) & 0xf
+    fr_id = (key >> 1) & 0x3
+    bitrate = BR_LIST[mpeg_id][layer][br_id]
+    sample_rate = SR_LIST[mpeg_id][fr_id]
+    sample_count = SPF_LIST[mpeg_id][layer]
+    if not (sample_count and bitrate and sample_rate):
+        return (False, 0, bitrate, sample_rate, sample_count)
+    padding_size = (4 if layer == ID_LAYER1 else 1) if key & 1 else 0
+    size = (((sample_count // 8) * bitrate * 1000) // sample_rate) + padding_size
+    return (True, size, bitrate, sample_rate, sample_count)
+
+# (valid, size, bitrate, sample_rate, sample_count) for every header key
+HEADER_TABLE = tuple(_decode_header_key(key) for key in range(1 << 11))
+FRAME_SIZES = tuple(decoded[1] for decoded in HEADER_TABLE)
+INVALID_HEADER = (False, 0, 0, 0, 0)
+
+def decode_header(data):
+    """Returns (valid, size, bitrate, sample_rate, sample_count) for header `data` (an int).
+    
+    It's much cheaper than creating a MpegFrameHeader.
+    """
+    if (data & MPEG_SYNC) != MPEG_SYNC:
+        return INVALID_HEADER
+    return HEADER_TABLE[_header_key(data)]
+
 class MpegFrameHeader:
     def __init__(self, data): 
         #data = HEADER_SIZE bytes integer
@@ -104,48 +185,299 @@ class MpegFrameHeader:
         self.padding_size = 0
         self.size = 0
         if (data & MPEG_SYNC) == MPEG_SYNC:
-            self.valid = True
             self.mpeg_id = (data >> 19) & 0x3
             self.layer = (data >> 17) & 0x3
             self.channel_mode = (data >> 6) & 0x3
-            br_id = (data >> 12) & 0xf
-            fr_id = (data >> 10) & 0x3
-            self.bitrate = BR_LIST[self.mpeg_id][self.layer][br_id]
-            self.sample_rate = SR_LIST[self.mpeg_id][fr_id]
-            self.sample_count = SPF_LIST[self.mpeg_id][self.layer]
             if data & MPEG_PAD:
                 self.padding_size = (4 if self.layer == ID_LAYER1 else 1)
-            else:
-                self.padding_size = 0
-            if self.sample_count and self.bitrate and self.sample_rate:
-                sc = self.sample_count
-                sr = self.sample_rate
-                br = self.bitrate
-                pad = self.padding_size
-                self.size = (((sc // 8) * br * 1000) // sr) + pad
-            else:
-                self.valid = False
+            (self.valid, self.size, self.bitrate, self.sample_rate,
+                self.sample_count) = HEADER_TABLE[_header_key(data)]
+    
+
+def _scan_frame_sync(data, start=0, max_candidates=-1):
+    # Returns (index of the sync or -1, index of the next candidate). If `max_candidates` isn't
+    # negative, we stop after that many candidates (\xff bytes).
+    index = data.find(b'\xff', start)
+    while (index > -1) and max_candidates:
+        max_candidates -= 1
+        try:
+            size = decode_header(unpack('!I', data[index:index+HEADER_SIZE])[0])[1]
+            if size:
+                nextindex = index + size
+                try:
+                    if decode_header(unpack('!I', data[nextindex:nextindex+HEADER_SIZE])[0])[0]:
+                        return index, index
+                except struct.error:
+                    pass
+            index = data.find(b'\xff', index+1)
+        except struct.error:
+            index = -1
+    return -1, index
+
+def _find_frame_sync_python(data):
+    return _scan_frame_sync(data)[0]
+
+def _find_frame_sync_numpy(data):
+    # Decodes a header at every offset at once. A candidate is valid when both its header and the
+    # one following its frame are.
+    a = numpy.frombuffer(data, dtype=numpy.uint8).astype(numpy.uint32)
+    if len(a) < HEADER_SIZE:
+        return -1
+    headers = (a[:-3] << 24) | (a[1:-2] << 16) | (a[2:-1] << 8) | a[3:]
+    sizes = _NUMPY_FRAME_SIZES[_header_key(headers)]
+    sizes[(headers & MPEG_SYNC) != MPEG_SYNC] = 0
+    [candidates] = numpy.nonzero(sizes)
+    nextindexes = candidates + sizes[candidates]
+    inside = nextindexes < len(headers)
+    candidates = candidates[inside]
+    [found] = numpy.nonzero(sizes[nextindexes[inside]])
+    return int(candidates[found[0]]) if len(found) else -1
+
+if numpy is not None:
+    # Size of the frame for each header key, 0 for invalid headers.
+    _NUMPY_FRAME_SIZES = numpy.array(FRAME_SIZES, dtype=numpy.int64)
+
+# find_frame_sync() looks at the first SYNC_PYTHON_CANDIDATES candidates (\xff bytes) of a window in
+# Python, which finds the sync of audio data right away. The numpy finder only looks at the rest of
+# windows of at least NUMPY_SYNC_MIN_SIZE bytes in which at least NUMPY_SYNC_MIN_DENSITY of the
+# remaining bytes are candidates, NUMPY_SYNC_CHUNK_SIZE bytes at a time. Otherwise, Python is
+# faster (see benchmarks/sync.py).
+SYNC_PYTHON_CANDIDATES = 64
+NUMPY_SYNC_MIN_SIZE = 4096
+NUMPY_SYNC_MIN_DENSITY = 0.04
+NUMPY_SYNC_CHUNK_SIZE = 8192
+
+# Chunks given to the numpy finder go that far past their end, for the header following the frame
+# of their last candidates.
+_NUMPY_SYNC_OVERLAP = max(FRAME_SIZES) + HEADER_SIZE
+
+def _find_frame_sync_numpy_chunks(data, start):
+    view = memoryview(data)
+    for chunk_start in range(start, len(data), NUMPY_SYNC_CHUNK_SIZE):
+        chunk_end = chunk_start + NUMPY_SYNC_CHUNK_SIZE
+        index = _find_frame_sync_numpy(view[chunk_start:chunk_end+_NUMPY_SYNC_OVERLAP])
+        # Past the end of the chunk, candidates before `index` might not have been checked.
+        if -1 < index < NUMPY_SYNC_CHUNK_SIZE:
+            return chunk_start + index
+    return -1
+
+def find_frame_sync(data):
+    """Returns the index of the first valid frame header in `data` that is followed by another
+    valid header, or -1 if there's none.
     
+    Uses numpy, if it's installed, on big windows full of sync candidates, such as junk data.
+    """
+    if numpy is None or len(data) < NUMPY_SYNC_MIN_SIZE:
+        return _find_frame_sync_python(data)
+    index, position = _scan_frame_sync(data, 0, SYNC_PYTHON_CANDIDATES)
+    if index > -1 or position < 0:
+        return index
+    if data.count(b'\xff', position) < (len(data) - position) * NUMPY_SYNC_MIN_DENSITY:
+        return _scan_frame_sync(data, position)[0]
+    return _find_frame_sync_numpy_chunks(data, position)
+
+XING_FRAMES = 0x1
+XING_BYTES = 0x2
+XING_TOC = 0x4
+XING_SCALE = 0x8
+XING_HEADER_SIZE = 120 # with all fields
+LAME_HEADER_SIZE = 36
+LAME_ENCODERS = (b'LAME', b'Lavf', b'Lavc')
 
 class XingHeader:
-    def __init__(self, data): #data is a 128 bytes str
-        self.valid = data[:4] == b'Xing'
-        self.frames = unpack('!I', data[8:12])[0]
-        self.size = unpack('!I', data[12:16])[0]
-        self.scale = data[119]
+    # Xing headers are written in VBR files, and Info headers (the same thing with another id) in
+    # CBR files. Fields are only there if their flag is set.
+    def __init__(self, data): #data is a XING_HEADER_SIZE + LAME_HEADER_SIZE bytes str
+        self.valid = data[:4] in (b'Xing', b'Info')
+        self.cbr = data[:4] == b'Info'
+        self.frames = 0
+        self.size = 0
+        self.toc = None
+        self.scale = 0
+        self.lame = None
+        [flags] = unpack('!I', data[4:8])
+        offset = 8
+        if flags & XING_FRAMES:
+            [self.frames] = unpack('!I', data[offset:offset+4])
+            offset += 4
+        if flags & XING_BYTES:
+            [self.size] = unpack('!I', data[offset:offset+4])
+            offset += 4
+        if flags & XING_TOC:
+            self.toc = data[offset:offset+100]
+            offset += 100
+        if flags & XING_SCALE:
+            [self.scale] = unpack('!I', data[offset:offset+4])
+            offset += 4
+        lame_data = data[offset:offset+LAME_HEADER_SIZE]
+        if lame_data[:4] in LAME_ENCODERS and len(lame_data) == LAME_HEADER_SIZE:
+            self.lame = LameHeader(lame_data)
+    
+
+class LameHeader:
+    # The extension LAME (and encoders mimicking it) writes after the Xing/Info header.
+    def __init__(self, data): #data is a LAME_HEADER_SIZE bytes str
+        self.encoder = str(data[:9], 'latin-1').rstrip('\0 ')
+        self.revision = data[9] >> 4
+        self.vbr_method = data[9] & 0xf
+        self.bitrate = data[20]
+        # Number of samples added by the encoder at the start and at the end of the stream
+        delay_and_padding = (data[21] << 16) | (data[22] << 8) | data[23]
+        self.delay = delay_and_padding >> 12
+        self.padding = delay_and_padding & 0xfff
+        [self.music_length] = unpack('!I', data[28:32])
     
+FHG_HEADER_SIZE = 26
+
 class FhgHeader:
-    def __init__(self, data):
+    def __init__(self, data): #data is a FHG_HEADER_SIZE bytes str
         self.valid = data[:4] == b'VBRI'
         self.frames = unpack('!I', data[14:18])[0]
         self.size = unpack('!I', data[10:14])[0]
         self.scale = unpack('B', data[9:10])[0]
+        self.toc = []
+        self.toc_size = 0
+        self.frames_per_entry = 0
+        self._entry_size = 0
+        self._toc_scale = 0
+        if len(data) >= FHG_HEADER_SIZE:
+            entry_count, self._toc_scale, self._entry_size, self.frames_per_entry = \
+                unpack('!4H', data[18:26])
+            self.toc_size = entry_count * self._entry_size
+    
+    def read_toc(self, data):
+        # `data` is the `toc_size` bytes following the header. The toc is a list of the size, in
+        # bytes, of each `frames_per_entry` frames block.
+        size = self._entry_size
+        self.toc = [int.from_bytes(data[i:i+size], 'big') * self._toc_scale
+            for i in range(0, len(data) - size + 1, size)]
     
 class ComputedVBRHeader:
-    def __init__(self, frame_browser):
+    def __init__(self, frame_browser, frame_index=None):
+        self.valid = True
+        if frame_index is not None:
+            self.frames, self.size = frame_index.frame_count, frame_index.total_size
+        else:
+            self.frames, self.size = frame_browser.stats()
+    
+
+class SampledVBRHeader:
+    def __init__(self, frame_browser, audio_size):
         self.valid = True
-        self.frames, self.size = frame_browser.stats()
+        self.frames, self.size = frame_browser.sampled_stats(audio_size)
+    
+
+def walk_frames(fp, position, end=None, offsets=None, step=1, stop=None, headers=None):
+    """Reads the frames of `fp` starting at `position` until an invalid header or, if `end` is
+    given, a frame that ends after it. If `stop` is given, we also stop at the first frame starting
+    at or after it.
+    
+    Returns (frame_count, total_size, position, header), `position` being the end of the last
+    frame and `header` (an int) the data that was found there. The data is read in large blocks
+    and frame sizes are looked up by header, which is much faster than using a FrameBrowser. If
+    `offsets` (an array) is given, the position of every `step` frame is appended to it. If
+    `headers` (an array) is given, the header of every frame is appended to it.
+    """
+    fp.seek(position, 0)
+    buf = b''
+    buf_start = position
+    # Files have only a few distinct headers, so a dict keyed by the whole header is faster than
+    # computing a key for HEADER_TABLE each time.
+    sizes = {}
+    frame_count = 0
+    total_size = 0
+    data = 0
+    if stop is None:
+        stop = sys.maxsize
+    while position < stop:
+        offset = position - buf_start
+        if offset + HEADER_SIZE > len(buf):
+            # We need another block. What's left of the current one (the beginning of a header
+            # split between two blocks) is carried over.
+            if offset < len(buf):
+                buf = buf[offset:] + fp.read(STATS_BLOCK_SIZE)
+            else:
+                fp.seek(position, 0)
+                buf = fp.read(STATS_BLOCK_SIZE)
+            buf_start = position
+            offset = 0
+            if len(buf) < HEADER_SIZE:
+                data = 0
+                break
+        [data] = unpack_from('!I', buf, offset)
+        try:
+            size = sizes[data]
+        except KeyError:
+            size = sizes[data] = decode_header(data)[1]
+        if not size:
+            break
+        if (end is not None) and (position + size > end):
+            break
+        if (offsets is not None) and not (frame_count % step):
+            offsets.append(position)
+        if headers is not None:
+            headers.append(data)
+        frame_count += 1
+        total_size += size
+        position += size
+    return (frame_count, total_size, position, data)
+
+def _resync(fp, start, stop):
+    # Returns the position of the first frame (followed by another one) between `start` and
+    # `stop`, or None if there's none.
+    position = start
+    while position < stop:
+        fp.seek(position, 0)
+        data = fp.read(MAX_SEEK_BYTES)
+        index = find_frame_sync(data)
+        if index > -1:
+            return position + index if position + index < stop else None
+        if len(data) < MAX_SEEK_BYTES:
+            return None
+        position += MAX_SEEK_BYTES - RESYNC_OVERLAP
+    return None
+
+def _walk_range(path, start, stop, resync):
+    # Walks the frames of `path` that start between `start` and `stop`. Unless `resync` is false,
+    # we first look for a frame from `start`. Returns (first_frame, frame_count, total_size, end,
+    # broken), `broken` being whether the walk ended on an invalid header rather than at `stop`.
+    with open(path, 'rb') as fp:
+        first = _resync(fp, start, stop) if resync else start
+        if first is None:
+            return (None, 0, 0, stop, False)
+        frame_count, total_size, end, _ = walk_frames(fp, first, stop=stop)
+    return (first, frame_count, total_size, end, end < stop)
+
+def parallel_stats(path, start, workers=None):
+    """Returns (frame_count, total_size, end) for the frames of `path` from `start`.
     
+    The file is split in as many ranges as `workers` (os.cpu_count() if None), each walked by a
+    process after having looked for a frame the way FrameBrowser does. The result is exactly the
+    one of a sequential walk: when the frame found at the start of a range isn't where the walk of
+    the previous range ended, the range is walked again from there.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    size = os.path.getsize(path)
+    boundaries = [start + i * (size - start) // workers for i in range(workers)] + [size]
+    ranges = list(zip(boundaries, boundaries[1:]))
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(_walk_range, path, range_start, stop, i > 0)
+            for i, (range_start, stop) in enumerate(ranges)]
+        results = [future.result() for future in futures]
+    frame_count = total_size = 0
+    position = start
+    for (range_start, stop), result in zip(ranges, results):
+        if result[0] != position:
+            # Either the walk of the previous range ended past this whole range, or the resync was
+            # fooled by data looking like a pair of frames.
+            result = _walk_range(path, position, stop, False)
+        first, range_frame_count, range_size, position, broken = result
+        frame_count += range_frame_count
+        total_size += range_size
+        if broken:
+            break
+    return (frame_count, total_size, position)
 
 class FrameBrowser:
     def __init__(self, fp):
@@ -176,25 +508,44 @@ class FrameBrowser:
             if h.valid:
                 self.position += tag_index + h.tagsize
                 return self._seek()
-        index = data.find(b'\xff')
-        while (index > -1):
-            try:
-                result = MpegFrameHeader(unpack('!I', data[index:index+HEADER_SIZE])[0])
-                if result.valid:
-                    nextindex = index + result.size
-                    try:
-                        next = MpegFrameHeader(unpack('!I', data[nextindex:nextindex+HEADER_SIZE])[0])
-                        if next.valid:
-                            self.position += index
-                            self.frame = result
-                            return True
-                    except struct.error:
-                        pass
-                index = data.find(b'\xff', index+1)
-            except struct.error:
-                index = -1
+        index = find_frame_sync(data)
+        if index > -1:
+            self.position += index
+            self.frame = MpegFrameHeader(unpack('!I', data[index:index+HEADER_SIZE])[0])
+            return True
         return False
     
+    def sampled_stats(self, audio_size, sample_count=None):
+        """Estimates (frame_count, total_size) from the frames found at `sample_count` places evenly
+        spread over the `audio_size` bytes starting at the first frame.
+        
+        We look for a frame at each place and read the frames following it in the next
+        MAX_SEEK_BYTES. Places where we find no frame are considered not to be audio data.
+        """
+        if sample_count is None:
+            sample_count = STATS_SAMPLE_COUNT
+        found = frame_count = total_size = 0
+        for i in range(sample_count):
+            self.fp.seek(self.initial_position + i * audio_size // sample_count, 0)
+            data = self.fp.read(MAX_SEEK_BYTES)
+            # In audio data, the sync is found in the first few bytes, which is faster without numpy
+            index = _find_frame_sync_python(data)
+            if index < 0:
+                continue
+            found += 1
+            while index + HEADER_SIZE <= len(data):
+                valid, size = decode_header(unpack_from('!I', data, index)[0])[:2]
+                if not valid:
+                    break
+                frame_count += 1
+                total_size += size
+                index += size
+        self.first()
+        if not frame_count:
+            return (0, 0)
+        estimated_size = audio_size * found // sample_count
+        return (round(estimated_size * frame_count / total_size), estimated_size)
+    
     def first(self):
         self.fp.seek(self.initial_position, 0)
         self.frame_index = 0
@@ -208,58 +559,372 @@ class FrameBrowser:
             self.frame_index += 1
         return self.frame
     
-    def stats(self):
-        """Iterates over all frames and return (frame_count, total_size)"""
-        self.first()
-        size = self.frame.size
-        while next(self).valid:
-            size += self.frame.size
-        return (self.frame_index, size)
+    def _walk(self, offsets=None, step=1):
+        # Walks through all frames in memory and returns (frame_count, total_size). If `offsets`
+        # (an array) is given, the offset of every `step` frame is appended to it.
+        frame_count, total_size, position, data = walk_frames(self.fp, self.initial_position,
+            offsets=offsets, step=step)
+        # Leave the browser in the same state next() would have.
+        self.frame_index = frame_count
+        self.position = position
+        self.frame = MpegFrameHeader(data)
+        return (frame_count, total_size)
+    
+    def stats(self, workers=None):
+        """Iterates over all frames and return (frame_count, total_size)
+        
+        This is the same as calling next() until we reach an invalid frame, but the data is read
+        in large blocks and frame sizes are looked up by header, which is much faster.
+        
+        If `workers` (STATS_WORKERS if None) is more than 1, files of PARALLEL_STATS_MIN_SIZE bytes
+        or more are walked by that many processes (see parallel_stats()). This requires a file
+        with a `path`, such as the ones Mpeg opens.
+        """
+        if workers is None:
+            workers = STATS_WORKERS
+        path = getattr(self.fp, 'path', None)
+        if (workers > 1) and path and (os.path.getsize(path) >= PARALLEL_STATS_MIN_SIZE):
+            frame_count, total_size, position = parallel_stats(path, self.initial_position,
+                workers)
+            self.fp.seek(position, 0)
+            self._read()
+            self.frame_index = frame_count
+            return (frame_count, total_size)
+        return self._walk()
+    
+    def build_index(self, step=None, audio_size=0):
+        """Iterates over all frames and returns a FrameIndex of them. `audio_size` is stored in the
+        index, to recognize the file it's for.
+        """
+        if step is None:
+            step = FRAME_INDEX_STEP
+        # The browser might be past the last frame, the first one is always valid.
+        sample_count = self.first().sample_count
+        offsets = array('I')
+        frame_count, total_size = self._walk(offsets, step)
+        return FrameIndex(offsets, step, frame_count, total_size, sample_count, audio_size)
     
 
-def get_vbr_info(fp, b):
+class FrameIndex:
+    """Offsets of every `step` frames of a file, starting with its first frame.
+    
+    `frame_count` and `total_size` are what `FrameBrowser.stats()` returns, `sample_count` is the
+    number of samples per frame and `audio_size` is the `Mpeg.audio_size` of the indexed file. An index can be saved with `to_bytes()` or `save()` and loaded
+    back with `from_bytes()` or `load()`, which maps the file rather than reading it. Loaded
+    indexes have a memoryview as `offsets`.
+    """
+    def __init__(self, offsets, step, frame_count, total_size=0, sample_count=0, audio_size=0):
+        self.offsets = offsets
+        self.step = step
+        self.frame_count = frame_count
+        self.total_size = total_size
+        self.sample_count = sample_count
+        self.audio_size = audio_size
+    
+    @classmethod
+    def from_bytes(cls, data):
+        """Returns the FrameIndex serialized in `data`, a bytes-like object. Raises ValueError if
+        it's not a valid index.
+        """
+        view = memoryview(data)
+        if (len(view) < FRAME_INDEX_HEADER.size) or ((len(view) - FRAME_INDEX_HEADER.size) % 4):
+            raise ValueError("Invalid frame index size")
+        magic, version, step, frame_count, total_size, sample_count, audio_size = \
+            FRAME_INDEX_HEADER.unpack_from(view)
+        if (magic != FRAME_INDEX_MAGIC) or (version != FRAME_INDEX_VERSION) or not step:
+            raise ValueError("Not a frame index")
+        offsets = view[FRAME_INDEX_HEADER.size:]
+        if sys.byteorder == 'little':
+            offsets = offsets.cast('I')
+        else:
+            offsets = array('I', offsets.tobytes())
+            offsets.byteswap()
+        return cls(offsets, step, frame_count, total_size, sample_count, audio_size)
+    
+    @classmethod
+    def load(cls, path):
+        """Returns the FrameIndex saved at `path`. The file is memory-mapped."""
+        with open(path, 'rb') as fp:
+            try:
+                data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # empty file
+                data = b''
+        return cls.from_bytes(data)
+    
+    def to_bytes(self):
+        offsets = array('I', self.offsets)
+        if sys.byteorder != 'little':
+            offsets.byteswap()
+        header = FRAME_INDEX_HEADER.pack(FRAME_INDEX_MAGIC, FRAME_INDEX_VERSION, self.step,
+            self.frame_count, self.total_size, self.sample_count, self.audio_size)
+        return header + offsets.tobytes()
+    
+    def save(self, path):
+        with open(path, 'wb') as fp:
+            fp.write(self.to_bytes())
+    
+    def offset_for_frame(self, frame):
+        """Returns the offset of the closest indexed frame at or before `frame`."""
+        if not self.offsets:
+            return 0
+        entry = min(max(frame, 0) // self.step, len(self.offsets) - 1)
+        return self.offsets[entry]
+    
+
+class FrameStats:
+    """Frame count and total size of a mpeg file that might still be growing (a live recording).
+    
+    Each call to `update()` only reads the data added since the previous one. Only complete frames
+    are counted: `position` is the end of the last one, where the next update starts. A frame that
+    is still being written is thus counted once it's complete, and frames stop where an id3v1 tag
+    starts, even if it's appended later.
+    """
+    def __init__(self):
+        self.position = None
+        self.frame_count = 0
+        self.total_size = 0
+        self.sample_rate = 0
+        self.sample_count = 0
+    
+    def _find_first_frame(self, fp):
+        fp.seek(0, 0)
+        b = FrameBrowser(fp)
+        if b.frame.valid:
+            self.position = b.position
+            self.sample_rate = b.frame.sample_rate
+            self.sample_count = b.frame.sample_count
+    
+    def update(self, file_or_path):
+        """Counts the frames added to `file_or_path` since the last update and returns
+        (frame_count, total_size) for the whole file.
+        """
+        with FileOrPath(file_or_path) as fp:
+            if self.position is None:
+                self._find_first_frame(fp)
+                if self.position is None:
+                    return (0, 0)
+            fp.seek(0, 2)
+            end = fp.tell()
+            if end >= self.position + id3v1.TAG_SIZE:
+                fp.seek(-id3v1.TAG_SIZE, 2)
+                if fp.read(3) == b'TAG':
+                    end -= id3v1.TAG_SIZE
+            frame_count, total_size, position, _ = walk_frames(fp, self.position, end)
+        self.frame_count += frame_count
+        self.total_size += total_size
+        self.position = position
+        return (self.frame_count, self.total_size)
+    
+    @property
+    def duration(self):
+        if not self.sample_rate:
+            return 0
+        return self.frame_count * self.sample_count // self.sample_rate
+    
+
+def should_sample(duration_mode, audio_size):
+    # Sampling a file reads at most STATS_SAMPLE_COUNT * MAX_SEEK_BYTES bytes. Reading the whole
+    # thing isn't much more expensive when it's only a few times that.
+    return (duration_mode == DURATION_SAMPLED) and \
+        (audio_size > STATS_SAMPLE_COUNT * MAX_SEEK_BYTES * 4)
+
+def get_vbr_info(fp, b, duration_mode=DURATION_EXACT, audio_size=0, frame_index=None):
     fheader = b.frame
     vbr_offset = get_vbr_offset(fheader.mpeg_id, fheader.channel_mode)
     fp.seek(vbr_offset + 4, 1)
     vbr_id = fp.read(4)
     fp.seek(-4, 1)
-    if vbr_id == b'Xing':
-        return XingHeader(fp.read(128))
+    if vbr_id in (b'Xing', b'Info'):
+        return XingHeader(fp.read(XING_HEADER_SIZE + LAME_HEADER_SIZE))
     if vbr_id == b'VBRI':
-        return FhgHeader(fp.read(18))
+        result = FhgHeader(fp.read(FHG_HEADER_SIZE))
+        result.read_toc(fp.read(result.toc_size))
+        return result
+    if duration_mode == DURATION_FAST:
+        return None
     br = b.frame.bitrate
     for i in range(4):
         if next(b).bitrate != br:
+            if frame_index is not None:
+                return ComputedVBRHeader(b, frame_index)
+            if should_sample(duration_mode, audio_size):
+                return SampledVBRHeader(b, audio_size)
             return ComputedVBRHeader(b)
 
 class Mpeg:
-    def __init__(self, infile):
-        with FileOrPath(infile) as fp:
-            self.id3v1 = id3v1.Id3v1(fp)
-            self.id3v2 = id3v2.Id3v2(fp)
+    """Reads the tags of a mpeg file right away, and its audio properties (which require finding
+    and browsing mpeg frames) on first access.
+    
+    Audio properties are only read lazily when `infile` is a path or a reopenable file (see
+    `util.PrefetchFile`). Other file objects are entirely read at initialization. Files given to us
+    are never closed, the caller owns them. Files we open ourselves are closed once audio properties
+    are read, and opened again if we need to read more (for `frame_index`, for example).
+    
+    With `fields` (see `util.wants`), tag frames aren't read when no tag attribute nor duration is
+    wanted, and the id3v1 tag isn't read when the id3v2 tag is enough. Other attributes might then
+    be wrong.
+    
+    `duration_mode` is one of the DURATION_* constants (None for DURATION_MODE). It tells how much
+    work we're ready to do to compute the duration of files without a VBR header. Once read, the
+    `duration_mode` attribute tells which mode actually gave the duration. It's DURATION_EXACT
+    when the shortcut wasn't needed, for example with a VBR header.
+    
+    `frame_index` is a `FrameIndex` of the file saved from a previous `frame_index` attribute. It
+    replaces reading all frames when we need to (for the exact duration or for seeking). An index
+    that doesn't start at the first frame of the file, or that was built for a file with another
+    audio size, is ignored.
+    """
+    def __init__(self, infile, fields=None, duration_mode=None, frame_index=None):
+        if duration_mode is None:
+            duration_mode = DURATION_MODE
+        self._requested_duration_mode = duration_mode
+        self._fp, self._shouldclose = open_if_filename(infile, prefetch=True)
+        self._lazy = is_reopenable(self._fp)
+        self._frame_browser = None
+        self._frame_index = frame_index
+        self._frame_index_checked = frame_index is None
+        self._vbr_read = False
+        try:
+            fp = self._fp
+            want_tags = wants(fields, TAG_ATTRS)
+            # TLEN is used to validate the duration
+            self.id3v2 = id3v2.Id3v2(fp, read_frames=want_tags or wants(fields, {'duration'}))
+            # The id3v1 tag size is a part of the duration computation
+            if (want_tags and not self.id3v2.exists) or wants(fields, {'duration', 'audio_size'}):
+                self.id3v1 = id3v1.Id3v1(fp)
+            else:
+                self.id3v1 = id3v1.Id3v1(None)
+            fp.seek(0, 2)
+            self.size = tryint(fp.tell())
+            if not self._lazy and wants(fields, {'duration', 'bitrate'}):
+                self._read_vbr()
+        except Exception:
+            self.close()
+            raise
+        # When audio properties are read lazily, the file stays open (with its prefetched windows)
+        # until they are.
+        if not (self._lazy and wants(fields, AUDIO_ATTRS)):
+            self.close()
+    
+    #--- Private
+    def _get_frame_browser(self):
+        if self._frame_browser is None:
             if self.id3v2.exists and (self.id3v2.position == id3v2.POS_BEGIN):
                 start_offset = self.id3v2.size
             else:
                 start_offset = 0
-            fp.seek(start_offset, 0)
-            b = FrameBrowser(fp)
-            self._frameheader = b.frame
-            self.audio_offset = b.position
-            fp.seek(b.position, 0) #Needed for VBR seeking
-            self.vbr = get_vbr_info(fp, b)
-            fp.seek(0, 2)
-            self.size = tryint(fp.tell())
-            if self.bitrate:
+            self._fp.seek(start_offset, 0)
+            b = FrameBrowser(self._fp)
+            # The browser moves when we look for VBR info, so we remember where the first frame is.
+            self._first_frame = (b.frame, b.position)
+            self._frame_browser = b
+        return self._frame_browser
+    
+    def _read_vbr(self):
+        b = self._get_frame_browser()
+        try:
+            self._fp.seek(b.position, 0) #Needed for VBR seeking
+            mode = self._requested_duration_mode
+            if isinstance(self._fp, StreamFile):
+                # The middle of a stream isn't kept, frames can't be walked (nor sampled) there.
+                mode = DURATION_FAST
+            index = self._get_frame_index(build=False)
+            self._vbr = get_vbr_info(self._fp, b, mode, self.audio_size, index)
+            self._vbr_read = True
+            if isinstance(self._vbr, SampledVBRHeader):
+                self._duration_mode = DURATION_SAMPLED
+            elif (self._vbr is None) and (mode == DURATION_FAST):
+                self._duration_mode = DURATION_FAST
+            else:
+                self._duration_mode = DURATION_EXACT
+            if isinstance(self._vbr, XingHeader) and self._vbr.frames and self.sample_rate:
+                # We know the number of samples, no need to guess.
+                self._duration = self.sample_count // self.sample_rate
+            elif self.bitrate:
                 #(audio_size * 8) / (bitrate * 1000) == audio_size / (bitrate * 125)
-                self.duration = self.audio_size // (self.bitrate * 125)
+                self._duration = self.audio_size // (self.bitrate * 125)
                 # 'and self.id3v2.duration' is there to avoid reading the mpeg frames when there is no TLEN in the tag.
-                if self.id3v2.exists and self.id3v2.duration and (self.id3v2.duration != self.duration):
+                # VBR headers are trusted, they're written by the encoder.
+                trusted = isinstance(self._vbr, FhgHeader) or (self._duration_mode == DURATION_FAST)
+                if not trusted and self.id3v2.exists and self.id3v2.duration and \
+                        (self.id3v2.duration != self._duration):
                     # Tag duration and guessed durations are wrong. Read all frames
-                    frames, size = b.stats()
-                    self.duration = size // (self.bitrate * 125)
+                    if self._get_frame_index(build=False) is not None:
+                        size = self._frame_index.total_size
+                    elif should_sample(mode, self.audio_size):
+                        frames, size = b.sampled_stats(self.audio_size)
+                        self._duration_mode = DURATION_SAMPLED
+                    else:
+                        frames, size = b.stats()
+                    self._duration = size // (self.bitrate * 125)
             else:
-                self.duration = 0
-            self.valid = self._frameheader.valid
+                self._duration = 0
+        finally:
+            self.close()
+    
+    def _get_frame_index(self, build=True):
+        b = self._get_frame_browser()
+        if not self._frame_index_checked:
+            # The index given to us might be for another file, or for an older version of this one.
+            index = self._frame_index
+            audio_end = self.audio_offset + self.audio_size
+            if not (index.offsets and (index.offsets[0] == self.audio_offset) and
+                    (index.audio_size == self.audio_size) and (index.offsets[-1] < audio_end)):
+                self._frame_index = None
+            self._frame_index_checked = True
+        if (self._frame_index is None) and build:
+            try:
+                self._frame_index = b.build_index(audio_size=self.audio_size)
+            finally:
+                self.close()
+        return self._frame_index
+    
+    def _offset_from_xing_toc(self, seconds):
+        # The toc has 100 entries, the offset (/256 of the file size) of each percent of the duration
+        toc = self.vbr.toc
+        duration = self.vbr.frames * self._frameheader.sample_count / self.sample_rate
+        percent = min(max(seconds * 100 / duration, 0), 100)
+        index = min(int(percent), 99)
+        before = toc[index]
+        after = toc[index + 1] if index < 99 else 256
+        position = before + (after - before) * (percent - index)
+        return self.audio_offset + int(position * self.vbr.size / 256)
+    
+    def _offset_from_fhg_toc(self, seconds):
+        # Each entry of the toc is the size of a block of `frames_per_entry` frames. Offsets are
+        # relative to the VBRI frame, like Xing offsets are relative to the Xing frame.
+        vbr = self.vbr
+        frame = seconds * self.sample_rate / self._frameheader.sample_count
+        entry, fraction = divmod(max(frame, 0) / vbr.frames_per_entry, 1)
+        entry = int(entry)
+        if entry >= len(vbr.toc):
+            entry, fraction = len(vbr.toc) - 1, 1
+        return self.audio_offset + sum(vbr.toc[:entry]) + int(vbr.toc[entry] * fraction)
+    
+    #--- Public
+    def close(self):
+        # The files we open are reopenable, they're opened again if we need to read audio
+        # properties later.
+        if self._shouldclose:
+            self._fp.close()
+    
+    def offset_for_time(self, seconds):
+        """Returns the offset in the file where the audio at `seconds` is.
+        
+        The seek table of Xing and VBRI headers is used when there's one. The result is then an
+        approximation (with Xing headers, within 1% of the duration), and it isn't always at the
+        start of a frame. Otherwise, we use `frame_index`, and the result is the start of a frame
+        at most FRAME_INDEX_STEP frames before `seconds`.
+        """
+        if not (self.valid and self.sample_rate):
+            return 0
+        vbr = self.vbr
+        if isinstance(vbr, XingHeader) and vbr.toc and vbr.frames and vbr.size:
+            return self._offset_from_xing_toc(seconds)
+        if isinstance(vbr, FhgHeader) and vbr.toc and vbr.frames_per_entry:
+            return self._offset_from_fhg_toc(seconds)
+        frame = int(seconds * self.sample_rate / self._frameheader.sample_count)
+        return self.frame_index.offset_for_frame(frame)
     
     #--- Properties
     @property
@@ -269,6 +934,43 @@ class Mpeg:
         elif self.id3v1.exists:
             return self.id3v1
     
+    @property
+    def _frameheader(self):
+        self._get_frame_browser()
+        return self._first_frame[0]
+    
+    @property
+    def audio_offset(self):
+        self._get_frame_browser()
+        return self._first_frame[1]
+    
+    @property
+    def vbr(self):
+        if not self._vbr_read:
+            self._read_vbr()
+        return self._vbr
+    
+    @property
+    def duration(self):
+        if not self._vbr_read:
+            self._read_vbr()
+        return self._duration
+    
+    @property
+    def duration_mode(self):
+        if not self._vbr_read:
+            self._read_vbr()
+        return self._duration_mode
+    
+    @property
+    def frame_index(self):
+        # A FrameIndex of the file, built (by reading all frames) on first access.
+        return self._get_frame_index()
+    
+    @property
+    def valid(self):
+        return self._frameheader.valid
+    
     @property
     def audio_size(self):
         result = self.size - self.id3v1.size - self.audio_offset
@@ -278,7 +980,9 @@ class Mpeg:
     
     @property
     def bitrate(self):
-        if self.vbr and (self.vbr.frames > 0):
+        if self.vbr and getattr(self.vbr, 'cbr', False):
+            return self._frameheader.bitrate
+        elif self.vbr and (self.vbr.frames > 0):
             coeff = get_vbr_coefficient(self._frameheader.mpeg_id, self._frameheader.layer)
             pad = self._frameheader.padding_size
             sr = self._frameheader.sample_rate
@@ -287,6 +991,17 @@ class Mpeg:
         else:
             return self._frameheader.bitrate
     
+    @property
+    def sample_count(self):
+        # The exact number of samples, without the encoder delay and padding, when a Xing or Info
+        # header tells it. 0 otherwise.
+        if not (isinstance(self.vbr, XingHeader) and self.vbr.frames):
+            return 0
+        result = self.vbr.frames * self._frameheader.sample_count
+        if self.vbr.lame is not None:
+            result -= self.vbr.lame.delay + self.vbr.lame.padding
+        return max(result, 0)
+    
     @property
     def sample_rate(self):
         return self._frameheader.sample_rate
@@ -9,7 +9,7 @@
 from struct import unpack
 import re
 
-from .util import FileOrPath
+from .util import FileOrPath, wants, TAG_ATTRS
 
 RE_STARTS_WITH_DIGIT = re.compile(r"^\d+")
 
@@ -81,8 +81,12 @@ class VorbisComment:
     
 
 class Vorbis:
-    def __init__(self, infile):
-        with FileOrPath(infile, 'rb') as fp:
+    def __init__(self, infile, fields=None):
+        # The comment page isn't decoded if no tag is wanted, and the last page isn't looked for if
+        # the duration isn't.
+        self.fields = fields
+        with FileOrPath(infile, prefetch=True) as fp:
+            self._empty()
             try:
                 self._read(fp)
             except Exception: #The unpack error doesn't seem to have a class. I have to catch all here
@@ -125,17 +129,18 @@ class Vorbis:
         page = next(page)
         if not page.valid:
             raise InvalidFileError()
-        data = page.read()
-        if data[:7] != b'\x03vorbis':
-            raise InvalidFileError()
-        comment = VorbisComment(data[7:])
-        self.artist = comment.artist
-        self.album = comment.album
-        self.title = comment.title
-        self.track = comment.track
-        self.year = comment.year
-        self.genre = comment.genre
-        self.comment = comment.comment
+        if wants(self.fields, TAG_ATTRS):
+            data = page.read()
+            if data[:7] != b'\x03vorbis':
+                raise InvalidFileError()
+            comment = VorbisComment(data[7:])
+            self.artist = comment.artist
+            self.album = comment.album
+            self.title = comment.title
+            self.track = comment.track
+            self.year = comment.year
+            self.genre = comment.genre
+            self.comment = comment.comment
         
         #Get third page for audio_offset
         page = next(page)
@@ -144,10 +149,17 @@ class Vorbis:
         self.audio_offset = page.start_offset
         self.audio_size = self.size - self.audio_offset
         
+        if not wants(self.fields, {'duration'}):
+            self.valid = True
+            return
         #Seek last page to get sample count. It's impossible to not have at least one page in
         #the last 64kb.
         fp.seek(-0x10000, 2)
         last_data = fp.read()
+        if not last_data:
+            # The end of the stream isn't available (see util.StreamFile), the duration is unknown.
+            self.valid = True
+            return
         last_offset = last_data.rfind(VorbisPage.OGG_PAGE_ID)
         to_seek = 0x10000 - last_offset
         fp.seek(-to_seek, 2)
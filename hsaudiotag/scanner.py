@@ -0,0 +1,166 @@
+# Created On: 2026-10-18
+# Copyright 2010 Hardcoded Software (http://www.hardcoded.net)
+#
+# This software is licensed under the "BSD" License as described in the "LICENSE" file,
+# which should be included with this package. The terms are also available at
+# http://www.hardcoded.net/licenses/bsd_license
+
+import os
+import os.path as op
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from . import auto, id3v2, mpeg, util
+from .batch import Batch
+
+# Number of paths sent to a worker at once. Sending paths one by one makes IPC dominate the
+# parsing time, which is usually a few hundred microseconds per file.
+CHUNK_SIZE = 64
+
+# Number of chunks that can be waiting in the pool for each worker. When that many are pending, we
+# stop consuming the paths until a chunk is done, which keeps memory bounded on huge libraries.
+PENDING_PER_WORKER = 2
+
+RESULT_ATTRS = tuple(sorted(auto.AUDIO_ATTRS | auto.TAG_ATTRS))
+
+# Module settings changing how files are read. Workers get the values they have in the scanning
+# process: with the spawn and forkserver start methods, workers import the modules anew.
+WORKER_SETTINGS = (
+    (util, 'USE_MMAP'),
+    (util, 'PREFETCH_HEAD_SIZE'),
+    (util, 'PREFETCH_TAIL_SIZE'),
+    (mpeg, 'DURATION_MODE'),
+    (mpeg, 'STATS_SAMPLE_COUNT'),
+    (mpeg, 'STATS_WORKERS'),
+    (mpeg, 'PARALLEL_STATS_MIN_SIZE'),
+    (id3v2, 'LAZY_FRAME_SIZE'),
+)
+
+class Result:
+    """Read-only snapshot of an `auto.File`.
+    
+    Unlike `auto.File`, it doesn't hold the parser object (`original`), which makes it cheap to
+    pickle between processes. If reading the file raised an exception, `error` contains its
+    description and `valid` is False.
+    """
+    __slots__ = ('path', 'valid', 'format', 'error') + RESULT_ATTRS
+    
+    def __init__(self, path, f=None, error=None):
+        self.path = path
+        self.error = error
+        self.valid = f.valid if f is not None else False
+        self.format = f.format if f is not None else ''
+        for attrname in RESULT_ATTRS:
+            value = getattr(f, attrname) if f is not None else auto.default_value(attrname)
+            setattr(self, attrname, value)
+    
+    def __repr__(self):
+        return '<Result %r valid=%r>' % (self.path, self.valid)
+
+
+def iter_paths(paths_or_dirs):
+    """Yields the path of every file in `paths_or_dirs`.
+    
+    `paths_or_dirs` is a path or an iterable of paths. Directories are walked recursively and only
+    the files with an extension known to `auto` are yielded from them. Other paths are yielded as-is.
+    """
+    if isinstance(paths_or_dirs, str):
+        paths_or_dirs = [paths_or_dirs]
+    for path in paths_or_dirs:
+        if not op.isdir(path):
+            yield path
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                ext = op.splitext(filename)[1][1:].lower()
+                if ext in auto.EXT2CLASS:
+                    yield op.join(dirpath, filename)
+
+def read_file(path, fields=None):
+    """Returns a `Result` for `path`. Exceptions are stored in the result rather than raised."""
+    try:
+        return Result(path, auto.File(path, fields=fields))
+    except Exception as e:
+        return Result(path, error='%s: %s' % (e.__class__.__name__, e))
+
+def read_files(paths, fields=None):
+    return [read_file(path, fields) for path in paths]
+
+def read_batch(paths, fields=None):
+    batch = Batch()
+    batch.extend(read_file(path, fields) for path in paths)
+    return batch
+
+def _init_worker(values):
+    for (module, name), value in zip(WORKER_SETTINGS, values):
+        setattr(module, name, value)
+
+def _iter_chunks(paths, chunksize):
+    chunk = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) >= chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _iter_results(futures):
+    # Yields the result container (a list or a batch) of each future.
+    for future in futures:
+        try:
+            yield future.result()
+        except Exception as e:
+            # The worker itself died (BrokenProcessPool). Blame every file of the chunk.
+            error = '%s: %s' % (e.__class__.__name__, e)
+            yield [Result(path, error=error) for path in future.chunk]
+
+def _scan_chunks(paths, workers, chunksize, reader, fields):
+    # Yields the results of `reader(chunk, fields)` for each chunk of `paths` read by the pool.
+    max_pending = workers * PENDING_PER_WORKER
+    values = [getattr(module, name) for module, name in WORKER_SETTINGS]
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(values, )) as executor:
+        pending = set()
+        for chunk in _iter_chunks(paths, chunksize):
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from _iter_results(done)
+            future = executor.submit(reader, chunk, fields)
+            future.chunk = chunk
+            pending.add(future)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            yield from _iter_results(done)
+
+def scan(paths_or_dirs, workers=None, chunksize=CHUNK_SIZE, fields=None):
+    """Reads every file in `paths_or_dirs` (see `iter_paths`) and yields a `Result` for each of them.
+    
+    The files are read by a pool of `workers` processes (`os.cpu_count()` if None) and results are
+    yielded as they come, which means that they're not in the same order as the paths. With
+    `workers` set to 0 or 1, files are read sequentially in the current process. `fields` is passed
+    to `auto.File`. Workers use the current values of the module settings in WORKER_SETTINGS.
+    """
+    paths = iter_paths(paths_or_dirs)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        yield from (read_file(path, fields) for path in paths)
+        return
+    for results in _scan_chunks(paths, workers, chunksize, read_files, fields):
+        yield from results
+
+def scan_batch(paths_or_dirs, workers=None, chunksize=CHUNK_SIZE, fields=None):
+    """Same as `scan`, but returns all results in a single `batch.Batch`.
+    
+    Workers send their results back as batches too, which is much cheaper to pickle than `Result`
+    instances. No per-file object is kept around, so it's the way to go for huge libraries.
+    """
+    paths = iter_paths(paths_or_dirs)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        return read_batch(paths, fields)
+    result = Batch()
+    for results in _scan_chunks(paths, workers, chunksize, read_batch, fields):
+        result.extend(results)
+    return result
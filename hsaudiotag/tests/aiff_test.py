@@ -38,3 +38,10 @@ def test_with_id3():
     eq_(f.audio_offset, 46)
     eq_(f.audio_size, 42)
 
+
+def test_fields():
+    # The ID3 chunk is skipped when no tag is wanted.
+    f = aiff.File(TestData.filepath('aiff/with_id3.aif'), fields={'duration'})
+    assert f.valid
+    eq_(f.duration, 132)
+    assert f.tag is None
@@ -0,0 +1,78 @@
+# Created On: 2026-10-18
+# Copyright 2010 Hardcoded Software (http://www.hardcoded.net)
+#
+# This software is licensed under the "BSD" License as described in the "LICENSE" file,
+# which should be included with this package. The terms are also available at
+# http://www.hardcoded.net/licenses/bsd_license
+
+import io
+
+from pytest import fixture, skip
+
+from .. import analysis, mpeg
+from ..analysis import MpegAnalysis
+from .squeeze import expand_mpeg
+from .util import TestData, eq_
+
+BITRATE_INDEXES = {32: 1, 64: 5, 96: 7, 112: 8, 128: 9, 160: 10, 256: 13}
+
+def frames(bitrates, channel_mode=0):
+    # MPEG1 layer 3 frames at 44100 hz
+    result = []
+    for bitrate in bitrates:
+        header = b'\xff\xfb' + bytes([BITRATE_INDEXES[bitrate] << 4, channel_mode << 6])
+        result.append(header.ljust(144 * bitrate * 1000 // 44100, b'\x00'))
+    return b''.join(result)
+
+@fixture(params=['numpy', 'python'])
+def with_and_without_numpy(request, monkeypatch):
+    if request.param == 'numpy':
+        if analysis.numpy is None:
+            skip("numpy isn't installed")
+    else:
+        monkeypatch.setattr(analysis, 'numpy', None)
+
+def test_frames(with_and_without_numpy):
+    a = MpegAnalysis(io.BytesIO(b'\x00' * 10 + frames([128, 64, 128], channel_mode=3)))
+    eq_(len(a), 3)
+    eq_(list(a.frames['offset']), [10, 427, 635])
+    eq_(list(a.frames['size']), [417, 208, 417])
+    eq_(list(a.frames['bitrate']), [128, 64, 128])
+    eq_(list(a.frames['channel_mode']), [mpeg.MPEG_CM_MONO] * 3)
+    eq_(a.histogram(), {64: 1, 128: 2})
+
+def test_profile(with_and_without_numpy):
+    # At 44100 hz, a second is 38.28 frames
+    a = MpegAnalysis(io.BytesIO(frames([64] * 39 + [128] * 38 + [64] * 3)))
+    profile = a.profile()
+    eq_(len(profile), 3)
+    assert 63.5 < profile[0] < 64.5
+    assert 127.5 < profile[1] < 129.5
+    assert 63.5 < profile[2] < 67
+
+def test_classify(with_and_without_numpy):
+    cbr = frames([96] + [128] * 200) # with a Xing frame at another bitrate
+    eq_(MpegAnalysis(io.BytesIO(cbr)).classify(), analysis.CBR)
+    abr = frames([112, 160] * 200)
+    eq_(MpegAnalysis(io.BytesIO(abr)).classify(), analysis.ABR)
+    vbr = frames(([64] * 80 + [256] * 80) * 2)
+    eq_(MpegAnalysis(io.BytesIO(vbr)).classify(), analysis.VBR)
+    eq_(MpegAnalysis(io.BytesIO(b'')).classify(), '')
+
+def test_real_file(with_and_without_numpy):
+    fp = expand_mpeg(TestData.filepath('mpeg/test8.mp3'))
+    a = MpegAnalysis(fp)
+    fp.seek(0)
+    b = mpeg.FrameBrowser(fp)
+    frame_count, total_size = b.stats()
+    eq_(len(a), frame_count)
+    eq_(sum(a.histogram().values()), frame_count)
+    eq_(sum(a.frames['size'].tolist()), total_size)
+    eq_(a.frames['offset'][0], b.initial_position)
+    eq_(a.classify(), analysis.CBR) # a single frame is at another bitrate
+    a = MpegAnalysis(expand_mpeg(TestData.filepath('mpeg/vbr_xing.mp3')))
+    eq_(a.lame.vbr_method, 3)
+    eq_(a.classify(), analysis.VBR)
+    a = MpegAnalysis(expand_mpeg(TestData.filepath('mpeg/vbr_fhg.mp3')))
+    assert a.lame is None
+    eq_(a.classify(), analysis.VBR)
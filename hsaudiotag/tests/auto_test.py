@@ -6,9 +6,12 @@
 # which should be included with this package. The terms are also available at 
 # http://www.hardcoded.net/licenses/bsd_license
 
-from .. import auto, mp4
+import io
+
+from .. import auto, mp4, mpeg, flac, ogg
+from .. import util
 from .squeeze import expand_mp4, expand_mpeg
-from .util import TestData, eq_
+from .util import TestData, ForwardOnlyStream, eq_
 
 def test_invalid():
     # An invalid file is correctly detected as such
@@ -129,3 +132,122 @@ def test_close_is_called_on_mp4(monkeypatch):
     monkeypatch.setattr(mp4.File, 'close', mock_close)
     f = auto.File(expand_mp4(TestData.filepath('mp4/test1.m4a')))
     assert closed
+
+def test_sniff():
+    eq_(auto.sniff(b'fLaC\0\0\0\x22', b''), flac.FLAC)
+    eq_(auto.sniff(b'\0\0\0\x20ftypM4A ', b''), mp4.File)
+    eq_(auto.sniff(b'ID3\x03\0', b''), mpeg.Mpeg)
+    eq_(auto.sniff(b'\xff\xfb\x90\0', b''), mpeg.Mpeg)
+    eq_(auto.sniff(b'\0' * 16, b'TAG' + b'\0' * 125), mpeg.Mpeg)
+    eq_(auto.sniff(b'\0' * 16, b'\0' * 128), None)
+
+def test_misnamed_file_is_only_parsed_once(tmpdir, monkeypatch):
+    # A flac file with a mp3 extension is detected by its signature. No other class is tried.
+    path = str(tmpdir.join('misnamed.mp3'))
+    with open(TestData.filepath('flac/test1.flac'), 'rb') as fp:
+        open(path, 'wb').write(fp.read())
+    def fail(self, infile):
+        raise AssertionError('mpeg.Mpeg should not have been tried')
+    monkeypatch.setattr(mpeg.Mpeg, '__init__', fail)
+    f = auto.File(path)
+    assert f.valid
+    assert isinstance(f.original, flac.FLAC)
+    eq_(f.artist, 'Coolio')
+
+def test_uppercase_extension(tmpdir):
+    # The extension fast path is case-insensitive. test2.mp3 starts with junk, so the extension is
+    # the only hint we have.
+    path = str(tmpdir.join('TEST2.MP3'))
+    open(path, 'wb').write(expand_mpeg(TestData.filepath('mpeg/test2.mp3')).read())
+    f = auto.File(path)
+    assert f.valid
+    eq_(f.audio_offset, 0x1a1)
+
+def test_audio_attrs_are_read_lazily(tmpdir, monkeypatch):
+    # When reading a path, only tags are read at first. Mpeg frames are browsed on first access
+    # to an audio attribute, and the file is reopened for that.
+    path = str(tmpdir.join('test1.mp3'))
+    open(path, 'wb').write(expand_mpeg(TestData.filepath('mpeg/test1.mp3')).read())
+    def fail(fp, b):
+        raise AssertionError('VBR info should not be read')
+    monkeypatch.setattr(mpeg, 'get_vbr_info', fail)
+    f = auto.File(path)
+    eq_(f.artist, 'Alice & The Serial Numbers')
+    eq_(f.title, 'Intro Missions Started')
+    monkeypatch.undo()
+    eq_(f.duration, 147)
+    eq_(f.bitrate, 128)
+    eq_(f.audio_offset, 0x9a1)
+    assert f.original._fp.closed
+
+def test_audio_attrs_of_file_objects_are_read_right_away():
+    # File objects might be closed by the time audio attributes are accessed.
+    fp = expand_mpeg(TestData.filepath('mpeg/test1.mp3'))
+    f = auto.File(fp)
+    fp.close()
+    eq_(f.duration, 147)
+
+def test_fields(monkeypatch):
+    # Only attributes in `fields` are read, the other ones keep their default value.
+    def fail(self, data):
+        raise AssertionError('The vorbis comment should not be read')
+    monkeypatch.setattr(ogg.VorbisComment, '__init__', fail)
+    f = auto.File(TestData.filepath('flac/test1.flac'), fields={'duration'})
+    assert f.valid
+    eq_(f.duration, 177)
+    eq_(f.sample_rate, 0)
+    eq_(f.artist, '')
+
+def test_fields_mpeg():
+    f = auto.File(expand_mpeg(TestData.filepath('mpeg/test1.mp3')), fields={'duration', 'artist'})
+    eq_(f.duration, 147)
+    eq_(f.artist, 'Alice & The Serial Numbers')
+    eq_(f.title, '')
+    eq_(f.bitrate, 0)
+
+def test_stream():
+    data = expand_mpeg(TestData.filepath('mpeg/test1.mp3')).read()
+    f = auto.File(ForwardOnlyStream(data), stream=True)
+    eq_(f.format, 'mpeg')
+    eq_(f.duration, 147)
+    eq_(f.audio_size, 2353110)
+    eq_(f.title, 'Intro Missions Started')
+    assert not f.partial
+
+def test_stream_with_size_never_reads_the_tail(monkeypatch):
+    monkeypatch.setattr(util, 'STREAM_SPOOL_SIZE', 0x8000)
+    data = open(TestData.filepath('ogg/test1.ogg'), 'rb').read()
+    stream = ForwardOnlyStream(data)
+    f = auto.File(stream, stream=True, stream_size=len(data))
+    eq_(f.format, 'ogg')
+    eq_(f.title, 'Astro')
+    eq_(f.size, len(data))
+    eq_(f.duration, 0) # from the last page
+    assert f.partial
+    eq_(stream.read_size, 0x8000)
+    # Without the size, the stream is read until its end
+    f = auto.File(ForwardOnlyStream(data), stream=True)
+    eq_(f.duration, 162)
+    assert not f.partial
+
+def test_stream_duration_isnt_walked():
+    # test8.mp3 is bigger than the spool and has a TLEN that doesn't match its CBR estimate. We keep
+    # the estimate rather than walking frames until the spool's end.
+    data = expand_mpeg(TestData.filepath('mpeg/test8.mp3')).read()
+    assert len(data) > util.STREAM_SPOOL_SIZE
+    for stream_size in [None, len(data)]:
+        f = auto.File(ForwardOnlyStream(data), stream=True, stream_size=stream_size)
+        eq_(f.duration, mpeg.Mpeg(io.BytesIO(data), duration_mode=mpeg.DURATION_FAST).duration)
+        eq_(f.original.duration_mode, mpeg.DURATION_FAST)
+
+def test_stream_sniffing_isnt_partial(monkeypatch):
+    # Formats without data at the end aren't partial because the tail was sniffed.
+    monkeypatch.setattr(util, 'STREAM_SPOOL_SIZE', 0x1000)
+    data = open(TestData.filepath('flac/test1.flac'), 'rb').read()
+    f = auto.File(ForwardOnlyStream(data), stream=True, stream_size=len(data))
+    eq_(f.format, 'flac')
+    eq_(f.title, 'Country Line')
+    assert not f.partial
+    stream = util.StreamFile(ForwardOnlyStream(b'\x00' * 0x2000), 0x2000)
+    eq_(auto.sniff_file(stream), None)
+    assert not stream.partial
@@ -0,0 +1,83 @@
+# Created On: 2026-10-18
+# Copyright 2010 Hardcoded Software (http://www.hardcoded.net)
+#
+# This software is licensed under the "BSD" License as described in the "LICENSE" file,
+# which should be included with this package. The terms are also available at
+# http://www.hardcoded.net/licenses/bsd_license
+
+import csv
+import io
+import json
+import os.path as op
+import pickle
+
+from .. import scanner, scan, scan_batch
+from ..batch import Batch
+from .util import TestData, eq_
+
+def sample_batch():
+    batch = Batch()
+    batch.append(scanner.read_file(TestData.filepath('flac/test1.flac')))
+    batch.append(scanner.read_file(TestData.filepath('ogg/test1.ogg')))
+    batch.append(scanner.read_file(op.join(TestData.filepath('flac'), 'doesnt_exist.flac')))
+    return batch
+
+def test_append_and_iter():
+    batch = sample_batch()
+    eq_(len(batch), 3)
+    rows = list(batch)
+    eq_(rows[0].artist, 'Coolio')
+    eq_(rows[0].duration, 177)
+    eq_(rows[0].valid, True)
+    eq_(rows[1].format, 'ogg')
+    eq_(rows[1].title, 'Astro')
+    eq_(rows[2].valid, False)
+    assert rows[2].error.startswith('FileNotFoundError')
+    eq_(batch[1], rows[1])
+    eq_(list(batch.column('duration')), [177, 162, 0])
+
+def test_strings_are_interned():
+    batch = Batch()
+    batch.append(scanner.read_file(TestData.filepath('ogg/test1.ogg')))
+    batch.append(scanner.read_file(TestData.filepath('ogg/test1.ogg')))
+    [title1, title2] = batch.column('title')
+    assert title1 is title2
+
+def test_slice():
+    batch = sample_batch()
+    sliced = batch[1:]
+    assert isinstance(sliced, Batch)
+    eq_([row.format for row in sliced], ['ogg', ''])
+    sliced.extend(batch[:1])
+    eq_(len(sliced), 3)
+    eq_(len(batch), 3)
+    eq_(sliced[2].artist, 'Coolio')
+
+def test_to_csv():
+    fp = io.StringIO()
+    sample_batch().to_csv(fp)
+    fp.seek(0)
+    rows = list(csv.DictReader(fp))
+    eq_(len(rows), 3)
+    eq_(rows[0]['artist'], 'Coolio')
+    eq_(rows[0]['duration'], '177')
+    eq_(rows[0]['valid'], 'True')
+
+def test_to_jsonl():
+    fp = io.StringIO()
+    sample_batch().to_jsonl(fp)
+    rows = [json.loads(line) for line in fp.getvalue().splitlines()]
+    eq_(len(rows), 3)
+    eq_(rows[1]['title'], 'Astro')
+    eq_(rows[1]['valid'], True)
+    eq_(rows[2]['error'][:17], 'FileNotFoundError')
+
+def test_is_picklable():
+    batch = pickle.loads(pickle.dumps(sample_batch()))
+    eq_(batch[0].artist, 'Coolio')
+
+def test_scan_batch():
+    paths = [TestData.filepath('ogg'), TestData.filepath('wma'), TestData.filepath('flac')]
+    expected = {r.path: r.title for r in scan(paths, workers=0)}
+    eq_({row.path: row.title for row in scan_batch(paths, workers=0)}, expected)
+    eq_({row.path: row.title for row in scan_batch(paths, workers=2, chunksize=3)}, expected)
@@ -0,0 +1,99 @@
+# Created On: 2026-10-18
+# Copyright 2010 Hardcoded Software (http://www.hardcoded.net)
+#
+# This software is licensed under the "BSD" License as described in the "LICENSE" file,
+# which should be included with this package. The terms are also available at
+# http://www.hardcoded.net/licenses/bsd_license
+
+import os
+import shutil
+
+from .. import auto, mpeg
+from ..cache import Cache
+from .squeeze import expand_mpeg
+from .util import TestData, eq_
+
+def copy_testfile(tmpdir, relpath):
+    path = str(tmpdir.join(os.path.basename(relpath)))
+    shutil.copy(TestData.filepath(relpath), path)
+    return path
+
+def fail_read(self, infile):
+    raise AssertionError('The file should have been fetched from the cache')
+
+def test_miss_then_hit(tmpdir, monkeypatch):
+    path = copy_testfile(tmpdir, 'flac/test1.flac')
+    cache = Cache(str(tmpdir.join('cache.db')))
+    f = auto.File(path, cache=cache)
+    assert f.original is not None
+    monkeypatch.setattr(auto.File, '_read', fail_read)
+    f = auto.File(path, cache=cache)
+    assert f.valid
+    assert f.original is None
+    eq_(f.format, 'flac')
+    eq_(f.artist, 'Coolio')
+    eq_(f.track, 2)
+    eq_(f.duration, 177)
+    eq_(f.audio_offset, 0x1190)
+    cache.close()
+
+def test_cache_is_persistent(tmpdir, monkeypatch):
+    # A cache shared by two connections (or processes) sees the entries of the other.
+    dbpath = str(tmpdir.join('cache.db'))
+    path = copy_testfile(tmpdir, 'ogg/test1.ogg')
+    with Cache(dbpath) as cache:
+        auto.File(path, cache=cache)
+    monkeypatch.setattr(auto.File, '_read', fail_read)
+    with Cache(dbpath) as cache:
+        eq_(auto.File(path, cache=cache).title, 'Astro')
+
+def test_invalid_files_are_cached(tmpdir, monkeypatch):
+    path = copy_testfile(tmpdir, 'randomfile')
+    cache = Cache(str(tmpdir.join('cache.db')))
+    auto.File(path, cache=cache)
+    monkeypatch.setattr(auto.File, '_read', fail_read)
+    f = auto.File(path, cache=cache)
+    assert not f.valid
+    eq_(f.format, '')
+
+def test_less_exact_durations_are_read_again(tmpdir, monkeypatch):
+    path = str(tmpdir.join('vbr.mp3'))
+    open(path, 'wb').write(expand_mpeg(TestData.filepath('mpeg/vbr_without_header.mp3')).read())
+    cache = Cache(str(tmpdir.join('cache.db')))
+    monkeypatch.setattr(mpeg, 'DURATION_MODE', mpeg.DURATION_FAST)
+    fast = auto.File(path, cache=cache).duration
+    f = auto.File(path, cache=cache)
+    assert f.original is None
+    eq_(f.duration, fast)
+    monkeypatch.setattr(mpeg, 'DURATION_MODE', mpeg.DURATION_EXACT)
+    f = auto.File(path, cache=cache)
+    assert f.original is not None
+    exact = f.duration
+    assert exact != fast
+    # The exact entry replaced the fast one, and is good for any mode
+    eq_(auto.File(path, cache=cache).duration, exact)
+    monkeypatch.setattr(mpeg, 'DURATION_MODE', mpeg.DURATION_FAST)
+    f = auto.File(path, cache=cache)
+    assert f.original is None
+    eq_(f.duration, exact)
+    cache.close()
+
+def test_modified_file_is_read_again(tmpdir):
+    path = copy_testfile(tmpdir, 'flac/test1.flac')
+    cache = Cache(str(tmpdir.join('cache.db')))
+    auto.File(path, cache=cache)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+    f = auto.File(path, cache=cache)
+    assert f.original is not None
+
+def test_prune(tmpdir):
+    path1 = copy_testfile(tmpdir, 'flac/test1.flac')
+    path2 = copy_testfile(tmpdir, 'ogg/test1.ogg')
+    cache = Cache(str(tmpdir.join('cache.db')))
+    auto.File(path1, cache=cache)
+    auto.File(path2, cache=cache)
+    os.remove(path1)
+    eq_(cache.prune(), 1)
+    eq_(cache.prune(), 0)
+    eq_(cache.get(cache.key(path2))['title'], 'Astro')
@@ -6,10 +6,45 @@
 # which should be included with this package. The terms are also available at 
 # http://www.hardcoded.net/licenses/bsd_license
 
-from ..id3v2 import Id3v2, Header, POS_END, _read_id3_string
+import io
+import os
+import struct
+import zlib
+
+from pytest import raises
+
+from .. import id3v2
+from ..id3v2 import Id3v2, Header, POS_END, _read_id3_string, write_tag
 from .squeeze import expand_mpeg
 from .util import TestData, eq_
 
+def syncsafe(size):
+    return bytes([(size >> 21) & 0x7f, (size >> 14) & 0x7f, (size >> 7) & 0x7f, size & 0x7f])
+
+def make_tag(frames, version=3, padding=0, flags=0):
+    # `frames` is a list of (frame_id, payload) or (frame_id, payload, format_flags) tuples.
+    data = b''
+    for frame in frames:
+        frame_id, payload, format_flags = frame if len(frame) == 3 else frame + (0, )
+        size = syncsafe(len(payload)) if version == 4 else struct.pack('>I', len(payload))
+        data += frame_id.encode('ascii') + size + bytes([0, format_flags]) + payload
+    data += b'\0' * padding
+    return b'ID3' + bytes([version, 0, flags]) + syncsafe(len(data)) + data
+
+def unsync(data):
+    return data.replace(b'\xff', b'\xff\x00')
+
+class CountingFile(io.BytesIO):
+    def __init__(self, data):
+        io.BytesIO.__init__(self, data)
+        self.read_size = 0
+    
+    def read(self, size=-1):
+        data = io.BytesIO.read(self, size)
+        self.read_size += len(data)
+        return data
+    
+
 def testNormal():
     tag = Id3v2(expand_mpeg(TestData.filepath('id3v2/normal.mp3')))
     eq_(tag.size,4096)
@@ -182,3 +217,251 @@ def test_id3v2_header():
     h = Header(fp)
     assert h.valid
     fp.close()
+
+def test_big_frames_are_read_on_demand():
+    picture = b'\x00image/jpeg\x00\x03\x00' + b'\xff' * 200000
+    data = make_tag([('TIT2', b'\x00title'), ('APIC', picture), ('PRIV', b'foo\x00bar'),
+        ('TPE1', b'\x00artist')], padding=100)
+    fp = CountingFile(data + b'audio')
+    tag = Id3v2(fp)
+    eq_(tag.title, 'title')
+    eq_(tag.artist, 'artist')
+    assert fp.read_size < 1000
+    frame = tag.frames['APIC']
+    eq_(frame.offset, 10 + 10 + 6 + 10)
+    eq_(frame.size, len(picture))
+    assert not frame.loaded
+    assert not tag.frames['PRIV'].loaded
+    assert tag.frames['TIT2'].loaded
+    eq_(bytes(frame.rawdata.read()), picture)
+    assert frame.loaded
+    eq_(bytes(tag.frames['PRIV'].rawdata.read()), b'foo\x00bar')
+
+def test_big_text_frames_are_read_on_demand(monkeypatch):
+    monkeypatch.setattr(id3v2, 'LAZY_FRAME_SIZE', 4)
+    tag = Id3v2(io.BytesIO(make_tag([('TIT2', b'\x00title'), ('TPE1', b'\x00abc')])))
+    assert not tag.frames['TIT2'].loaded
+    assert tag.frames['TPE1'].loaded
+    eq_(tag.title, 'title')
+
+def test_frames_are_read_on_demand_from_path(tmp_path):
+    path = tmp_path / 'foo.mp3'
+    path.write_bytes(make_tag([('TIT2', b'\x00title'), ('GEOB', b'\x01' * 1000)]))
+    tag = Id3v2(str(path))
+    eq_(tag.title, 'title')
+    eq_(bytes(tag.frames['GEOB'].rawdata.read()), b'\x01' * 1000)
+
+def test_frame_truncated_by_the_end_of_the_tag():
+    data = make_tag([('TIT2', b'\x00title'), ('PRIV', b'foobar')])
+    # The PRIV frame claims to be 4 bytes bigger than what's left in the tag
+    data = data[:-12] + struct.pack('>I', 10) + data[-8:] + b'audio'
+    tag = Id3v2(io.BytesIO(data))
+    eq_(tag.title, 'title')
+    eq_(tag.frames['PRIV'].size, 10)
+    eq_(bytes(tag.frames['PRIV'].rawdata.read()), b'foobar')
+
+def test_v24_with_plain_sizes_is_read_in_one_pass():
+    # iTunes writes v2.4 tags with the frame sizes of v2.3
+    comment = b'\x00eng\x00' + b'a' * 300
+    data = make_tag([('TIT2', b'\x00title'), ('COMM', comment), ('TPE1', b'\x00artist'),
+        ('APIC', b'\x00' * 1000), ('TALB', b'\x00album')], padding=20)
+    data = b'ID3\x04' + data[4:]
+    fp = CountingFile(data)
+    tag = Id3v2(fp)
+    eq_(tag.version, 4)
+    eq_(tag.title, 'title')
+    eq_(tag.comment, 'a' * 300)
+    eq_(tag.artist, 'artist')
+    eq_(tag.album, 'album')
+    eq_(tag.frames['APIC'].size, 1000)
+    assert fp.read_size < 500
+
+def test_v24_with_plain_sizes_and_header_like_text():
+    # Read as syncsafe, the COMM size (300) lands in the comment, on bytes that look like a frame
+    # id. Its size and flags don't make sense, so the plain size wins.
+    comment = b'\x00eng\x00' + b'ABCD' * 75
+    data = make_tag([('COMM', comment), ('TPE1', b'\x00artist'), ('TALB', b'\x00album')],
+        padding=20)
+    tag = Id3v2(io.BytesIO(b'ID3\x04' + data[4:]))
+    eq_(tag.comment, 'ABCD' * 75)
+    eq_(tag.artist, 'artist')
+    eq_(tag.album, 'album')
+    # A fake header with plausible flags and size still doesn't lead to a next frame
+    comment = b'\x00eng\x00' + b'A' * 172 + b'ABCD\x00\x00\x00\x10\x00\x00' + b'A' * 118
+    data = make_tag([('COMM', comment), ('TPE1', b'\x00artist'), ('TALB', b'\x00album')],
+        padding=20)
+    tag = Id3v2(io.BytesIO(b'ID3\x04' + data[4:]))
+    eq_(tag.artist, 'artist')
+    eq_(tag.album, 'album')
+
+def test_v24_with_big_syncsafe_sizes():
+    comment = b'\x00eng\x00' + b'a' * 300
+    tag = Id3v2(io.BytesIO(make_tag([('COMM', comment), ('TIT2', b'\x00title')], version=4)))
+    eq_(tag.comment, 'a' * 300)
+    eq_(tag.title, 'title')
+    # A syncsafe size leading to padding is kept
+    tag = Id3v2(io.BytesIO(make_tag([('COMM', comment)], version=4, padding=1000)))
+    eq_(tag.comment, 'a' * 300)
+
+def test_v24_compressed_frame_is_decompressed_on_demand(monkeypatch):
+    lyrics = b'\x00eng\x00' + b'la la la ' * 1000
+    compressed = zlib.compress(lyrics)
+    # With a data length indicator and a group id
+    title = b'\x42' + syncsafe(7) + zlib.compress(b'\x00title')
+    data = make_tag([('TIT2', title, 0x49), ('USLT', syncsafe(len(lyrics)) + compressed, 0x09)],
+        version=4)
+    decompressed = []
+    def decompress(data):
+        decompressed.append(len(data))
+        return real_decompress(data)
+    real_decompress = zlib.decompress
+    monkeypatch.setattr(zlib, 'decompress', decompress)
+    tag = Id3v2(io.BytesIO(data))
+    eq_(tag.title, 'title')
+    eq_(len(decompressed), 1)
+    frame = tag.frames['USLT']
+    assert frame.compressed
+    eq_(frame.extra_size, 4)
+    eq_(bytes(frame.rawdata.read()), lyrics)
+    eq_(len(decompressed), 2)
+
+def test_v24_unsynchronized_frame():
+    data = make_tag([('TIT2', unsync(b'\x00a\xffb'), 0x02), ('TPE1', b'\x00\xff')], version=4)
+    tag = Id3v2(io.BytesIO(data))
+    eq_(tag.title, 'a\u00ffb')
+    eq_(tag.artist, '\u00ff')
+    # The tag flag applies to all frames
+    data = make_tag([('TIT2', unsync(b'\x00a\xffb')), ('TPE1', unsync(b'\x00\xff'))], version=4,
+        flags=0x80)
+    tag = Id3v2(io.BytesIO(data))
+    eq_(tag.title, 'a\u00ffb')
+    eq_(tag.artist, '\u00ff')
+
+def test_v23_unsynchronized_tag():
+    # Before v2.4, frame headers are unsynchronized too. The size of this title ends with \xff.
+    title = b'\x00' + b'\xff' * 254
+    data = make_tag([('TIT2', title), ('TPE1', b'\x00artist')], padding=10)
+    tag_data = unsync(data[10:])
+    data = b'ID3\x03\x00\x80' + syncsafe(len(tag_data)) + tag_data + b'audio'
+    tag = Id3v2(io.BytesIO(data))
+    eq_(tag.size, 10 + len(tag_data))
+    eq_(tag.title, '\u00ff' * 254)
+    eq_(tag.artist, 'artist')
+
+def test_v23_compressed_frame():
+    title = struct.pack('>I', 7) + zlib.compress(b'\x00title')
+    tag = Id3v2(io.BytesIO(make_tag([('TIT2', title, 0x80), ('TPE1', b'\x00artist')])))
+    eq_(tag.title, 'title')
+    eq_(tag.artist, 'artist')
+
+def test_encrypted_and_broken_frames_are_ignored():
+    data = make_tag([('TIT2', b'\x80\x00title', 0x40), ('TPE1', b'\x00\x00\x00\x07foobar', 0x80)])
+    tag = Id3v2(io.BytesIO(data))
+    eq_(tag.title, '')
+    eq_(tag.artist, '')
+
+def record_writes(monkeypatch):
+    # Returns a list to which the (offset, size) of writes to files opened in place are added.
+    writes = []
+    def recording_open(path, mode='r'):
+        fp = open(path, mode)
+        if mode == 'r+b':
+            write = fp.write
+            fp.write = lambda data: writes.append((fp.tell(), len(data))) or write(data)
+        return fp
+    monkeypatch.setattr(id3v2, 'open', recording_open, raising=False)
+    return writes
+
+def test_write_tag_in_place(tmp_path, monkeypatch):
+    picture = b'\x00image/png\x00\x03\x00' + b'\x89' * 100000
+    data = make_tag([('TIT2', b'\x00title'), ('APIC', picture), ('TPE1', b'\x00artist')],
+        padding=500) + b'audio'
+    path = tmp_path / 'foo.mp3'
+    path.write_bytes(data)
+    writes = record_writes(monkeypatch)
+    # The title comes before the picture, the changes span more than one block
+    write_tag(str(path), {'TIT2': 'new title', 'COMM': 'comment'})
+    eq_(writes, [])
+    eq_(path.stat().st_size, len(data))
+    tag = Id3v2(str(path))
+    eq_(tag.version, 3)
+    eq_(tag.size, len(data) - 5)
+    eq_(tag.title, 'new title')
+    eq_(tag.artist, 'artist')
+    eq_(tag.comment, 'comment')
+    eq_(bytes(tag.frames['APIC'].rawdata.read()), picture)
+    assert path.read_bytes().endswith(b'audio')
+    # Kept frames (the picture and the artist) come first now and stay where they are. The comment
+    # moves before the title, and the padding isn't written again.
+    inode = os.stat(str(path)).st_ino
+    write_tag(str(path), {'TIT2': 'other title'})
+    eq_(os.stat(str(path)).st_ino, inode)
+    eq_(len(writes), 1)
+    offset, size = writes[0]
+    eq_(offset, 10 + 10 + len(picture) + 10 + 7)
+    tag = Id3v2(str(path))
+    last = tag.frame_list[-1]
+    eq_(offset + size, last.offset + last.size)
+    assert offset + size < tag.size
+    eq_(tag.title, 'other title')
+    eq_(tag.comment, 'comment')
+    eq_(bytes(tag.frames['APIC'].rawdata.read()), picture)
+
+def test_write_tag_grows_the_tag(tmp_path, monkeypatch):
+    data = make_tag([('TIT2', b'\x00title')], version=4, padding=10) + b'audio'
+    path = tmp_path / 'foo.mp3'
+    path.write_bytes(data)
+    path.chmod(0o640)
+    writes = record_writes(monkeypatch)
+    write_tag(str(path), {'TALB': 'a' * 100}, padding=42)
+    eq_(writes, [])
+    eq_(path.stat().st_mode & 0o777, 0o640)
+    tag = Id3v2(str(path))
+    eq_(tag.version, 4)
+    eq_(tag.size, 10 + 10 + 6 + 10 + 101 + 42)
+    eq_(tag.title, 'title')
+    eq_(tag.album, 'a' * 100)
+    assert path.read_bytes().endswith(b'audio')
+    eq_(os.listdir(str(tmp_path)), ['foo.mp3'])
+
+def test_write_tag_on_file_without_tag(tmp_path):
+    path = tmp_path / 'foo.mp3'
+    path.write_bytes(b'\xff\xfbaudio')
+    write_tag(str(path), {'TIT2': 'title', 'TPE1': None}, padding=0)
+    tag = Id3v2(str(path))
+    eq_(tag.version, id3v2.WRITE_VERSION)
+    eq_(tag.title, 'title')
+    assert 'TPE1' not in tag.frames
+    eq_(path.read_bytes()[tag.size:], b'\xff\xfbaudio')
+
+def test_write_tag_keeps_and_removes_frames(tmp_path):
+    data = make_tag([('TXXX', b'\x00foo\x00bar'), ('TIT2', b'\x00title'), ('TXXX', b'\x00baz\x00'),
+        ('COMM', b'\x00engfoo\x00comment')], padding=100)
+    path = tmp_path / 'foo.mp3'
+    path.write_bytes(data)
+    write_tag(str(path), {'COMM': None, 'TIT2': '\u00e9t\u00e9', 'TPE1': '\u263a'})
+    tag = Id3v2(str(path))
+    eq_([frame.frame_id for frame in tag.frame_list], ['TXXX', 'TXXX', 'TIT2', 'TPE1'])
+    eq_(tag.frames['TXXX'].data.text, 'baz\n')
+    eq_(tag.comment, '')
+    eq_(tag.title, '\u00e9t\u00e9')
+    eq_(tag.artist, '\u263a')
+
+def test_write_tag_resynchronizes_frames(tmp_path):
+    title = struct.pack('>I', 7) + zlib.compress(b'\x00title')
+    data = make_tag([('TIT2', title, 0x80), ('TPE1', b'\x00\xff\xff')], padding=10)
+    tag_data = unsync(data[10:])
+    path = tmp_path / 'foo.mp3'
+    path.write_bytes(b'ID3\x03\x00\x80' + syncsafe(len(tag_data)) + tag_data)
+    write_tag(str(path), {'TALB': 'album'})
+    tag = Id3v2(str(path))
+    eq_(tag.flags, 0)
+    eq_(tag.title, 'title')
+    eq_(tag.artist, '\u00ff\u00ff')
+    eq_(tag.album, 'album')
+
+def test_write_tag_only_writes_supported_tags(tmp_path):
+    path = tmp_path / 'foo.mp3'
+    path.write_bytes(open(TestData.filepath('id3v2/v22.tag'), 'rb').read())
+    with raises(ValueError):
+        write_tag(str(path), {'TIT2': 'title'})
@@ -7,6 +7,11 @@
 # http://www.hardcoded.net/licenses/bsd_license
 
 import io
+import random
+import struct
+from array import array
+
+from pytest import mark, raises
 
 from .. import mpeg
 from .squeeze import expand_mpeg
@@ -164,6 +169,40 @@ class TestMpeg:
         eq_(m.bitrate,211)
         eq_(m.duration,193)
     
+    def test_lame_header(self):
+        # The LAME extension gives the encoder delay and padding, and thus the exact sample count.
+        m = mpeg.Mpeg(expand_mpeg(TestData.filepath('mpeg/vbr_xing.mp3')))
+        eq_(m.vbr.lame.encoder, 'LAME3.92')
+        eq_(m.vbr.lame.delay, 576)
+        eq_(m.vbr.lame.padding, 1296)
+        eq_(m.sample_count, 7419 * 1152 - 576 - 1296)
+        eq_(len(m.vbr.toc), 100)
+    
+    def test_info_header(self, monkeypatch):
+        # Info headers are Xing headers for CBR files. They're trusted even if the bitrate changes or
+        # if TLEN doesn't match.
+        def fail(self):
+            raise AssertionError('Frames should not be browsed')
+        monkeypatch.setattr(mpeg.FrameBrowser, 'stats', fail)
+        lame = bytearray(36)
+        lame[:9] = b'LAME3.100'
+        lame[21:24] = ((576 << 12) | 1000).to_bytes(3, 'big')
+        # Only frames and bytes fields are there, the LAME extension follows them.
+        info = b'\x00' * 32 + b'Info' + struct.pack('!3I', 0x3, 101, 101 * 417) + bytes(lame)
+        frames = [b'\xff\xfb\x90\x00' + info] + [b'\xff\xfb\x90\x00'] * 100
+        frames[3] = b'\xff\xfb\xa0\x00' # 160 kbps
+        frames = [f.ljust(mpeg.MpegFrameHeader(struct.unpack('!I', f[:4])[0]).size, b'\x00')
+            for f in frames]
+        tlen = b'TLEN' + struct.pack('!I', 6) + b'\x00\x00' + b'\x0099000'
+        tag = b'ID3\x03\x00\x00' + bytes([0, 0, 0, len(tlen)]) + tlen
+        m = mpeg.Mpeg(io.BytesIO(tag + b''.join(frames)))
+        assert m.vbr.cbr
+        eq_(m.vbr.frames, 101)
+        eq_(m.vbr.lame.encoder, 'LAME3.100')
+        eq_(m.bitrate, 128)
+        eq_(m.sample_count, 101 * 1152 - 576 - 1000)
+        eq_(m.duration, 2)
+    
     def test_tell_returns_None(self):
         #See TCFrameBrowser test with the same name for comments
         fp = io.BytesIO(b'')
@@ -171,12 +210,175 @@ class TestMpeg:
         m = mpeg.Mpeg(fp)
         eq_(0,m.size)
     
+    def test_audio_properties_are_lazy(self, tmpdir, monkeypatch):
+        # When reading a path, frames aren't looked at until an audio property is accessed.
+        path = str(tmpdir.join('test1.mp3'))
+        open(path, 'wb').write(expand_mpeg(TestData.filepath('mpeg/test1.mp3')).read())
+        def fail(fp):
+            raise AssertionError('Frames should not be browsed')
+        monkeypatch.setattr(mpeg, 'FrameBrowser', fail)
+        m = mpeg.Mpeg(path)
+        eq_(m.tag.title, 'Intro Missions Started')
+        eq_(m.size, 2355703)
+        monkeypatch.undo()
+        eq_(m.duration, 147)
+        eq_(m.audio_offset, 0x9a1)
+    
+    def test_fields_without_id3v1(self):
+        # When only tags are wanted and there's an id3v2 tag, the id3v1 tag isn't read.
+        m = mpeg.Mpeg(expand_mpeg(TestData.filepath('mpeg/test1.mp3')), fields={'title'})
+        eq_(m.tag.title, 'Intro Missions Started')
+        assert not m.id3v1.exists
+    
+    def test_fields_without_tags(self):
+        # When no tag is wanted, id3v2 frames aren't read, but the id3v2 header is.
+        m = mpeg.Mpeg(expand_mpeg(TestData.filepath('mpeg/test1.mp3')), fields={'bitrate'})
+        eq_(m.id3v2.frames, {})
+        eq_(m.audio_offset, 0x9a1)
+        eq_(m.bitrate, 128)
+    
     def test_tag_duration_different(self):
         # the tag reports a duration of 29 seconds, but the data actually contains 1 real second
         # with garbage at the end.
         m = mpeg.Mpeg(TestData.filepath('mpeg/tag_duration_different.mp3'))
         eq_(m.duration, 1)
     
+    def test_duration_mode_exact(self):
+        m = mpeg.Mpeg(expand_mpeg(TestData.filepath('mpeg/vbr_without_header.mp3')))
+        eq_(m.duration_mode, mpeg.DURATION_EXACT)
+        eq_(m.vbr.frames, 16961)
+    
+    def test_duration_mode_sampled(self, monkeypatch):
+        # The duration is extrapolated from frames read at a few places of the file.
+        def fail(self):
+            raise AssertionError('All frames should not be browsed')
+        monkeypatch.setattr(mpeg.FrameBrowser, 'stats', fail)
+        fp = expand_mpeg(TestData.filepath('mpeg/vbr_without_header.mp3'))
+        m = mpeg.Mpeg(fp, duration_mode=mpeg.DURATION_SAMPLED)
+        eq_(m.duration_mode, mpeg.DURATION_SAMPLED)
+        assert abs(m.vbr.frames - 16961) < 16961 * 0.01
+        assert abs(m.duration - 443) <= 443 * 0.01
+    
+    def test_duration_mode_sampled_on_small_file(self):
+        # There's no point in sampling a small file, its frames are all read.
+        m = mpeg.Mpeg(TestData.filepath('mpeg/tag_duration_different.mp3'),
+            duration_mode=mpeg.DURATION_SAMPLED)
+        eq_(m.duration, 1)
+        eq_(m.duration_mode, mpeg.DURATION_EXACT)
+    
+    def test_duration_mode_fast(self, monkeypatch):
+        # Only the first frame is used, the bitrate is thus wrong for VBR files without header.
+        def fail(self, *args):
+            raise AssertionError('Frames should not be browsed')
+        monkeypatch.setattr(mpeg.FrameBrowser, 'stats', fail)
+        monkeypatch.setattr(mpeg.FrameBrowser, 'sampled_stats', fail)
+        fp = expand_mpeg(TestData.filepath('mpeg/vbr_without_header.mp3'))
+        m = mpeg.Mpeg(fp, duration_mode=mpeg.DURATION_FAST)
+        eq_(m.duration_mode, mpeg.DURATION_FAST)
+        assert m.vbr is None
+        m = mpeg.Mpeg(TestData.filepath('mpeg/tag_duration_different.mp3'),
+            duration_mode=mpeg.DURATION_FAST)
+        eq_(m.duration, 2) # the CBR estimate, the TLEN mismatch is ignored
+    
+    def test_duration_mode_with_vbr_header(self):
+        # VBR headers are always trusted, so it's exact whatever the mode.
+        m = mpeg.Mpeg(expand_mpeg(TestData.filepath('mpeg/vbr_xing.mp3')),
+            duration_mode=mpeg.DURATION_FAST)
+        eq_(m.duration, 193)
+        eq_(m.duration_mode, mpeg.DURATION_EXACT)
+    
+    def test_offset_for_time_xing_toc(self, monkeypatch):
+        def fail(self, step=None):
+            raise AssertionError('Frames should not be browsed')
+        monkeypatch.setattr(mpeg.FrameBrowser, 'build_index', fail)
+        m = mpeg.Mpeg(expand_mpeg(TestData.filepath('mpeg/vbr_xing.mp3')))
+        eq_(len(m.vbr.toc), 100)
+        eq_(m.offset_for_time(0), m.audio_offset)
+        duration = m.vbr.frames * 1152 / 44100
+        # At 10% of the duration, we're at toc[10] / 256 of the file
+        eq_(m.offset_for_time(duration / 10), m.audio_offset + m.vbr.toc[10] * m.vbr.size // 256)
+        eq_(m.offset_for_time(duration * 2), m.audio_offset + m.vbr.size)
+        offsets = [m.offset_for_time(t) for t in range(0, 200, 5)]
+        eq_(offsets, sorted(offsets))
+    
+    def test_offset_for_time_fhg_toc(self):
+        m = mpeg.Mpeg(expand_mpeg(TestData.filepath('mpeg/vbr_fhg.mp3')))
+        eq_(len(m.vbr.toc), 116)
+        eq_(m.vbr.frames_per_entry, 64)
+        eq_(m.vbr.toc[:3], [34916, 43318, 44996])
+        eq_(m.offset_for_time(-1), m.audio_offset)
+        # Each toc entry is the size of 64 frames
+        eq_(m.offset_for_time(128 * 1152 / 44100), m.audio_offset + 34916 + 43318)
+        eq_(m.offset_for_time(10000), m.audio_offset + sum(m.vbr.toc))
+    
+    def test_offset_for_time_without_vbr_header(self):
+        # Without a VBR header, we use an index of frame offsets built when needed.
+        m = mpeg.Mpeg(expand_mpeg(TestData.filepath('mpeg/test1.mp3')))
+        assert m._frame_index is None
+        b = mpeg.FrameBrowser(expand_mpeg(TestData.filepath('mpeg/test1.mp3')))
+        expected = [b.position]
+        for i in range(500):
+            next(b)
+            if (b.frame_index % mpeg.FRAME_INDEX_STEP) == 0:
+                expected.append(b.position)
+        eq_(m.offset_for_time(0), m.audio_offset)
+        # frame 383 starts at 10.004 seconds
+        eq_(m.offset_for_time(10), expected[382 // mpeg.FRAME_INDEX_STEP])
+        eq_(m.frame_index.frame_count, 5630)
+        eq_(m.offset_for_time(1000), m.frame_index.offsets[-1])
+    
+    def test_saved_frame_index_replaces_browsing(self, monkeypatch, tmpdir):
+        path = str(tmpdir.join('index'))
+        m = mpeg.Mpeg(expand_mpeg(TestData.filepath('mpeg/test8.mp3')))
+        m.frame_index.save(path)
+        duration = m.duration
+        def fail(self, *args):
+            raise AssertionError('Frames should not be browsed')
+        monkeypatch.setattr(mpeg.FrameBrowser, '_walk', fail)
+        index = mpeg.FrameIndex.load(path)
+        m = mpeg.Mpeg(expand_mpeg(TestData.filepath('mpeg/test8.mp3')), frame_index=index)
+        eq_(m.duration, duration)
+        assert m.frame_index is index
+        eq_(m.offset_for_time(10), index.offset_for_frame(382))
+    
+    def test_saved_frame_index_replaces_stats(self, monkeypatch):
+        # VBR files without a VBR header take their frame count from the index.
+        m = mpeg.Mpeg(expand_mpeg(TestData.filepath('mpeg/vbr_without_header.mp3')))
+        index = mpeg.FrameIndex.from_bytes(m.frame_index.to_bytes())
+        duration, frames = m.duration, m.vbr.frames
+        def fail(self, *args):
+            raise AssertionError('Frames should not be browsed')
+        monkeypatch.setattr(mpeg.FrameBrowser, '_walk', fail)
+        monkeypatch.setattr(mpeg.FrameBrowser, 'stats', fail)
+        m = mpeg.Mpeg(expand_mpeg(TestData.filepath('mpeg/vbr_without_header.mp3')),
+            frame_index=index)
+        eq_(m.duration, duration)
+        eq_(m.vbr.frames, frames)
+        assert m.frame_index is index
+    
+    def test_stale_frame_index_is_ignored(self):
+        # An index of an older, shorter version of the file has the same first frame.
+        data = expand_mpeg(TestData.filepath('mpeg/test1.mp3')).read()
+        index = mpeg.Mpeg(io.BytesIO(data[:len(data) // 2])).frame_index
+        m = mpeg.Mpeg(io.BytesIO(data), frame_index=index)
+        eq_(index.offsets[0], m.audio_offset)
+        assert m.frame_index is not index
+        eq_(m.frame_index.frame_count, 5630)
+        eq_(m.frame_index.audio_size, m.audio_size)
+        # Offsets past the end of the audio can't be right either
+        offsets = array('I', [m.audio_offset, m.audio_offset + m.audio_size])
+        index = mpeg.FrameIndex(offsets, 8, 9, 417 * 9, 1152, m.audio_size)
+        m = mpeg.Mpeg(io.BytesIO(data), frame_index=index)
+        assert m.frame_index is not index
+        eq_(m.offset_for_time(100), m.frame_index.offset_for_frame(3828))
+    
+    def test_frame_index_of_another_file_is_ignored(self):
+        index = mpeg.FrameIndex(array('I', [1234]), 8, 1, 417, 1152)
+        m = mpeg.Mpeg(expand_mpeg(TestData.filepath('mpeg/test1.mp3')), frame_index=index)
+        eq_(m.duration, 147)
+        assert m.frame_index is not index
+        eq_(m.frame_index.offsets[0], m.audio_offset)
+    
 
 class TestFrameBrowser:
     def test_valid_first_frame_and_no_tag(self):
@@ -257,3 +459,168 @@ class TestFrameBrowser:
         eq_(fcount, 39)
         eq_(size, 39 * 417)
     
+    def test_stats_is_the_same_as_browsing(self, monkeypatch):
+        # stats() gives the same result as next() whatever the block size. With a 7 bytes block
+        # size, headers are regularly split between blocks and frames are bigger than blocks.
+        def browse(b):
+            b.first()
+            size = b.frame.size
+            while next(b).valid:
+                size += b.frame.size
+            return (b.frame_index, size)
+        
+        for block_size in [7, 417, 0x1000, mpeg.STATS_BLOCK_SIZE]:
+            monkeypatch.setattr(mpeg, 'STATS_BLOCK_SIZE', block_size)
+            for filename in ['test1.mp3', 'test2.mp3', 'vbr_without_header.mp3', 'one_frame.mp3',
+                    'tag_duration_different.mp3']:
+                fp = expand_mpeg(TestData.filepath('mpeg/' + filename))
+                b = mpeg.FrameBrowser(fp)
+                expected = browse(b)
+                expected_position = b.position
+                eq_(b.stats(), expected)
+                eq_(b.frame_index, expected[0])
+                eq_(b.position, expected_position)
+                assert not b.frame.valid
+    
+    def test_build_index(self):
+        frame = b'\xff\xfb\x90\x00'.ljust(417, b'\x00')
+        b = mpeg.FrameBrowser(io.BytesIO(b'\x00' * 10 + frame * 20))
+        index = b.build_index(step=8)
+        eq_(list(index.offsets), [10, 10 + 417 * 8, 10 + 417 * 16])
+        eq_(index.frame_count, 20)
+        eq_(index.offset_for_frame(7), 10)
+        eq_(index.offset_for_frame(8), 10 + 417 * 8)
+        eq_(index.offset_for_frame(1000), 10 + 417 * 16)
+    
+    def test_build_index_after_stats(self):
+        # stats() leaves the browser on the invalid frame after the last one
+        frame = b'\xff\xfb\x90\x00'.ljust(417, b'\x00')
+        b = mpeg.FrameBrowser(io.BytesIO(frame * 20))
+        b.stats()
+        assert not b.frame.valid
+        index = b.build_index(step=8)
+        eq_(index.sample_count, 1152)
+        eq_(index.frame_count, 20)
+    
+    def test_frame_index_to_bytes(self):
+        frame = b'\xff\xfb\x90\x00'.ljust(417, b'\x00')
+        index = mpeg.FrameBrowser(io.BytesIO(frame * 20)).build_index(step=4)
+        eq_(index.sample_count, 1152)
+        data = index.to_bytes()
+        eq_(len(data), mpeg.FRAME_INDEX_HEADER.size + 5 * 4)
+        loaded = mpeg.FrameIndex.from_bytes(data)
+        eq_(list(loaded.offsets), list(index.offsets))
+        eq_((loaded.step, loaded.frame_count, loaded.total_size, loaded.sample_count,
+            loaded.audio_size), (4, 20, 417 * 20, 1152, 0))
+        eq_(loaded.offset_for_frame(9), 417 * 8)
+        for invalid in [b'', data[:-1], b'XXXX' + data[4:]]:
+            with raises(ValueError):
+                mpeg.FrameIndex.from_bytes(invalid)
+    
+    def test_stats_with_truncated_header(self):
+        # The last frame counts as long as its whole header is there.
+        frame = b'\xff\xfb\x90\x00'.ljust(417, b'\x00')
+        b = mpeg.FrameBrowser(io.BytesIO(frame * 3 + frame[:4]))
+        eq_(b.stats(), (4, 417 * 4))
+        b = mpeg.FrameBrowser(io.BytesIO(frame * 3 + frame[:3]))
+        eq_(b.stats(), (3, 417 * 3))
+    
+
+def test_frame_stats_on_growing_file(tmpdir):
+    path = str(tmpdir.join('live.mp3'))
+    frame = b'\xff\xfb\x90\x00'.ljust(417, b'\x01')
+    data = b'\x00' * 10 + frame * 5 + b'TAG'.ljust(128, b' ')
+    stats = mpeg.FrameStats()
+    for end, expected in [(12, (0, 0)), (200, (0, 0)), (10 + 417 * 3 + 2, (3, 417 * 3)),
+            (10 + 417 * 3 + 100, (3, 417 * 3)), (10 + 417 * 5 + 50, (5, 417 * 5)),
+            (len(data), (5, 417 * 5))]:
+        with open(path, 'wb') as fp:
+            fp.write(data[:end])
+        eq_(stats.update(path), expected)
+    eq_(stats.position, 10 + 417 * 5)
+    eq_(stats.duration, 5 * 1152 // 44100)
+
+def test_frame_stats_stops_at_id3v1_tag():
+    # The last frame overlaps the id3v1 tag. It's a partial frame followed by a tag.
+    frame = b'\xff\xfb\x90\x00'.ljust(417, b'\x01')
+    fp = io.BytesIO(frame * 3 + frame[:300] + b'TAG'.ljust(128, b' '))
+    stats = mpeg.FrameStats()
+    eq_(stats.update(fp), (3, 417 * 3))
+    eq_(stats.update(fp), (3, 417 * 3))
+
+def test_parallel_stats_is_the_same_as_browsing(tmpdir):
+    for filename in ['test1.mp3', 'test8.mp3', 'vbr_fhg.mp3']:
+        path = str(tmpdir.join(filename))
+        open(path, 'wb').write(expand_mpeg(TestData.filepath('mpeg/' + filename)).read())
+        b = mpeg.FrameBrowser(open(path, 'rb'))
+        expected = b.stats()
+        for workers in [2, 7]:
+            frame_count, total_size, end = mpeg.parallel_stats(path, b.initial_position, workers)
+            eq_((frame_count, total_size), expected)
+            eq_(end, b.position)
+
+def test_parallel_stats_with_fake_frames_at_boundary(tmpdir):
+    # All frames but the last contain what looks like a chain of frames, 4 bytes after the real
+    # ones. The boundary of the second range is 2 bytes after a frame, so that's where the resync
+    # lands.
+    header = b'\xff\xfb\x90\x00'
+    frames = [(header * 2).ljust(417, b'\x00')] * 9 + [header.ljust(417, b'\x00')]
+    path = str(tmpdir.join('foo.mp3'))
+    open(path, 'wb').write(b''.join(frames) + b'\x00' * 4)
+    eq_(mpeg._walk_range(path, 2087, 4174, True)[:3], (2089, 4, 417 * 4))
+    eq_(mpeg.parallel_stats(path, 0, 2), (10, 4170, 4170))
+
+def test_stats_workers(tmpdir, monkeypatch):
+    path = str(tmpdir.join('test8.mp3'))
+    open(path, 'wb').write(expand_mpeg(TestData.filepath('mpeg/test8.mp3')).read())
+    expected = mpeg.Mpeg(path).duration
+    calls = []
+    def parallel_stats(path, start, workers):
+        calls.append(workers)
+        return old_parallel_stats(path, start, workers)
+    old_parallel_stats = mpeg.parallel_stats
+    monkeypatch.setattr(mpeg, 'parallel_stats', parallel_stats)
+    monkeypatch.setattr(mpeg, 'STATS_WORKERS', 3)
+    monkeypatch.setattr(mpeg, 'PARALLEL_STATS_MIN_SIZE', 0)
+    eq_(mpeg.Mpeg(path).duration, expected)
+    eq_(calls, [3])
+
+def test_decode_header():
+    eq_(mpeg.decode_header(0xfffb9000), (True, 417, 128, 44100, 1152)) # MPEG1 layer 3
+    eq_(mpeg.decode_header(0xfffb9200), (True, 418, 128, 44100, 1152)) # padded
+    eq_(mpeg.decode_header(0xffff9200), (True, 317, 288, 44100, 384)) # layer 1 pads 4 bytes
+    eq_(mpeg.decode_header(0xfff39400), (True, 240, 80, 24000, 576)) # MPEG2 layer 3
+    eq_(mpeg.decode_header(0xfffbf000), (False, 0, 0, 44100, 1152)) # bad bitrate index
+    eq_(mpeg.decode_header(0x12345678), mpeg.INVALID_HEADER) # no sync
+
+def test_frame_header_uses_decode_table():
+    h = mpeg.MpegFrameHeader(0xffff92c0)
+    assert h.valid
+    eq_((h.mpeg_id, h.layer, h.channel_mode), (mpeg.ID_MPEG1, mpeg.ID_LAYER1, mpeg.MPEG_CM_MONO))
+    eq_((h.size, h.bitrate, h.sample_rate, h.sample_count, h.padding_size), (317, 288, 44100, 384, 4))
+    h = mpeg.MpegFrameHeader(0xfffbf000)
+    assert not h.valid
+    eq_(h.size, 0)
+
+@mark.skipif(mpeg.numpy is None, reason="numpy isn't installed")
+def test_find_frame_sync_numpy_and_python_agree():
+    rng = random.Random(42)
+    samples = [b'', b'\xff\xfb', b'\xff\xfb\x90\x00']
+    # junk full of sync-like bytes
+    samples += [bytes(rng.choice(b'\xff\xfe\xfb\x90\x00\xe3') for _ in range(4096))
+        for _ in range(10)]
+    # a valid frame, but the next header is cut
+    samples.append(b'\xff' * 100 + b'\xff\xfb\x90\x00'.ljust(417, b'\x00') + b'\xff\xfb\x90')
+    for filename in ['test1.mp3', 'test2.mp3', 'vbr_fhg.mp3', 'double_id3.mp3']:
+        data = expand_mpeg(TestData.filepath('mpeg/' + filename)).read()
+        samples += [data[i:i+mpeg.MAX_SEEK_BYTES] for i in range(0, 8000, 333)]
+    for data in samples:
+        expected = mpeg._find_frame_sync_python(data)
+        eq_(mpeg._find_frame_sync_numpy(data), expected)
+        eq_(mpeg.find_frame_sync(data), expected)
+
+def test_seek_without_numpy(monkeypatch):
+    monkeypatch.setattr(mpeg, 'numpy', None)
+    b = mpeg.FrameBrowser(expand_mpeg(TestData.filepath('mpeg/test2.mp3')))
+    eq_(b.frame.bitrate, 128)
+    eq_(next(b).bitrate, 128)
@@ -126,3 +126,14 @@ def test_invalid_mp4():
     o = ogg.Vorbis(TestData.filepath('mp4/test1.m4a'))
     verify_emptyness(o)
 
+
+def test_fields():
+    # When only the duration is wanted, the comment isn't read. When it isn't, the last page isn't.
+    o = ogg.Vorbis(TestData.filepath('ogg/test1.ogg'), fields={'duration'})
+    assert o.valid
+    eq_(o.duration, 162)
+    eq_(o.title, '')
+    o = ogg.Vorbis(TestData.filepath('ogg/test1.ogg'), fields={'title'})
+    assert o.valid
+    eq_(o.title, 'Astro')
+    eq_(o.duration, 0)
@@ -0,0 +1,68 @@
+# Created On: 2026-10-18
+# Copyright 2010 Hardcoded Software (http://www.hardcoded.net)
+#
+# This software is licensed under the "BSD" License as described in the "LICENSE" file,
+# which should be included with this package. The terms are also available at
+# http://www.hardcoded.net/licenses/bsd_license
+
+import multiprocessing
+import os.path as op
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from .. import mpeg, scanner, scan
+from .squeeze import expand_mpeg
+from .util import TestData, eq_
+
+def test_iter_paths_filters_directories_by_extension():
+    # Files in directories are filtered by extension, but explicitly given paths are not.
+    paths = list(scanner.iter_paths([TestData.filepath('flac'), TestData.filepath('randomfile')]))
+    eq_(paths, [op.join(TestData.filepath('flac'), 'test1.flac'), TestData.filepath('randomfile')])
+
+def test_scan_in_process():
+    [result] = list(scan(TestData.filepath('flac/test1.flac'), workers=0))
+    assert result.valid
+    eq_(result.error, None)
+    eq_(result.artist, 'Coolio')
+    eq_(result.duration, 177)
+
+def test_errors_are_collected():
+    # A file that can't be read doesn't stop the scan, it yields an invalid result with an error.
+    path = op.join(TestData.filepath('flac'), 'doesnt_exist.flac')
+    results = list(scan([path, TestData.filepath('flac/test1.flac')], workers=0))
+    eq_(len(results), 2)
+    assert not results[0].valid
+    assert results[0].error.startswith('FileNotFoundError')
+    eq_(results[0].artist, '')
+    eq_(results[0].track, 0)
+    assert results[1].valid
+
+def test_result_is_picklable():
+    result = scanner.read_file(TestData.filepath('ogg/test1.ogg'))
+    unpickled = pickle.loads(pickle.dumps(result))
+    eq_(unpickled.path, result.path)
+    eq_(unpickled.title, 'Astro')
+    eq_(unpickled.size, 101785)
+
+def test_scan_with_workers():
+    # Results come back in completion order, but they're the same as in-process ones.
+    paths = [TestData.filepath('ogg'), TestData.filepath('wma'), TestData.filepath('flac')]
+    expected = {r.path: r.title for r in scan(paths, workers=0)}
+    results = list(scan(paths, workers=2, chunksize=3))
+    eq_({r.path: r.title for r in results}, expected)
+    assert all(r.error is None for r in results)
+
+def test_workers_get_module_settings(tmpdir, monkeypatch):
+    # Spawned workers import hsaudiotag anew, the settings of this process are passed to them.
+    spawn = multiprocessing.get_context('spawn')
+    monkeypatch.setattr(scanner, 'ProcessPoolExecutor', partial(ProcessPoolExecutor,
+        mp_context=spawn))
+    path = str(tmpdir.join('foo.mp3'))
+    open(path, 'wb').write(expand_mpeg(TestData.filepath('mpeg/vbr_without_header.mp3')).read())
+    fast = mpeg.Mpeg(path, duration_mode=mpeg.DURATION_FAST).duration
+    assert fast != mpeg.Mpeg(path).duration
+    monkeypatch.setattr(mpeg, 'DURATION_MODE', mpeg.DURATION_FAST)
+    [result] = list(scan([path], workers=2))
+    eq_(result.error, None)
+    eq_(result.duration, fast)
@@ -6,6 +6,7 @@
 # which should be included with this package. The terms are also available at 
 # http://www.hardcoded.net/licenses/bsd_license
 
+import io
 import os.path as op
 
 def eq_(a, b, msg=None):
@@ -20,3 +21,21 @@ class TestData:
         resultpath = op.join(datadirpath, relative_path)
         assert op.exists(resultpath)
         return resultpath
+
+class ForwardOnlyStream(io.RawIOBase):
+    # Non-seekable stream returning `data` in chunks of at most `chunk_size` bytes, like a pipe.
+    def __init__(self, data, chunk_size=1000):
+        io.RawIOBase.__init__(self)
+        self._fp = io.BytesIO(data)
+        self.chunk_size = chunk_size
+        self.read_size = 0
+    
+    def readable(self):
+        return True
+    
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.chunk_size
+        data = self._fp.read(min(size, self.chunk_size))
+        self.read_size += len(data)
+        return data
@@ -0,0 +1,300 @@
+# Created On: 2026-10-18
+# Copyright 2010 Hardcoded Software (http://www.hardcoded.net)
+#
+# This software is licensed under the "BSD" License as described in the "LICENSE" file,
+# which should be included with this package. The terms are also available at
+# http://www.hardcoded.net/licenses/bsd_license
+
+import io
+import mmap
+import struct
+
+from pytest import raises
+
+from .. import auto, id3v2, mpeg, ogg, util, wma
+from ..util import PrefetchFile, MappedFile, StreamFile, Cursor, FileOrPath
+from .squeeze import expand_mpeg
+from .util import TestData, ForwardOnlyStream, eq_
+
+class CountingFile(io.BytesIO):
+    # BytesIO counting the number of times it has been read.
+    def __init__(self, data):
+        io.BytesIO.__init__(self, data)
+        self.read_count = 0
+
+    def read(self, size=-1):
+        self.read_count += 1
+        return io.BytesIO.read(self, size)
+
+
+def test_prefetch_reads_are_served_from_windows():
+    data = bytes(range(256)) * 100
+    fp = CountingFile(data)
+    pf = PrefetchFile(fp, head_size=1000, tail_size=1000)
+    eq_(fp.read_count, 1)
+    eq_(pf.read(10), data[:10])
+    eq_(pf.read(10), data[10:20])
+    eq_(fp.read_count, 1)
+    # The tail is read on the first read reaching it
+    pf.seek(-128, 2)
+    eq_(pf.tell(), len(data) - 128)
+    eq_(pf.read(), data[-128:])
+    eq_(pf.read(), b'')
+    eq_(fp.read_count, 2)
+
+def test_prefetch_reads_outside_windows():
+    # Reads falling outside the windows go through the file. What's in the head window isn't read
+    # again.
+    data = bytes(range(256)) * 100
+    fp = CountingFile(data)
+    pf = PrefetchFile(fp, head_size=1000, tail_size=1000)
+    pf.seek(5000)
+    eq_(pf.read(100), data[5000:5100])
+    eq_(fp.read_count, 2)
+    pf.seek(900)
+    eq_(pf.read(200), data[900:1100])
+    eq_(fp.tell(), 1100)
+
+def test_prefetch_small_file_is_read_at_once():
+    fp = CountingFile(b'foobar')
+    pf = PrefetchFile(fp, head_size=4, tail_size=4)
+    eq_(fp.read_count, 1)
+    pf.seek(2)
+    eq_(pf.read(3), b'oba')
+
+def test_prefetch_seek_before_start():
+    pf = PrefetchFile(io.BytesIO(b'foobar'))
+    with raises(OSError):
+        pf.seek(-10, 2)
+
+def test_mpeg_reads_file_twice():
+    # All the small reads Mpeg does are served from the prefetched windows.
+    fp = CountingFile(expand_mpeg(TestData.filepath('mpeg/test1.mp3')).read())
+    m = mpeg.Mpeg(PrefetchFile(fp))
+    eq_(m.duration, 147)
+    eq_(m.tag.title, 'Intro Missions Started')
+    eq_(fp.read_count, 2)
+
+def test_vorbis_reads_file_twice():
+    fp = CountingFile(open(TestData.filepath('ogg/test1.ogg'), 'rb').read())
+    v = ogg.Vorbis(PrefetchFile(fp, head_size=0x8000))
+    eq_(v.duration, 162)
+    eq_(v.title, 'Astro')
+    eq_(fp.read_count, 2)
+
+def test_prefetch_reopen(tmpdir):
+    # A reopenable PrefetchFile can still be read after having been closed.
+    path = str(tmpdir.join('foo'))
+    data = bytes(range(256)) * 100
+    open(path, 'wb').write(data)
+    pf = PrefetchFile(open(path, 'rb'), head_size=1000, tail_size=1000, path=path)
+    pf.close()
+    assert pf.closed
+    pf.seek(5000)
+    eq_(pf.read(10), data[5000:5010])
+    assert not pf.closed
+    eq_(pf.read(10), data[5010:5020])
+    pf.seek(-10, 2)
+    eq_(pf.read(), data[-10:])
+    pf.close()
+
+def test_prefetch_close_releases_windows(tmpdir):
+    path = str(tmpdir.join('foo'))
+    data = bytes(range(256)) * 100
+    open(path, 'wb').write(data)
+    pf = PrefetchFile(open(path, 'rb'), head_size=1000, tail_size=1000, path=path)
+    pf.close()
+    eq_(len(pf._head), 0)
+    eq_(len(pf._tail), 0)
+    # The windows are read again when the file is reopened
+    eq_(pf.read(10), data[:10])
+    eq_(len(pf._head), 1000)
+    pf.seek(-10, 2)
+    eq_(pf.read(), data[-10:])
+    eq_(len(pf._tail), 1000)
+    pf.close()
+
+def record_opens(monkeypatch):
+    # Makes util open files as CountingFile and returns the list of them.
+    opened = []
+    def fake_open(path, mode='rb'):
+        with open(path, mode) as fp:
+            opened.append(CountingFile(fp.read()))
+        return opened[-1]
+    monkeypatch.setattr(util, 'open', fake_open, raising=False)
+    return opened
+
+def test_lazy_files_keep_windows_until_audio_read(tmpdir, monkeypatch):
+    # auto.File owns the file it opens. It's kept open for the lazy audio read, which is served by
+    # the same windows, and then closed, without its windows.
+    path = str(tmpdir.join('foo.mp3'))
+    open(path, 'wb').write(expand_mpeg(TestData.filepath('mpeg/test1.mp3')).read())
+    opened = record_opens(monkeypatch)
+    f = auto.File(path)
+    eq_(f.title, 'Intro Missions Started')
+    pf = f.original._fp
+    assert not pf.closed
+    eq_(f.duration, 147)
+    eq_(f.bitrate, 128)
+    assert pf.closed
+    eq_(len(pf._head) + len(pf._tail), 0)
+    eq_(len(opened), 1)
+    eq_(opened[0].read_count, 2)
+
+def test_tail_window_is_read_only_by_formats_needing_it(tmpdir, monkeypatch):
+    # flac and wma only look at the head of the file, mpeg reads the id3v1 tag in the tail.
+    monkeypatch.setattr(util, 'PREFETCH_HEAD_SIZE', 0x8000)
+    monkeypatch.setattr(util, 'PREFETCH_TAIL_SIZE', 0x8000)
+    mp3_path = str(tmpdir.join('test1.mp3'))
+    open(mp3_path, 'wb').write(expand_mpeg(TestData.filepath('mpeg/test1.mp3')).read())
+    opened = record_opens(monkeypatch)
+    expected = [
+        (TestData.filepath('flac/test1.flac'), 'flac', 1),
+        (TestData.filepath('wma/test1.wma'), 'wma', 1),
+        (mp3_path, 'mpeg', 2),
+    ]
+    for path, format, read_count in expected:
+        del opened[:]
+        f = auto.File(path)
+        eq_(f.format, format)
+        assert f.duration
+        eq_(len(opened), 1)
+        eq_(opened[0].read_count, read_count)
+
+def test_mapped_file_reads(tmpdir):
+    path = str(tmpdir.join('foo'))
+    data = bytes(range(256)) * 100
+    open(path, 'wb').write(data)
+    mf = MappedFile(open(path, 'rb'), path=path)
+    eq_(mf.size, len(data))
+    eq_(mf.read(10), data[:10])
+    view = mf.read_view(10)
+    assert isinstance(view, memoryview)
+    eq_(bytes(view), data[10:20])
+    mf.seek(-128, 2)
+    eq_(mf.read(), data[-128:])
+    eq_(mf.read(), b'')
+    with raises(BufferError):
+        mf.close() # while `view` is still alive
+    assert not mf.closed
+    mf.seek(-128, 2)
+    eq_(mf.read(2), data[-128:-126]) # still mapped
+    view.release()
+    mf.close()
+    assert mf.closed
+    mf.seek(5000)
+    eq_(mf.read(10), data[5000:5010]) # mapped again
+    mf.close()
+
+def test_mapped_empty_file(tmpdir):
+    path = str(tmpdir.join('foo'))
+    open(path, 'wb').close()
+    mf = MappedFile(open(path, 'rb'))
+    eq_(mf.read(), b'')
+    mf.close()
+    with raises(ValueError):
+        mf.read()
+
+def test_file_or_path_use_mmap(monkeypatch):
+    path = TestData.filepath('ogg/test1.ogg')
+    with FileOrPath(path, prefetch=True, use_mmap=True) as fp:
+        assert isinstance(fp, MappedFile)
+    monkeypatch.setattr(util, 'USE_MMAP', True)
+    with FileOrPath(path, prefetch=True) as fp:
+        assert isinstance(fp, MappedFile)
+    with FileOrPath(path) as fp:
+        assert not isinstance(fp, MappedFile)
+
+def test_parsers_through_mmap(tmpdir, monkeypatch):
+    monkeypatch.setattr(util, 'USE_MMAP', True)
+    path = str(tmpdir.join('test1.mp3'))
+    open(path, 'wb').write(expand_mpeg(TestData.filepath('mpeg/test1.mp3')).read())
+    f = auto.File(path)
+    eq_(f.format, 'mpeg')
+    eq_(f.duration, 147)
+    eq_(f.title, 'Intro Missions Started')
+    eq_(auto.File(TestData.filepath('ogg/test1.ogg')).title, 'Astro')
+
+def test_parsers_dont_keep_views_of_the_map(tmpdir):
+    # Tags stay readable after the map is closed, frames hold copies of their data.
+    path = str(tmpdir.join('test1.mp3'))
+    open(path, 'wb').write(expand_mpeg(TestData.filepath('mpeg/test1.mp3')).read())
+    mf = MappedFile(open(path, 'rb'), path=path)
+    tag = id3v2.Id3v2(mf)
+    mf.close()
+    assert mf.closed
+    eq_(tag.title, 'Intro Missions Started')
+    path = TestData.filepath('wma/test1.wma')
+    mf = MappedFile(open(path, 'rb'), path=path)
+    f = wma.WMADecoder(mf)
+    mf.close()
+    assert mf.closed
+    eq_(f.title, '3rd Planet')
+
+def test_cursor_doesnt_copy():
+    data = bytearray(b'\x00\x01\x00\x02foobar')
+    c = Cursor(data)
+    eq_(c.unpack('>2H'), (1, 2))
+    view = c.read(3)
+    assert isinstance(view, memoryview)
+    data[4:7] = b'baz'
+    eq_(bytes(view), b'baz')
+    eq_(c.tell(), 7)
+    eq_(bytes(c.read()), b'bar')
+    eq_(bytes(c.read(10)), b'')
+    with raises(struct.error):
+        c.unpack('>I')
+
+def test_cursor_from_file(tmpdir):
+    path = str(tmpdir.join('foo'))
+    open(path, 'wb').write(b'foobar')
+    mf = MappedFile(open(path, 'rb'))
+    mf.seek(3)
+    c = Cursor.from_file(mf, 2)
+    eq_(bytes(c.read()), b'ba')
+    assert isinstance(c._view.obj, mmap.mmap) # a view of the map, not a copy
+    eq_(bytes(Cursor.from_file(io.BytesIO(b'foobar'), 3).read()), b'foo')
+    del c
+    mf.close()
+
+def test_stream_file_spools_the_head():
+    data = bytes(range(256)) * 100
+    stream = ForwardOnlyStream(data)
+    sf = StreamFile(stream, size=len(data), spool_size=5000)
+    eq_(sf.read(10), data[:10])
+    eq_(stream.read_size, 10) # only what's needed is read
+    sf.seek(4000)
+    eq_(sf.read(10), data[4000:4010])
+    sf.seek(5)
+    eq_(sf.read(10), data[5:15])
+    assert not sf.partial
+    # Past the spool, nothing is read
+    sf.seek(-128, 2)
+    eq_(sf.read(), b'')
+    sf.seek(4990)
+    eq_(sf.read(20), data[4990:5000])
+    assert sf.partial
+    eq_(stream.read_size, 5000)
+
+def test_stream_file_without_size_reads_the_tail():
+    data = bytes(range(256)) * 100
+    sf = StreamFile(ForwardOnlyStream(data), spool_size=5000, tail_size=1000)
+    eq_(sf.read(10), data[:10])
+    sf.seek(0, 2)
+    eq_(sf.tell(), len(data))
+    sf.seek(-128, 2)
+    eq_(sf.read(), data[-128:])
+    sf.seek(0)
+    eq_(sf.read(10), data[:10])
+    assert not sf.partial
+    sf.seek(10000)
+    eq_(sf.read(10), b'')
+    assert sf.partial
+
+def test_stream_file_shorter_than_spool():
+    sf = StreamFile(ForwardOnlyStream(b'foobar'), size=1000)
+    eq_(sf.read(), b'foobar')
+    eq_(sf.size, 6) # the actual size wins
+    sf.seek(-3, 2)
+    eq_(sf.read(), b'bar')
+    assert not sf.partial
@@ -117,3 +117,11 @@ def test7():
     eq_(w.bitrate, 327)
     eq_(w.duration, 539)
 
+
+def test_fields():
+    # Content description objects are skipped when no tag is wanted.
+    w = wma.WMADecoder(TestData.filepath('wma/test1.wma'), fields={'duration'})
+    assert w.valid
+    eq_(w.duration, 239)
+    eq_(w.title, '')
+    eq_(w.audio_offset, 0x15a0)
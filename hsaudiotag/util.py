@@ -6,26 +6,376 @@
 # which should be included with this package. The terms are also available at 
 # http://www.hardcoded.net/licenses/bsd_license
 
-def open_if_filename(file_or_path, mode='rb'):
+import errno
+import mmap
+import os
+import struct
+
+AUDIO_ATTRS = {'size', 'duration', 'bitrate', 'sample_rate', 'audio_offset', 'audio_size'}
+TAG_ATTRS = {'artist', 'album', 'title', 'genre', 'year', 'track', 'comment'}
+
+# Default size of the windows read by PrefetchFile at both ends of the file. The tail window is
+# large enough to contain the last page of an ogg file.
+PREFETCH_HEAD_SIZE = 0x10000
+PREFETCH_TAIL_SIZE = 0x10000
+
+# Maximum number of bytes StreamFile keeps from the start of a stream. It's enough for the metadata
+# of most files, even with a big cover picture.
+STREAM_SPOOL_SIZE = 0x100000
+
+# When True, files opened with `prefetch` are memory-mapped (see MappedFile) instead of being
+# wrapped in a PrefetchFile. It's usually faster with local disks, where syscalls dominate.
+USE_MMAP = False
+
+class ReadOnlyFile:
+    """Base class for our file wrappers. Subclasses set `size` and implement read(), close() and
+    `closed`.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.size = 0
+        self._pos = 0
+    
+    def _read_range(self, size):
+        # Returns the (start, end) range a read of `size` bytes covers.
+        start = self._pos
+        end = self.size if (size is None or size < 0) else min(start + size, self.size)
+        return start, max(start, end)
+    
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._pos
+        elif whence == 2:
+            offset += self.size
+        if offset < 0:
+            raise OSError(errno.EINVAL, os.strerror(errno.EINVAL))
+        self._pos = offset
+        return offset
+    
+    def tell(self):
+        return self._pos
+    
+    @property
+    def reopenable(self):
+        return self.path is not None
+    
+
+class PrefetchFile(ReadOnlyFile):
+    """Read-only file wrapper that reads the head and the tail of `fp` once and serves reads from
+    these windows. Reads falling outside of them go through `fp`.
+    
+    Parsers do a lot of small reads at both ends of a file (tags, first frames, last ogg page). On
+    network filesystems, each of these reads is a round trip. The head is read right away, but the
+    tail is only read when a read reaches it, as many formats never look there.
+    
+    If `path` is given, the file is "reopenable": it can be closed and still be read from. The
+    windows are released when the file is closed. On the next read, `path` is opened again and the
+    windows are read again.
+    """
+    def __init__(self, fp, head_size=None, tail_size=None, path=None):
+        if head_size is None:
+            head_size = PREFETCH_HEAD_SIZE
+        if tail_size is None:
+            tail_size = PREFETCH_TAIL_SIZE
+        ReadOnlyFile.__init__(self, path)
+        self._fp = fp
+        self._head_size = head_size
+        self._tail_size = tail_size
+        self._read_windows()
+    
+    def _read_windows(self):
+        fp = self._fp
+        fp.seek(0, 2)
+        self.size = fp.tell()
+        fp.seek(0, 0)
+        head_size = self._head_size
+        if self.size <= head_size + self._tail_size:
+            head_size = self.size
+        self._head = fp.read(head_size)
+        self._tail = b''
+        self._tail_start = None # the tail isn't read yet
+    
+    def _read_tail(self):
+        self._tail_start = max(self.size - self._tail_size, len(self._head))
+        self._fp.seek(self._tail_start, 0)
+        self._tail = self._fp.read(self.size - self._tail_start)
+    
+    def _read_through(self, start, end):
+        # What we have in the head window doesn't have to be read again.
+        prefix = self._head[start:]
+        self._fp.seek(start + len(prefix), 0)
+        return prefix + self._fp.read(end - start - len(prefix))
+    
+    def close(self):
+        self._fp.close()
+        # Closed files can be kept around for a long time (for lazy attributes), without their
+        # windows.
+        self._head = b''
+        self._tail = b''
+        self._tail_start = None
+    
+    def read(self, size=-1):
+        start, end = self._read_range(size)
+        if start == end:
+            return b''
+        if self._fp.closed and self.reopenable:
+            self._fp = open(self.path, 'rb')
+            self._read_windows()
+            start, end = self._read_range(size)
+        if end <= len(self._head):
+            data = self._head[start:end]
+        elif start >= max(self.size - self._tail_size, len(self._head)):
+            if self._tail_start is None:
+                self._read_tail()
+            data = self._tail[start - self._tail_start:end - self._tail_start]
+        else:
+            data = self._read_through(start, end)
+        self._pos = start + len(data)
+        return data
+    
+    @property
+    def closed(self):
+        return self._fp.closed
+    
+    @property
+    def name(self):
+        return getattr(self._fp, 'name', None)
+    
+
+class MappedFile(ReadOnlyFile):
+    """Read-only file wrapper reading `fp` through a memory map. Reads are served by the page cache
+    without any syscall.
+    
+    read() returns bytes, like a normal file. read_view() returns a memoryview slice of the map,
+    without copying anything. Such views have to be released (or garbage collected) before the file
+    is closed, otherwise close() raises BufferError and the map stays open.
+    
+    Like PrefetchFile, the file is reopenable (and mapped again) if `path` is given.
+    """
+    def __init__(self, fp, path=None):
+        ReadOnlyFile.__init__(self, path)
+        self._fp = fp
+        self._map = None
+        self._view = None
+        self._map_file()
+    
+    def _map_file(self):
+        self._fp.seek(0, 2)
+        self.size = self._fp.tell()
+        if self.size:
+            self._map = mmap.mmap(self._fp.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+        else:
+            # Empty files can't be mapped
+            self._view = memoryview(b'')
+    
+    def _get_view(self):
+        if self._view is None:
+            if self._map is not None:
+                # A close() failed, the file is still mapped
+                self._view = memoryview(self._map)
+                return self._view
+            if not self.reopenable:
+                raise ValueError('I/O operation on closed file.')
+            self._fp = open(self.path, 'rb')
+            self._map_file()
+        return self._view
+    
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._fp.close()
+    
+    def read(self, size=-1):
+        return bytes(self.read_view(size))
+    
+    def read_view(self, size=-1):
+        view = self._get_view()
+        start, end = self._read_range(size)
+        self._pos = end
+        return view[start:end]
+    
+    @property
+    def closed(self):
+        return (self._view is None) and (self._map is None)
+    
+    @property
+    def name(self):
+        return getattr(self._fp, 'name', None)
+    
+
+class Cursor(ReadOnlyFile):
+    """File-like reader over `data`, a bytes-like object, that doesn't copy it.
+    
+    read() returns memoryview slices of `data` rather than bytes, and unpack() reads a struct at the
+    current position. Parsers read a whole tag or object at once and then go through it with a
+    cursor. Use `from_file()` to avoid copying from memory-mapped files too.
+    """
+    def __init__(self, data):
+        ReadOnlyFile.__init__(self)
+        self._view = memoryview(data)
+        self.size = len(self._view)
+    
+    @classmethod
+    def from_file(cls, fp, size):
+        """Returns a cursor over the next `size` bytes of `fp`."""
+        read_view = getattr(fp, 'read_view', None)
+        return cls(read_view(size) if read_view is not None else fp.read(size))
+    
+    def close(self):
+        pass
+    
+    def read(self, size=-1):
+        start, end = self._read_range(size)
+        self._pos = end
+        return self._view[start:end]
+    
+    def unpack(self, fmt):
+        """Unpacks struct `fmt` at the current position and moves after it. Raises struct.error if
+        there isn't enough data.
+        """
+        result = struct.unpack_from(fmt, self._view, self._pos)
+        self._pos += struct.calcsize(fmt)
+        return result
+    
+    closed = False
+    
+
+class StreamFile(ReadOnlyFile):
+    """Read-only file wrapper making a forward-only `stream` (a pipe, a socket, an upload) look
+    seekable to parsers.
+    
+    The first `spool_size` bytes of the stream are kept in memory, read as they're needed. `size`
+    is the declared length of the stream. If it's None, the stream is read until its end when the
+    size (or data past the spool) is needed, keeping only its last `tail_size` bytes. Memory use
+    is bounded either way.
+    
+    Data that isn't available (past the spool when `size` is declared, or between the spool and
+    the tail) reads as b'', as at the end of a file, and `partial` is then set to True.
+    """
+    def __init__(self, stream, size=None, spool_size=None, tail_size=None):
+        if spool_size is None:
+            spool_size = STREAM_SPOOL_SIZE
+        if tail_size is None:
+            tail_size = PREFETCH_TAIL_SIZE
+        ReadOnlyFile.__init__(self)
+        self._stream = stream
+        self._size = size
+        self._spool_size = spool_size
+        self._tail_size = tail_size
+        self._head = bytearray()
+        self._tail = b''
+        self._tail_start = None # set once the stream has been read until its end
+        self._eof = False
+        self.partial = False
+    
+    def _read_stream(self, size):
+        # Streams can return less than what we ask for without being at their end.
+        data = self._stream.read(size)
+        if not data:
+            self._eof = True
+        return data
+    
+    def _fill_head(self, end):
+        end = min(end, self._spool_size)
+        while (len(self._head) < end) and not self._eof:
+            self._head += self._read_stream(end - len(self._head))
+        if self._eof and self._tail_start is None:
+            # The whole stream fits in the spool
+            self._tail_start = self._size = len(self._head)
+    
+    def _drain(self):
+        # Reads the rest of the stream, keeping only its last bytes.
+        self._fill_head(self._spool_size)
+        position = len(self._head)
+        tail = b''
+        while not self._eof:
+            data = self._read_stream(PREFETCH_HEAD_SIZE)
+            position += len(data)
+            tail = (tail + data)[-self._tail_size:]
+        self._size = position
+        self._tail = tail
+        self._tail_start = position - len(tail)
+    
+    def close(self):
+        # The stream belongs to the caller, we don't close it.
+        pass
+    
+    def read(self, size=-1):
+        start = self._pos
+        end = self.size if (size is None or size < 0) else start + size
+        if end > len(self._head):
+            self._fill_head(end)
+            if (end > len(self._head)) and (self._size is None):
+                self._drain()
+        if self._size is not None:
+            end = min(end, self._size)
+        end = max(start, end)
+        if start < len(self._head):
+            data = bytes(self._head[start:end])
+        elif (self._tail_start is not None) and (start >= self._tail_start):
+            data = self._tail[start - self._tail_start:end - self._tail_start]
+        else:
+            data = b''
+        if len(data) < end - start:
+            self.partial = True
+        self._pos = start + len(data)
+        return data
+    
+    @property
+    def closed(self):
+        return getattr(self._stream, 'closed', False)
+    
+    @property
+    def size(self):
+        if self._size is None:
+            self._drain()
+        return self._size
+    
+    @size.setter
+    def size(self, value):
+        self._size = value
+    
+
+def open_if_filename(file_or_path, mode='rb', prefetch=False, use_mmap=None):
     """
     file_or_path can be either a string or a file-like object.
-    if it is a string, a file will be opened with mode.
+    if it is a string, a file will be opened with mode. If prefetch is true, it's then wrapped in a
+    PrefetchFile, or in a MappedFile if use_mmap is true (None means USE_MMAP). Both are reopenable.
+    File objects are always returned as-is.
     Returns a tuple (file, should_be_closed).
     """
     if isinstance(file_or_path, str):
-        return (open(file_or_path, mode), True)
+        fp = open(file_or_path, mode)
+        if prefetch:
+            if use_mmap is None:
+                use_mmap = USE_MMAP
+            wrapper = MappedFile if use_mmap else PrefetchFile
+            try:
+                fp = wrapper(fp, path=file_or_path)
+            except Exception:
+                fp.close()
+                raise
+        return (fp, True)
     else:
         return (file_or_path, False)
 
 class FileOrPath:
-    def __init__(self, file_or_path, mode='rb'):
+    def __init__(self, file_or_path, mode='rb', prefetch=False, use_mmap=None):
         self.file_or_path = file_or_path
         self.mode = mode
+        self.prefetch = prefetch
+        self.use_mmap = use_mmap
         self.mustclose = False
         self.fp = None
     
     def __enter__(self):
-        self.fp, self.mustclose = open_if_filename(self.file_or_path, self.mode)
+        self.fp, self.mustclose = open_if_filename(self.file_or_path, self.mode, self.prefetch,
+            self.use_mmap)
         return self.fp
     
     def __exit__(self, exc_type, exc_value, traceback):
@@ -33,6 +383,18 @@ class FileOrPath:
             self.fp.close()
     
 
+def wants(fields, attrnames):
+    """Returns whether any of `attrnames` is in `fields`.
+    
+    All parsers take a `fields` argument, the set of attributes they're asked to read (None for
+    all of them), and skip the work only needed for other attributes.
+    """
+    return fields is None or not fields.isdisjoint(attrnames)
+
+def is_reopenable(fp):
+    """Returns whether `fp` can be closed and still be read from (see PrefetchFile)."""
+    return getattr(fp, 'reopenable', False)
+
 def cond(condition, true_value, false_value):
     """Return true_value if condition is true, and false_value otherwise.
     """
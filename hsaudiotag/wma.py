@@ -8,9 +8,8 @@
 
 import struct
 from struct import unpack
-from io import BytesIO
 
-from .util import FileOrPath
+from .util import Cursor, FileOrPath, wants, TAG_ATTRS
 
 #Object IDs
 WMA_ID_SIZE = 16
@@ -36,12 +35,15 @@ DESCRIPTION = b'WM/DESCRIPTION'
 WMA_MAX_STRING_SIZE = 250;
 
 class WMADecoder(object):
-    def __init__(self, infile):
+    def __init__(self, infile, fields=None):
+        # Content description objects are skipped if no tag is wanted.
+        self.fields = fields
         with FileOrPath(infile) as fp:
             self._read_file(fp)
     
     #--- Private
     def _decode_string(self, s):
+        s = bytes(s)
         try:
             return s.decode('utf-16-le')[:-1]
         except UnicodeDecodeError:
@@ -52,26 +54,26 @@ class WMADecoder(object):
     
     def _read_file_prop(self, data):
         data.seek(48)
-        play_time1, play_time2 = unpack('<2I', data.read(8)) # in 100-nanosec increment
+        play_time1, play_time2 = data.unpack('<2I') # in 100-nanosec increment
         play_time = (play_time1 << 32) + play_time2
         # For some reason I have to remove 2 seconds
         self.duration = (play_time // 10000000) 
         data.seek(80)
-        [self._max_br] = unpack('<i', data.read(4))
+        [self._max_br] = data.unpack('<i')
     
     def _read_stream_prop(self, data):
         data.seek(60)
-        self.channels, self.sample_rate, self._avg_bytes_per_second = unpack("<hii", data.read(10))
+        self.channels, self.sample_rate, self._avg_bytes_per_second = data.unpack("<hii")
     
     def _read_streambitrate_prop(self, data):
         data.seek(8)
-        [avg_br] = unpack("<i", data.read(4))
+        [avg_br] = data.unpack("<i")
         self._avg_br = avg_br // 8
     
     def _read_content_desc(self, data):
         #There are 6 fields in this object, and the size of the 6 objects
         #are at the beginning of the object
-        sizes = unpack("<7h", data.read(14))
+        sizes = data.unpack("<7h")
         fields = [self._decode_string(data.read(size)) if size > 0 else '' for size in sizes]
         if TITLE not in self._fields:
             self._fields[TITLE] = fields[2]
@@ -80,18 +82,18 @@ class WMADecoder(object):
     
     def _read_ext_content(self, data):
         data.seek(4, 1)
-        [field_count] = unpack("<h", data.read(2))
+        [field_count] = data.unpack("<h")
         for i in range(field_count):
-            [name_size] = unpack("<h", data.read(2))
+            [name_size] = data.unpack("<h")
             try:
                 field_name = self._decode_string(data.read(name_size)).encode().upper()
             except UnicodeEncodeError:
                 field_name = ''
-            data_type, data_size = unpack("<2h", data.read(4))
+            data_type, data_size = data.unpack("<2h")
             if data_type == 0: # string
                 field_data = self._decode_string(data.read(data_size))
             elif data_type == 3: # int
-                [field_data] = unpack("<i", data.read(4))
+                [field_data] = data.unpack("<i")
             else:
                 field_data = ''
                 data.seek(data_size, 1)
@@ -126,6 +128,9 @@ class WMADecoder(object):
             WMA_EXTENDED_CONTENT_DESCRIPTION_ID: self._read_ext_content,
             WMA_STREAM_BITRATE_PROPERTIES_ID: self._read_streambitrate_prop,
         }
+        if not wants(self.fields, TAG_ATTRS):
+            del functions[WMA_CONTENT_DESCRIPTION_ID]
+            del functions[WMA_EXTENDED_CONTENT_DESCRIPTION_ID]
         try:
             if fp.read(WMA_ID_SIZE) == WMA_HEADER_ID:
                 fp.seek(8, 1)
@@ -136,7 +141,7 @@ class WMADecoder(object):
                     item_id = fp.read(WMA_ID_SIZE)
                     [item_size] = unpack("<i", fp.read(4))
                     if item_id in functions:
-                        functions[item_id](BytesIO(fp.read(item_size - WMA_OB_HEADER_SIZE)))
+                        functions[item_id](Cursor.from_file(fp, item_size - WMA_OB_HEADER_SIZE))
                     else:
                         fp.seek(item_size - WMA_OB_HEADER_SIZE, 1)
                 self.artist = self._fields.get(ARTIST, '')